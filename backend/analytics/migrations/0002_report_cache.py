@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='cache_key',
+            field=models.CharField(blank=True, help_text='Clé normalisée (modèle, filtres, période)', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ReportDailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope_key', models.CharField(help_text='Clé normalisée (modèle, filtres) sans la période', max_length=64)),
+                ('day', models.DateField()),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Agrégat journalier de rapport',
+                'verbose_name_plural': 'Agrégats journaliers de rapports',
+                'ordering': ['-day'],
+                'unique_together': {('scope_key', 'day')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['cache_key', 'status'], name='analytics_r_cache_k_40e4c7_idx'),
+        ),
+    ]
@@ -57,6 +57,7 @@ class Report(models.Model):
     date_from = models.DateTimeField()
     date_to = models.DateTimeField()
     filters = models.JSONField(default=dict)
+    cache_key = models.CharField(max_length=64, blank=True, help_text="Clé normalisée (modèle, filtres, période)")
     
     # Données du rapport
     data = models.JSONField(default=dict)
@@ -82,11 +83,31 @@ class Report(models.Model):
         verbose_name = "Rapport"
         verbose_name_plural = "Rapports"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['cache_key', 'status']),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.created_at.strftime('%Y-%m-%d')}"
 
 
+class ReportDailyAggregate(models.Model):
+    """Agrégats journaliers partiels des rapports (jours clos, supprimés si un ticket du jour change)"""
+    scope_key = models.CharField(max_length=64, help_text="Clé normalisée (modèle, filtres) sans la période")
+    day = models.DateField()
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Agrégat journalier de rapport"
+        verbose_name_plural = "Agrégats journaliers de rapports"
+        ordering = ['-day']
+        unique_together = ['scope_key', 'day']
+
+    def __str__(self):
+        return f"{self.scope_key[:8]} - {self.day}"
+
+
 class Dashboard(models.Model):
     """Tableaux de bord personnalisés"""
     name = models.CharField(max_length=200)
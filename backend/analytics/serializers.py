@@ -22,6 +22,23 @@ class ReportSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'generated_at', 'status', 'error_message']
 
 
+class ReportGenerateSerializer(serializers.Serializer):
+    """Paramètres de génération d'un rapport"""
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    template = serializers.PrimaryKeyRelatedField(
+        queryset=ReportTemplate.objects.filter(is_active=True), required=False, allow_null=True
+    )
+    date_from = serializers.DateTimeField()
+    date_to = serializers.DateTimeField()
+    filters = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['date_from'] >= attrs['date_to']:
+            raise serializers.ValidationError("date_from doit précéder date_to")
+        return attrs
+
+
 class DashboardSerializer(serializers.ModelSerializer):
     class Meta:
         model = Dashboard
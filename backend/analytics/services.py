@@ -0,0 +1,646 @@
+"""
+Services pour la génération et la mise en cache des rapports
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from tickets.filters import TicketFilter
+from tickets.models import Ticket
+from users.visibility import get_rules, ticket_predicate
+from .models import Report, ReportDailyAggregate
+
+logger = logging.getLogger(__name__)
+
+
+# Dimensions agrégées dans les données d'un rapport
+REPORT_DIMENSIONS = {
+    'by_status': 'status__name',
+    'by_category': 'category__name',
+    'by_priority': 'priority__name',
+    'by_channel': 'channel__name',
+}
+
+# Filtres dont le résultat change sans que les colonnes suivies par
+# ``tickets.read_model.REPORT_FIELDS`` changent (heure courante, texte, date de
+# mise à jour) : calculés à chaque demande, jamais réutilisés
+VOLATILE_FILTERS = {'search', 'is_overdue', 'updated_after', 'updated_before'}
+
+
+def normalize_filters(template=None, filters=None):
+    """Fusionner les filtres du modèle et de la demande sous une forme canonique"""
+    merged = dict(template.query_filters) if template and template.query_filters else {}
+    merged.update(filters or {})
+
+    normalized = {}
+    for key, value in merged.items():
+        if value in (None, '', [], {}):
+            continue
+        if isinstance(value, (list, tuple)):
+            value = sorted(str(v) for v in value)
+        elif isinstance(value, bool):
+            value = 'true' if value else 'false'
+        else:
+            value = str(value)
+        normalized[str(key)] = value
+    return dict(sorted(normalized.items()))
+
+
+def _digest(payload):
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _visibility_key(rules):
+    """Partie de la règle de visibilité qui restreint les tickets (voir ``ticket_predicate``)"""
+    if rules.get('unrestricted'):
+        return {'unrestricted': True}
+    return {
+        'psea': bool(rules.get('psea')),
+        'organization_id': rules.get('organization_id'),
+        # L'identifiant ne sert qu'aux tickets PSEA assignés à l'utilisateur
+        'user_id': None if rules.get('psea') else rules.get('user_id'),
+    }
+
+
+def build_scope_key(template, filters, rules=None):
+    """Clé indépendante de la période (agrégats journaliers)
+
+    ``rules`` : règle de visibilité du demandeur (``get_rules``) ; deux
+    utilisateurs ne partagent un agrégat que s'ils voient les mêmes tickets.
+    """
+    return _digest({
+        'template': template.pk if template else None,
+        'report_type': template.report_type if template else None,
+        'filters': filters,
+        'rules': _visibility_key(rules if rules is not None else get_rules(None)),
+    })
+
+
+def build_cache_key(template, filters, date_from, date_to, rules=None):
+    """Clé complète d'un rapport : modèle, filtres normalisés, visibilité et période"""
+    return _digest({
+        'scope': build_scope_key(template, filters, rules),
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+    })
+
+
+def empty_report_data():
+    data = {'total': 0, 'psea_count': 0}
+    for dimension in REPORT_DIMENSIONS:
+        data[dimension] = {}
+    return data
+
+
+def merge_report_data(target, partial):
+    """Fusionner un agrégat partiel dans un agrégat cumulé (sommes)"""
+    target['total'] += partial.get('total', 0)
+    target['psea_count'] += partial.get('psea_count', 0)
+    for dimension in REPORT_DIMENSIONS:
+        bucket = target[dimension]
+        for name, count in partial.get(dimension, {}).items():
+            bucket[name] = bucket.get(name, 0) + count
+    return target
+
+
+class ReportCacheService:
+    """Génération des rapports avec réutilisation des résultats déjà calculés
+
+    Une période close (terminée avant le début du jour courant) n'est pas
+    recalculée : les données d'un rapport terminé avec la même clé sont
+    réutilisées. Une période ouverte est calculée en fusionnant les agrégats
+    journaliers des jours clos (stockés) avec les seuls jours récents.
+
+    Seuls les tickets visibles par le demandeur sont agrégés
+    (``users.visibility``) ; sa règle fait partie des clés.
+
+    Un champ filtrable ou agrégé d'un ancien ticket peut changer :
+    ``invalidate`` écarte alors les agrégats de son jour de création et la clé
+    des rapports qui le couvrent.
+    """
+
+    @staticmethod
+    def _ticket_queryset(filters, rules=None):
+        queryset = Ticket.objects.all()
+        predicate = ticket_predicate(rules if rules is not None else get_rules(None))
+        if predicate is not None:
+            queryset = queryset.filter(predicate)
+        return TicketFilter(data=filters, queryset=queryset).qs
+
+    @staticmethod
+    def _start_of_day(value):
+        local = timezone.localtime(value)
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def _aggregate_rows(cls, queryset):
+        """Agrégat d'une tranche en une seule requête groupée"""
+        data = empty_report_data()
+        rows = queryset.values('is_psea', *REPORT_DIMENSIONS.values()).annotate(count=Count('id'))
+        for row in rows:
+            merge_report_data(data, cls._row_to_partial(row))
+        return data
+
+    @staticmethod
+    def _row_to_partial(row):
+        count = row['count']
+        partial = {'total': count, 'psea_count': count if row['is_psea'] else 0}
+        for dimension, field in REPORT_DIMENSIONS.items():
+            partial[dimension] = {row[field] or '': count}
+        return partial
+
+    @classmethod
+    def compute(cls, filters, date_from, date_to, rules=None):
+        """Calcul complet (sans cache) d'une période"""
+        queryset = cls._ticket_queryset(filters, rules).filter(
+            created_at__gte=date_from, created_at__lt=date_to
+        )
+        return cls._aggregate_rows(queryset)
+
+    @classmethod
+    def _daily_aggregates(cls, scope_key, filters, first_day, last_day, rules=None):
+        """Agrégats des jours clos [first_day, last_day], calculés si absents"""
+        days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+        stored = {
+            aggregate.day: aggregate.data
+            for aggregate in ReportDailyAggregate.objects.filter(
+                scope_key=scope_key, day__gte=first_day, day__lte=last_day
+            )
+        }
+        missing = [day for day in days if day not in stored]
+        if missing:
+            computed = cls._compute_days(filters, missing, rules)
+            ReportDailyAggregate.objects.bulk_create(
+                [
+                    ReportDailyAggregate(scope_key=scope_key, day=day, data=data)
+                    for day, data in computed.items()
+                ],
+                ignore_conflicts=True
+            )
+            stored.update(computed)
+        return [stored[day] for day in days]
+
+    @classmethod
+    def _compute_days(cls, filters, days, rules=None):
+        """Calcul des agrégats journaliers manquants en une requête groupée par jour"""
+        missing = set(days)
+        start = timezone.make_aware(datetime.combine(min(days), time.min))
+        end = start + timedelta(days=(max(days) - min(days)).days + 1)
+
+        partials = {day: empty_report_data() for day in days}
+        rows = (
+            cls._ticket_queryset(filters, rules)
+            .filter(created_at__gte=start, created_at__lt=end)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'is_psea', *REPORT_DIMENSIONS.values())
+            .annotate(count=Count('id'))
+        )
+        for row in rows:
+            if row['day'] in missing:
+                merge_report_data(partials[row['day']], cls._row_to_partial(row))
+        return partials
+
+    @classmethod
+    def compute_incremental(cls, template, filters, date_from, date_to, rules=None):
+        """Calcul d'une période à partir des agrégats des jours clos et des jours récents"""
+        today_start = cls._start_of_day(timezone.now())
+        first_full = cls._start_of_day(date_from)
+        if first_full < date_from:
+            first_full += timedelta(days=1)
+        last_full_end = min(cls._start_of_day(date_to), today_start)
+
+        if first_full >= last_full_end or VOLATILE_FILTERS & set(filters):
+            return cls.compute(filters, date_from, date_to, rules)
+
+        data = empty_report_data()
+        scope_key = build_scope_key(template, filters, rules)
+        for partial in cls._daily_aggregates(
+            scope_key, filters, first_full.date(), (last_full_end - timedelta(days=1)).date(), rules
+        ):
+            merge_report_data(data, partial)
+
+        # Tranches non couvertes par les jours clos : début partiel et jours récents
+        if date_from < first_full:
+            merge_report_data(data, cls.compute(filters, date_from, first_full, rules))
+        if last_full_end < date_to:
+            merge_report_data(data, cls.compute(filters, last_full_end, date_to, rules))
+        return data
+
+    @classmethod
+    def invalidate(cls, days=None):
+        """Écarter les résultats calculés sur des jours modifiés (``None`` : tous)"""
+        aggregates = ReportDailyAggregate.objects.all()
+        reports = Report.objects.exclude(cache_key='')
+        if days is not None:
+            if not days:
+                return
+            aggregates = aggregates.filter(day__in=list(days))
+            start = timezone.make_aware(datetime.combine(min(days), time.min))
+            end = timezone.make_aware(datetime.combine(max(days) + timedelta(days=1), time.min))
+            reports = reports.filter(date_from__lt=end, date_to__gt=start)
+        aggregates.delete()
+        # Le rapport reste consultable, il n'est simplement plus réutilisé
+        reports.update(cache_key='')
+
+    @classmethod
+    def get_or_generate(cls, name, template, filters, date_from, date_to, user, description=''):
+        """Retourner un rapport terminé correspondant ou en générer un nouveau
+
+        Le rapport d'un autre utilisateur (ou d'un autre nom) n'est jamais
+        modifié : ses données sont recopiées dans un nouveau rapport, et
+        seulement si cet utilisateur voit les mêmes tickets (même clé).
+        Retourne un tuple ``(report, cached)``.
+        """
+        filters = normalize_filters(template, filters)
+        rules = get_rules(user)
+        cache_key = build_cache_key(template, filters, date_from, date_to, rules)
+        is_closed = date_to <= cls._start_of_day(timezone.now())
+        if VOLATILE_FILTERS & set(filters):
+            # Aucune invalidation possible : ni réutilisé, ni réutilisable
+            cache_key, is_closed = '', False
+
+        existing = None
+        if is_closed:
+            existing = Report.objects.filter(cache_key=cache_key, status='completed').order_by('-generated_at').first()
+        if existing and existing.created_by_id == user.pk and existing.name == name:
+            return existing, True
+
+        report = Report(
+            name=name,
+            description=description,
+            template=template,
+            date_from=date_from,
+            date_to=date_to,
+            filters=filters,
+            cache_key=cache_key,
+            created_by=user,
+            status='generating',
+        )
+        if existing:
+            report.data = existing.data
+            report.status = 'completed'
+            report.generated_at = existing.generated_at
+            report.save()
+            return report, True
+        try:
+            report.data = cls.compute_incremental(template, filters, date_from, date_to, rules)
+            report.status = 'completed'
+            report.error_message = ''
+        except Exception as e:
+            logger.error(f"Erreur de génération du rapport {cache_key}: {e}")
+            report.status = 'failed'
+            report.error_message = str(e)
+        report.generated_at = timezone.now()
+        report.save()
+        return report, False
+
+
+class WidgetQueryError(ValueError):
+    """Requête de widget invalide (hors de la liste autorisée)"""
+
+
+class WidgetQueryEngine:
+    """Exécution des requêtes de widgets (``Widget.query``) côté serveur
+
+    Le DSL accepté est volontairement restreint ::
+
+        {
+            "source": "tickets",
+            "group_by": ["status", "month"],
+            "metrics": [{"op": "count"}, {"op": "avg", "field": "satisfaction_rating"}],
+            "filters": {"is_psea": false}
+        }
+
+    Les widgets d'un tableau de bord portant sur la même source, les mêmes
+    dimensions et les mêmes filtres sont fusionnés en une seule requête SQL.
+    Chaque source est restreinte aux tickets visibles par le demandeur
+    (``users.visibility``) ; les résultats sont mis en cache par widget et par
+    règle de visibilité (``config.cache_ttl`` secondes).
+    """
+
+    DEFAULT_TTL = 60
+    AGGREGATES = {
+        'count': Count,
+        'sum': Sum,
+        'avg': Avg,
+        'min': Min,
+        'max': Max,
+    }
+    TIME_BUCKETS = {
+        'day': TruncDate,
+        'week': TruncWeek,
+        'month': TruncMonth,
+    }
+
+    @staticmethod
+    def _sources():
+        from channels.models import Message
+        from tickets.models import Feedback
+
+        return {
+            'tickets': {
+                'model': Ticket,
+                'filterset': TicketFilter,
+                'dimensions': {
+                    'status': 'status__name',
+                    'category': 'category__name',
+                    'priority': 'priority__name',
+                    'channel': 'channel__name',
+                    'assigned_to': 'assigned_to__username',
+                    'is_psea': 'is_psea',
+                    'is_anonymous': 'is_anonymous',
+                },
+                'fields': {},
+                'date_field': 'created_at',
+                'ticket_prefix': '',
+            },
+            'feedback': {
+                'model': Feedback,
+                'filterset': None,
+                'dimensions': {
+                    'category': 'ticket__category__name',
+                    'channel': 'ticket__channel__name',
+                    'would_recommend': 'would_recommend',
+                },
+                'fields': {
+                    'satisfaction_rating': 'satisfaction_rating',
+                    'response_time_rating': 'response_time_rating',
+                    'quality_rating': 'quality_rating',
+                },
+                'date_field': 'created_at',
+                'ticket_prefix': 'ticket__',
+            },
+            'messages': {
+                'model': Message,
+                'filterset': None,
+                'dimensions': {
+                    'status': 'status',
+                    'channel': 'channel__name',
+                    'channel_type': 'channel__type',
+                },
+                'fields': {},
+                'date_field': 'created_at',
+                # Messages sans ticket (tests d'envoi) : visibles comme dans MessageViewSet
+                'ticket_prefix': 'ticket__',
+                'ticketless': True,
+            },
+        }
+
+    @classmethod
+    def compile(cls, query, extra_filters=None, rules=None):
+        """Valider une requête de widget et la ramener à une forme canonique
+
+        ``rules`` : règle de visibilité compilée du demandeur (``get_rules``).
+        """
+        if not isinstance(query, dict):
+            raise WidgetQueryError("La requête doit être un objet")
+
+        sources = cls._sources()
+        source_name = query.get('source', 'tickets')
+        source = sources.get(source_name)
+        if source is None:
+            raise WidgetQueryError(f"Source non autorisée: {source_name}")
+
+        group_by = query.get('group_by') or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        if not isinstance(group_by, list) or not all(isinstance(dimension, str) for dimension in group_by):
+            raise WidgetQueryError("group_by doit être une liste de dimensions")
+        for dimension in group_by:
+            if dimension not in source['dimensions'] and dimension not in cls.TIME_BUCKETS:
+                raise WidgetQueryError(f"Dimension non autorisée: {dimension}")
+
+        metrics = []
+        requested = query.get('metrics') or [{'op': 'count'}]
+        if not isinstance(requested, list):
+            raise WidgetQueryError("metrics doit être une liste")
+        for metric in requested:
+            if not isinstance(metric, dict):
+                raise WidgetQueryError("Chaque métrique doit être un objet")
+            op = metric.get('op', 'count')
+            field = metric.get('field')
+            if not isinstance(op, str) or op not in cls.AGGREGATES:
+                raise WidgetQueryError(f"Agrégat non autorisé: {op}")
+            if op != 'count' and (not isinstance(field, str) or field not in source['fields']):
+                raise WidgetQueryError(f"Champ non autorisé: {field}")
+            metrics.append((op, field if op != 'count' else None))
+
+        for value in (extra_filters, query.get('filters')):
+            if value and not isinstance(value, dict):
+                raise WidgetQueryError("Les filtres doivent être un objet")
+        filters = dict(extra_filters or {})
+        filters.update(query.get('filters') or {})
+
+        return {
+            'source': source_name,
+            'group_by': tuple(group_by),
+            'metrics': tuple(metrics),
+            'filters': normalize_filters(filters=filters),
+            'rules': rules if rules is not None else get_rules(None),
+        }
+
+    @staticmethod
+    def options(config):
+        """Valider ``Widget.config`` ; retourne ``(limit, cache_ttl)``"""
+        config = config if isinstance(config, dict) else {}
+        values = []
+        for name, default, minimum in (('limit', None, 1), ('cache_ttl', WidgetQueryEngine.DEFAULT_TTL, 0)):
+            value = config.get(name, default)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < minimum):
+                raise WidgetQueryError(f"{name} doit être un entier supérieur ou égal à {minimum}")
+            values.append(value)
+        return tuple(values)
+
+    @staticmethod
+    def metric_alias(op, field):
+        return f"{op}_{field}" if field else op
+
+    @classmethod
+    def _queryset(cls, source, filters, rules):
+        queryset = source['model'].objects.all()
+        predicate = ticket_predicate(rules, prefix=source['ticket_prefix'])
+        if predicate is not None:
+            if source.get('ticketless'):
+                predicate |= Q(ticket__isnull=True)
+            queryset = queryset.filter(predicate)
+        date_field = source['date_field']
+        filters = dict(filters)
+        date_from = filters.pop('created_after', None)
+        date_to = filters.pop('created_before', None)
+
+        if source['filterset'] is not None:
+            unknown = sorted(set(filters) - set(source['filterset'].base_filters))
+            if unknown:
+                raise WidgetQueryError(f"Filtre non autorisé: {unknown[0]}")
+            if date_from:
+                filters['created_after'] = date_from
+            if date_to:
+                filters['created_before'] = date_to
+            filterset = source['filterset'](data=filters, queryset=queryset)
+            if not filterset.is_valid():
+                # Une valeur invalide serait sinon ignorée silencieusement
+                raise WidgetQueryError(f"Filtre invalide: {next(iter(filterset.errors))}")
+            return filterset.qs
+
+        lookups = {}
+        for name, value in filters.items():
+            path = source['dimensions'].get(name)
+            if path is None:
+                raise WidgetQueryError(f"Filtre non autorisé: {name}")
+            lookups[path] = {'true': True, 'false': False}.get(value, value)
+        if date_from:
+            lookups[f'{date_field}__gte'] = date_from
+        if date_to:
+            lookups[f'{date_field}__lte'] = date_to
+        return queryset.filter(**lookups)
+
+    @classmethod
+    def execute_group(cls, source_name, group_by, filters, metrics, rules):
+        """Exécuter en une requête l'union des métriques de widgets compatibles"""
+        source = cls._sources()[source_name]
+        queryset = cls._queryset(source, filters, rules)
+
+        dimensions = {}
+        for dimension in group_by:
+            if dimension in cls.TIME_BUCKETS:
+                dimensions[f'd_{dimension}'] = cls.TIME_BUCKETS[dimension](source['date_field'])
+            else:
+                dimensions[f'd_{dimension}'] = F(source['dimensions'][dimension])
+
+        aggregates = {}
+        for op, field in metrics:
+            aggregates[cls.metric_alias(op, field)] = cls.AGGREGATES[op](
+                source['fields'][field] if field else 'pk'
+            )
+
+        if not dimensions:
+            return [queryset.aggregate(**aggregates)]
+
+        aliases = list(dimensions)
+        rows = (
+            queryset.annotate(**dimensions)
+            .values(*aliases)
+            .annotate(**aggregates)
+            .order_by(*aliases)
+        )
+        return [
+            {
+                **{alias[2:]: row[alias] for alias in aliases},
+                **{name: row[name] for name in aggregates},
+            }
+            for row in rows
+        ]
+
+    @classmethod
+    def _cache_key(cls, widget_key, compiled):
+        return f"widget:{widget_key}:{_digest([compiled['source'], compiled['group_by'], compiled['metrics'], compiled['filters'], compiled['rules']])}"
+
+    @classmethod
+    def _format(cls, compiled, rows, limit=None):
+        names = [cls.metric_alias(op, field) for op, field in compiled['metrics']]
+        dims = list(compiled['group_by'])
+        projected = [
+            {
+                **{dim: row[dim] for dim in dims},
+                **{name: row[name] for name in names},
+            }
+            for row in rows
+        ]
+        if not dims:
+            return {'value': projected[0] if projected else {}}
+        if limit:
+            projected = projected[:limit]
+        return {'rows': projected}
+
+    @classmethod
+    def evaluate(cls, widgets, extra_filters=None, user=None):
+        """Évaluer une liste de widgets ``(clé, query, config)`` en minimisant les requêtes
+
+        Seuls les tickets visibles par ``user`` sont agrégés. Retourne un
+        dictionnaire ``{clé: résultat}``.
+        """
+        results = {}
+        pending = {}
+        rules = get_rules(user)
+
+        for widget_key, query, config in widgets:
+            try:
+                config = cls.options(config)
+                compiled = cls.compile(query, extra_filters, rules)
+            except WidgetQueryError as e:
+                results[widget_key] = {'error': str(e)}
+                continue
+
+            cache_key = cls._cache_key(widget_key, compiled)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                results[widget_key] = cached
+                continue
+
+            group = (compiled['source'], compiled['group_by'], json.dumps(compiled['filters'], sort_keys=True))
+            pending.setdefault(group, []).append((widget_key, compiled, config, cache_key))
+
+        for (source_name, group_by, _), members in pending.items():
+            metrics = []
+            for _, compiled, _, _ in members:
+                for metric in compiled['metrics']:
+                    if metric not in metrics:
+                        metrics.append(metric)
+            try:
+                rows = cls.execute_group(
+                    source_name, group_by, members[0][1]['filters'], metrics, members[0][1]['rules']
+                )
+            except WidgetQueryError as e:
+                for widget_key, _, _, _ in members:
+                    results[widget_key] = {'error': str(e)}
+                continue
+
+            for widget_key, compiled, (limit, cache_ttl), cache_key in members:
+                result = cls._format(compiled, rows, limit)
+                cache.set(cache_key, result, cache_ttl)
+                results[widget_key] = result
+
+        return results
+
+    @classmethod
+    def evaluate_dashboard(cls, dashboard, user=None):
+        """Évaluer tous les widgets d'un tableau de bord en une seule passe
+
+        ``Dashboard.widgets`` peut contenir des identifiants de ``Widget``,
+        des objets ``{"id": ...}`` ou des widgets en ligne ``{"key", "query", "config"}``.
+        """
+        from .models import Widget
+
+        widget_ids = []
+        for item in dashboard.widgets:
+            if isinstance(item, dict):
+                if item.get('id') is not None and 'query' not in item:
+                    widget_ids.append(item['id'])
+            else:
+                widget_ids.append(item)
+        stored = Widget.objects.filter(pk__in=widget_ids, is_active=True).in_bulk()
+
+        widgets = []
+        for position, item in enumerate(dashboard.widgets):
+            if isinstance(item, dict) and 'query' in item:
+                key = str(item.get('key') or item.get('id') or f'inline-{position}')
+                widgets.append((f'{dashboard.pk}:{key}', item['query'], item.get('config')))
+                continue
+            widget_id = item.get('id') if isinstance(item, dict) else item
+            widget = stored.get(widget_id)
+            if widget is not None:
+                widgets.append((str(widget.pk), widget.query, widget.config))
+
+        results = cls.evaluate(widgets, dashboard.filters, user)
+        prefix = f'{dashboard.pk}:'
+        return {
+            key[len(prefix):] if key.startswith(prefix) else key: value
+            for key, value in results.items()
+        }
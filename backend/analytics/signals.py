@@ -0,0 +1,23 @@
+"""
+Signaux de l'application analytics
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from tickets.models import Ticket
+from tickets.read_model import report_facts_changed
+
+from .services import ReportCacheService
+
+
+@receiver(report_facts_changed)
+def invalidate_report_days(sender, days, **kwargs):
+    """Écarter les agrégats des jours dont un ticket a changé"""
+    ReportCacheService.invalidate(days)
+
+
+@receiver(post_delete, sender=Ticket)
+def invalidate_deleted_ticket_day(sender, instance, **kwargs):
+    if instance.created_at:
+        ReportCacheService.invalidate({timezone.localtime(instance.created_at).date()})
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from analytics.models import ReportDailyAggregate
+from analytics.services import ReportCacheService
+from tickets.models import Category, Channel, Priority, Status, Ticket
+from users.models import Role, User
+
+
+class ReportCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.open = Status.objects.create(name='Ouvert')
+        cls.closed = Status.objects.create(name='Fermé', is_final=True)
+        manager = Role.objects.create(name='Manager', permissions=['all'])
+        cls.owner = User.objects.create_user('owner', password='x', role=manager)
+        cls.other = User.objects.create_user('other', password='x', role=manager)
+        cls.agent = User.objects.create_user('agent', password='x')
+
+    def setUp(self):
+        today = ReportCacheService._start_of_day(timezone.now())
+        self.date_from = today - timedelta(days=5)
+        self.closed_to = today - timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Information')
+            self.ticket = Ticket.objects.create(
+                title='Ticket', content='Contenu', status=self.open, category=self.category,
+                priority=Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+                channel=Channel.objects.create(name='Web', type='web'),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.created_at = today - timedelta(days=3)
+            self.ticket.save()
+
+    def generate(self, user=None, name='Hebdo', date_to=None):
+        return ReportCacheService.get_or_generate(
+            name, None, {}, self.date_from, date_to or timezone.now(), user or self.owner
+        )
+
+    def close_ticket(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.status = self.closed
+            self.ticket.save()
+
+    def test_daily_aggregates_follow_status_changes(self):
+        report, _ = self.generate()
+        self.assertEqual(report.data['by_status'], {'Ouvert': 1})
+        self.assertTrue(ReportDailyAggregate.objects.exists())
+        self.close_ticket()
+        report, _ = self.generate()
+        self.assertEqual(report.data['by_status'], {'Fermé': 1})
+
+    def test_closed_period_is_reused_until_a_ticket_changes(self):
+        first, cached = self.generate(date_to=self.closed_to)
+        self.assertFalse(cached)
+        self.assertEqual(self.generate(date_to=self.closed_to), (first, True))
+        self.close_ticket()
+        report, cached = self.generate(date_to=self.closed_to)
+        self.assertFalse(cached)
+        self.assertEqual(report.data['by_status'], {'Fermé': 1})
+        first.refresh_from_db()
+        self.assertEqual(first.data['by_status'], {'Ouvert': 1})
+
+    def test_other_users_reports_are_not_modified(self):
+        first, _ = self.generate(date_to=self.closed_to)
+        report, cached = self.generate(self.other, 'Mensuel', date_to=self.closed_to)
+        self.assertTrue(cached)
+        self.assertNotEqual(report.pk, first.pk)
+        self.assertEqual((report.name, report.created_by), ('Mensuel', self.other))
+        self.assertEqual(report.data, first.data)
+        first.refresh_from_db()
+        self.assertEqual((first.name, first.created_by), ('Hebdo', self.owner))
+
+    def test_reports_follow_visibility(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.is_psea = True
+            self.ticket.save()
+        first, _ = self.generate(date_to=self.closed_to)
+        self.assertEqual(first.data['psea_count'], 1)
+        # Utilisateur non habilité PSEA : ni copie du rapport, ni agrégat partagé
+        report, cached = self.generate(self.agent, date_to=self.closed_to)
+        self.assertFalse(cached)
+        self.assertEqual((report.data['total'], report.data['psea_count']), (0, 0))
+        report, _ = self.generate(self.agent)
+        self.assertEqual(report.data['total'], 0)
+
+    def test_filtered_aggregates_follow_ticket_changes(self):
+        filters = {'is_anonymous': True}
+        generate = lambda: ReportCacheService.get_or_generate(
+            'Agent', None, filters, self.date_from, timezone.now(), self.owner
+        )[0]
+        self.assertEqual(generate().data['total'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.is_anonymous = True
+            self.ticket.save()
+        self.assertEqual(generate().data['total'], 1)
+
+    def test_only_renames_discard_aggregates(self):
+        self.generate()
+        self.category.description = 'Demandes générales'
+        self.category.save()
+        self.assertTrue(ReportDailyAggregate.objects.exists())
+        self.category.name = 'Renseignements'
+        self.category.save()
+        self.assertFalse(ReportDailyAggregate.objects.exists())
+        report, _ = self.generate()
+        self.assertEqual(report.data['by_category'], {'Renseignements': 1})
+
+    def test_volatile_filters_are_not_cached(self):
+        report, cached = ReportCacheService.get_or_generate(
+            'Recherche', None, {'search': 'Contenu'}, self.date_from, self.closed_to, self.owner
+        )
+        self.assertEqual((report.data['total'], report.cache_key, cached), (1, '', False))
+        self.assertFalse(ReportDailyAggregate.objects.exists())
@@ -0,0 +1,62 @@
+from django.test import TestCase
+
+from analytics.services import WidgetQueryEngine, WidgetQueryError
+from tickets.models import Category, Channel, Priority, Status, Ticket
+from users.models import Role, User
+
+
+class WidgetQueryEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        references = {
+            'category': Category.objects.create(name='Information'),
+            'priority': Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            'status': Status.objects.create(name='Ouvert'),
+            'channel': Channel.objects.create(name='Web', type='web'),
+        }
+        Ticket.objects.create(title='Public', content='...', **references)
+        Ticket.objects.create(title='PSEA', content='...', is_psea=True, **references)
+        cls.agent = User.objects.create_user(
+            'agent', password='x', role=Role.objects.create(name='Agent', permissions=['view_tickets'])
+        )
+        cls.focal_point = User.objects.create_user(
+            'focal', password='x',
+            role=Role.objects.create(name='PSEA', permissions=['all'], is_psea_authorized=True),
+        )
+
+    def count(self, user, query):
+        return WidgetQueryEngine.evaluate([('w', query, {'cache_ttl': 0})], user=user)['w']
+
+    def test_psea_tickets_are_hidden_from_unauthorized_users(self):
+        query = {'source': 'tickets', 'group_by': ['is_psea']}
+        self.assertEqual(self.count(self.agent, query)['rows'], [{'is_psea': False, 'count': 1}])
+        self.assertEqual(self.count(None, {'source': 'tickets'})['value'], {'count': 1})
+        self.assertEqual(len(self.count(self.focal_point, query)['rows']), 2)
+
+    def test_malformed_queries_are_rejected(self):
+        for query in (
+            {'metrics': ['count']},
+            {'metrics': {'op': 'count'}},
+            {'metrics': [{'op': ['count']}]},
+            {'group_by': [['status']]},
+            {'group_by': [{'a': 1}]},
+            {'filters': ['is_psea']},
+        ):
+            with self.assertRaises(WidgetQueryError, msg=query):
+                WidgetQueryEngine.compile(query)
+            self.assertIn('error', self.count(self.agent, query))
+
+    def test_invalid_filters_are_rejected(self):
+        for filters in ({'unknown': 1}, {'created_after': 'pas une date'}):
+            result = self.count(self.focal_point, {'source': 'tickets', 'filters': filters})
+            self.assertIn('error', result, filters)
+        result = self.count(self.focal_point, {'source': 'tickets', 'filters': {'is_psea': 'true'}})
+        self.assertEqual(result['value'], {'count': 1})
+
+    def test_invalid_config_is_rejected(self):
+        for config in ({'limit': 'abc'}, {'limit': 0}, {'cache_ttl': '60'}, {'cache_ttl': True}):
+            result = WidgetQueryEngine.evaluate([('w', {'group_by': ['status']}, config)], user=self.agent)['w']
+            self.assertIn('error', result, config)
+        result = WidgetQueryEngine.evaluate([('w', {'group_by': ['is_psea']}, {'limit': 1, 'cache_ttl': 0})],
+                                            user=self.focal_point)['w']
+        self.assertEqual(len(result['rows']), 1)
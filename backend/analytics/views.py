@@ -16,8 +16,9 @@ from .models import (
 from .serializers import (
     ReportTemplateSerializer, ReportSerializer, DashboardSerializer, WidgetSerializer,
     MetricSerializer, MetricValueSerializer, AlertSerializer, AlertEventSerializer,
-    ExportJobSerializer
+    ExportJobSerializer, ReportGenerateSerializer
 )
+from .services import ReportCacheService, WidgetQueryEngine
 
 
 class ReportTemplateViewSet(viewsets.ModelViewSet):
@@ -36,6 +37,26 @@ class ReportViewSet(viewsets.ModelViewSet):
         qs = self.get_queryset().order_by('-created_at')[:10]
         return Response(ReportSerializer(qs, many=True).data)
 
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Générer un rapport, ou réutiliser un rapport identique déjà calculé"""
+        serializer = ReportGenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        report, cached = ReportCacheService.get_or_generate(
+            name=params['name'],
+            template=params.get('template'),
+            filters=params.get('filters'),
+            date_from=params['date_from'],
+            date_to=params['date_to'],
+            user=request.user,
+            description=params.get('description', ''),
+        )
+        data = ReportSerializer(report).data
+        data['cached'] = cached
+        return Response(data, status=status.HTTP_200_OK if cached else status.HTTP_201_CREATED)
+
 
 class DashboardViewSet(viewsets.ModelViewSet):
     queryset = Dashboard.objects.all()
@@ -47,12 +68,32 @@ class DashboardViewSet(viewsets.ModelViewSet):
         # Optionally filter to public or owned dashboards
         return qs.filter(is_public=True) | qs.filter(created_by=self.request.user)
 
+    @action(detail=True, methods=['get'])
+    def data(self, request, pk=None):
+        """Données de tous les widgets du tableau de bord en une seule requête"""
+        dashboard = self.get_object()
+        return Response({
+            'dashboard': dashboard.pk,
+            'widgets': WidgetQueryEngine.evaluate_dashboard(dashboard, request.user),
+        })
+
 
 class WidgetViewSet(viewsets.ModelViewSet):
     queryset = Widget.objects.all()
     serializer_class = WidgetSerializer
     permission_classes = [IsAuthenticated]
 
+    @action(detail=True, methods=['get'])
+    def data(self, request, pk=None):
+        """Données d'un widget"""
+        widget = self.get_object()
+        key = str(widget.pk)
+        results = WidgetQueryEngine.evaluate([(key, widget.query, widget.config)], user=request.user)
+        result = results[key]
+        if 'error' in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
 
 class MetricViewSet(viewsets.ModelViewSet):
     queryset = Metric.objects.all()
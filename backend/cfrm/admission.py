@@ -0,0 +1,247 @@
+"""
+Contrôle d'admission des requêtes API
+
+Chaque requête est rattachée à une classe de points d'accès (``ADMISSION
+['CLASSES']``, premier motif de chemin correspondant) puis à une identité :
+l'utilisateur d'un jeton JWT valide (vérifié sans requête en base) ou d'une
+session, sinon l'adresse IP. Deux limites s'appliquent avant la vue :
+
+- un débit par identité et par classe, en fenêtre fixe dans le cache partagé
+  (``RATELIMIT_USE_CACHE``) : au-delà, réponse 429 avec ``Retry-After`` ;
+- un nombre maximal de requêtes anonymes simultanées par classe : au-delà,
+  réponse 503 immédiate, pour que les soumissions publiques ou le
+  moissonnage des statistiques ne saturent pas les workers.
+
+Les fournisseurs de webhooks appellent depuis peu d'adresses : une classe
+``SIGNATURE`` identifie par le fournisseur l'appel dont la signature est
+valide (débit ``SIGNED_RATE``, sans plafond de concurrence) ; un appel non
+signé reste limité par adresse IP.
+
+Les utilisateurs authentifiés suivent la limite ``STAFF`` et ne sont pas
+soumis aux plafonds de concurrence. En cas d'erreur du cache, la requête est
+admise.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'KEY_PREFIX': 'admission:',
+    'TRUST_FORWARDED_FOR': False,
+    'CONCURRENCY_TIMEOUT': 60,
+    'RETRY_AFTER_OVERLOAD': 2,
+    'CLASSES': {},
+    'STAFF': {'RATE': '1200/m'},
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ADMISSION', {}))
+    return config
+
+
+def parse_rate(rate):
+    """``'120/m'`` -> ``(120, 60)``"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip()[0]]
+
+
+class EndpointClass:
+    def __init__(self, name, options):
+        self.name = name
+        self.patterns = [re.compile(pattern) for pattern in options.get('PATHS', [])]
+        self.methods = {method.upper() for method in options.get('METHODS', [])}
+        self.rate = parse_rate(options['RATE']) if options.get('RATE') else None
+        self.concurrency = options.get('CONCURRENCY')
+        self.signature = SIGNATURES[options['SIGNATURE']] if options.get('SIGNATURE') else None
+        self.signed_rate = parse_rate(options['SIGNED_RATE']) if options.get('SIGNED_RATE') else None
+
+    def matches(self, request):
+        if self.methods and request.method not in self.methods:
+            return False
+        return any(pattern.search(request.path_info) for pattern in self.patterns)
+
+
+def twilio_signature_valid(request):
+    """``X-Twilio-Signature`` : HMAC-SHA1 de l'URL suivie des paramètres triés"""
+    token = getattr(settings, 'TWILIO_AUTH_TOKEN', '')
+    signature = request.META.get('HTTP_X_TWILIO_SIGNATURE', '')
+    if not token or not signature:
+        return False
+    payload = request.build_absolute_uri() + ''.join(
+        f'{key}{value}' for key in sorted(request.POST) for value in request.POST.getlist(key)
+    )
+    digest = hmac.new(token.encode(), payload.encode(), hashlib.sha1).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), signature)
+
+
+def meta_signature_valid(request):
+    """``X-Hub-Signature-256`` (WhatsApp) : HMAC-SHA256 du corps"""
+    secret = getattr(settings, 'WHATSAPP_APP_SECRET', '')
+    signature = request.META.get('HTTP_X_HUB_SIGNATURE_256', '')
+    if not secret or not signature.startswith('sha256='):
+        return False
+    digest = hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(digest, signature[7:])
+
+
+SIGNATURES = {'twilio': twilio_signature_valid, 'meta': meta_signature_valid}
+
+
+def client_ip(request, trust_forwarded=False):
+    if trust_forwarded:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identify(request, config):
+    """Identité ``(clé, authentifié)`` de l'appelant"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Bearer '):
+        try:
+            token = AccessToken(header[7:].strip())
+            return f"user:{token[api_settings.USER_ID_CLAIM]}", True
+        except (TokenError, KeyError):
+            pass
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}", True
+    ip = client_ip(request, config['TRUST_FORWARDED_FOR'])
+    return f"ip:{hashlib.sha1(ip.encode()).hexdigest()[:16]}", False
+
+
+class AdmissionController:
+    """Limites de débit et de concurrence adossées au cache partagé"""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.cache = caches[getattr(settings, 'RATELIMIT_USE_CACHE', 'default')]
+        self.prefix = self.config['KEY_PREFIX']
+        self.classes = [EndpointClass(name, options) for name, options in self.config['CLASSES'].items()]
+        staff_rate = self.config['STAFF'].get('RATE')
+        self.staff_rate = parse_rate(staff_rate) if staff_rate else None
+
+    def classify(self, request):
+        for endpoint in self.classes:
+            if endpoint.matches(request):
+                return endpoint
+        return None
+
+    def hit(self, key, rate, now=None):
+        """Compter une requête ; retourne l'attente avant la prochaine fenêtre, ou 0"""
+        limit, period = rate
+        now = now if now is not None else time.time()
+        window_key = f"{self.prefix}rate:{key}:{int(now // period)}"
+        if self.cache.add(window_key, 1, period + 1):
+            return 0
+        try:
+            count = self.cache.incr(window_key)
+        except ValueError:
+            self.cache.set(window_key, 1, period + 1)
+            return 0
+        if count > limit:
+            return period - (now % period)
+        return 0
+
+    def enter(self, endpoint, now=None):
+        """Occuper un emplacement de la classe
+
+        Retourne la clé du compteur incrémenté (à rendre par ``leave``), ``''``
+        si le cache n'a rien compté, ou ``None`` si le plafond est atteint.
+        Les entrées sont comptées par fenêtre de ``CONCURRENCY_TIMEOUT``
+        secondes, la fenêtre précédente restant comptée : chaque sortie
+        décrémente le compteur qu'elle a incrémenté (jamais négatif) et une
+        sortie perdue (worker tué en cours de requête) est oubliée après deux
+        fenêtres.
+        """
+        timeout = self.config['CONCURRENCY_TIMEOUT']
+        window = int((now if now is not None else time.time()) // timeout)
+        base = f"{self.prefix}active:{endpoint.name}:"
+        key = f"{base}{window}"
+        self.cache.add(key, 0, 2 * timeout + 1)
+        try:
+            active = self.cache.incr(key)
+        except ValueError:
+            return ''
+        active += max(self.cache.get(f"{base}{window - 1}", 0), 0)
+        if active > endpoint.concurrency:
+            self.leave(key)
+            return None
+        return key
+
+    def leave(self, key):
+        if not key:
+            return
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+
+def reject(status, message, retry_after):
+    response = JsonResponse({'error': message}, status=status)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class AdmissionMiddleware:
+    """Refuser au plus tôt (429/503) les requêtes au-delà des limites"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.controller = AdmissionController()
+
+    def __call__(self, request):
+        if not getattr(settings, 'RATELIMIT_ENABLE', True) or request.method == 'OPTIONS':
+            return self.get_response(request)
+
+        controller = self.controller
+        endpoint = controller.classify(request)
+        if endpoint is None:
+            return self.get_response(request)
+
+        slot = None
+        try:
+            if endpoint.signature and endpoint.signature(request):
+                identity, authenticated = 'signed', True
+                rate = endpoint.signed_rate
+            else:
+                identity, authenticated = identify(request, controller.config)
+                rate = controller.staff_rate if authenticated else endpoint.rate
+            if rate:
+                retry_after = controller.hit(f"{endpoint.name}:{identity}", rate)
+                if retry_after:
+                    return reject(429, "Trop de requêtes, veuillez réessayer plus tard", retry_after)
+            if endpoint.concurrency and not authenticated:
+                slot = controller.enter(endpoint)
+                if slot is None:
+                    return reject(
+                        503, "Service surchargé, veuillez réessayer plus tard",
+                        controller.config['RETRY_AFTER_OVERLOAD']
+                    )
+        except Exception as e:
+            logger.warning(f"Contrôle d'admission indisponible, requête admise: {e}")
+
+        try:
+            return self.get_response(request)
+        finally:
+            controller.leave(slot)
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class CfrmConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'cfrm'
+    verbose_name = 'Plateforme CFRM'
+
+    def ready(self):
+        from .audit import audit_pipeline
+
+        audit_pipeline.connect()
@@ -0,0 +1,234 @@
+"""
+Pipeline d'audit sélectif et asynchrone
+
+Remplace l'enregistrement de tous les modèles par django-auditlog. Seuls les
+modèles configurés dans ``AUDIT_PIPELINE`` sont suivis ; les différences sont
+calculées par rapport à l'état chargé (sans requête supplémentaire), filtrées
+par champ, puis placées à la validation de la transaction (aucune entrée pour
+une écriture annulée) dans une file vidée par lots (``bulk_create`` de
+``auditlog.LogEntry``) par un thread d'arrière-plan.
+"""
+import atexit
+import json
+import logging
+import threading
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_request = ContextVar('audit_request', default=None)
+
+DEFAULTS = {
+    'INCLUDE': [],
+    'EXCLUDE': [],
+    'INCLUDE_FIELDS': {},
+    'EXCLUDE_FIELDS': {},
+    'FLUSH_INTERVAL': 2,
+    'BATCH_SIZE': 200,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'AUDIT_PIPELINE', {}))
+    return config
+
+
+class AuditContextMiddleware:
+    """Mémoriser l'auteur et l'adresse IP de la requête pour les entrées d'audit"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+
+def current_actor():
+    """Auteur et adresse IP de la requête en cours
+
+    L'utilisateur est lu au moment de l'entrée d'audit : DRF le reporte sur la
+    requête Django après l'authentification JWT.
+    """
+    request = _request.get()
+    if request is None:
+        return None, None
+    user = getattr(request, 'user', None)
+    actor_id = user.pk if user is not None and user.is_authenticated else None
+    return actor_id, request.META.get('REMOTE_ADDR')
+
+
+class AuditPipeline:
+    """File d'entrées d'audit écrites par lots"""
+
+    SNAPSHOT_ATTR = '_audit_snapshot'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = []
+        self._timer = None
+        self._fields = {}
+
+    # Configuration -------------------------------------------------------
+
+    @staticmethod
+    def _matches(model, labels):
+        return model._meta.app_label in labels or model._meta.label in labels
+
+    def tracked_models(self, config=None):
+        config = config or get_config()
+        include, exclude = set(config['INCLUDE']), set(config['EXCLUDE'])
+        return [
+            model for model in apps.get_models()
+            if self._matches(model, include) and not self._matches(model, exclude)
+        ]
+
+    def _tracked_fields(self, model, config):
+        label = model._meta.label
+        include = config['INCLUDE_FIELDS'].get(label)
+        exclude = set(config['EXCLUDE_FIELDS'].get('*', [])) | set(config['EXCLUDE_FIELDS'].get(label, []))
+        fields = {}
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.name in exclude:
+                continue
+            if include is not None and field.name not in include:
+                continue
+            fields[field.name] = field.attname
+        return fields
+
+    def connect(self):
+        """Brancher les signaux sur les modèles suivis"""
+        config = get_config()
+        for model in self.tracked_models(config):
+            self._fields[model] = self._tracked_fields(model, config)
+            uid = f'audit-pipeline-{model._meta.label}'
+            post_init.connect(self._on_init, sender=model, dispatch_uid=f'{uid}-init')
+            post_save.connect(self._on_save, sender=model, dispatch_uid=f'{uid}-save')
+            post_delete.connect(self._on_delete, sender=model, dispatch_uid=f'{uid}-delete')
+
+    # Signaux -------------------------------------------------------------
+
+    def _snapshot(self, instance):
+        values = instance.__dict__
+        return {
+            name: values[attname]
+            for name, attname in self._fields[type(instance)].items()
+            if attname in values
+        }
+
+    def _on_init(self, sender, instance, **kwargs):
+        instance.__dict__[self.SNAPSHOT_ATTR] = self._snapshot(instance)
+
+    def _on_save(self, sender, instance, created, update_fields=None, raw=False, **kwargs):
+        if raw:
+            return
+        before = instance.__dict__.get(self.SNAPSHOT_ATTR, {})
+        after = self._snapshot(instance)
+        if update_fields is not None:
+            after = {name: value for name, value in after.items() if name in update_fields}
+
+        if created:
+            changes = {name: [None, self._repr(value)] for name, value in after.items()}
+        else:
+            changes = {
+                name: [self._repr(before.get(name)), self._repr(value)]
+                for name, value in after.items()
+                if name in before and before[name] != value
+            }
+        instance.__dict__[self.SNAPSHOT_ATTR] = {**before, **after}
+
+        if changes or created:
+            self.enqueue(instance, 'create' if created else 'update', changes)
+
+    def _on_delete(self, sender, instance, **kwargs):
+        self.enqueue(instance, 'delete', {})
+
+    @staticmethod
+    def _repr(value):
+        return 'None' if value is None else str(value)
+
+    # File ----------------------------------------------------------------
+
+    def enqueue(self, instance, action, changes):
+        """Préparer l'entrée maintenant (auteur, état) et la mettre en file à la validation"""
+        from auditlog.models import LogEntry
+        from django.contrib.contenttypes.models import ContentType
+
+        actions = {
+            'create': LogEntry.Action.CREATE,
+            'update': LogEntry.Action.UPDATE,
+            'delete': LogEntry.Action.DELETE,
+        }
+        actor_id, remote_addr = current_actor()
+        pk = instance.pk
+        entry = LogEntry(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_pk=str(pk),
+            object_id=pk if isinstance(pk, int) else None,
+            object_repr=str(instance)[:200],
+            action=actions[action],
+            changes=json.dumps(changes),
+            actor_id=actor_id,
+            remote_addr=remote_addr,
+            timestamp=timezone.now(),
+        )
+        transaction.on_commit(lambda: self._push(entry), using=instance._state.db)
+
+    def _push(self, entry):
+        config = get_config()
+        with self._lock:
+            self._queue.append(entry)
+            size = len(self._queue)
+
+        if config['FLUSH_INTERVAL'] <= 0 or size >= config['BATCH_SIZE']:
+            self.flush()
+        else:
+            self._schedule(config['FLUSH_INTERVAL'])
+
+    def _schedule(self, interval):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        from django.db import connection
+
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Écrire les entrées en attente"""
+        from auditlog.models import LogEntry
+
+        with self._lock:
+            entries, self._queue = self._queue, []
+        if not entries:
+            return 0
+
+        batch_size = get_config()['BATCH_SIZE']
+        try:
+            LogEntry.objects.bulk_create(entries, batch_size=batch_size)
+        except Exception as e:
+            logger.error(f"Erreur d'écriture du journal d'audit ({len(entries)} entrées): {e}")
+        return len(entries)
+
+
+audit_pipeline = AuditPipeline()
+atexit.register(audit_pipeline.flush)
@@ -0,0 +1,74 @@
+"""
+Commande Django de gestion des partitions mensuelles et des archives
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from cfrm import partitions
+
+
+class Command(BaseCommand):
+    help = 'Gère les partitions mensuelles et l\'archivage des tables volumineuses'
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='action', required=True)
+
+        sub.add_parser('status', help='Afficher partitions et archives')
+        sub.add_parser('ensure', help='Créer les partitions des mois à venir')
+
+        convert = sub.add_parser('convert', help='Convertir une table en table partitionnée')
+        convert.add_argument('table', help='Modèle, ex. tickets.TicketLog')
+
+        archive = sub.add_parser('archive', help='Archiver les mois hors rétention')
+        archive.add_argument('--dry-run', action='store_true')
+
+        restore = sub.add_parser('restore', help='Restaurer un mois archivé')
+        restore.add_argument('table', help='Modèle, ex. tickets.TicketLog')
+        restore.add_argument('month', help='Mois au format AAAA-MM')
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"handle_{options['action']}")(**options)
+        except partitions.PartitionError as e:
+            raise CommandError(str(e))
+
+    def handle_status(self, **options):
+        manifest = partitions.load_manifest()
+        for table in partitions.tracked_tables():
+            if partitions.is_partitioned(table):
+                months = ', '.join(f"{m:%Y-%m}" for m in partitions.list_partitions(table))
+                self.stdout.write(f"{table.label}: partitionnée ({months})")
+            else:
+                self.stdout.write(f"{table.label}: non partitionnée")
+            for entry in manifest:
+                if entry['table'] == table.label:
+                    self.stdout.write(
+                        f"  archive {entry['month']}: {entry['rows']} lignes, "
+                        f"{entry['bytes']} octets ({entry['status']})"
+                    )
+
+    def handle_ensure(self, **options):
+        for table in partitions.tracked_tables():
+            if not partitions.is_partitioned(table):
+                continue
+            created = partitions.ensure_partitions(table)
+            for month in created:
+                self.stdout.write(f"{table.label}: partition {month:%Y-%m} créée")
+        self.stdout.write(self.style.SUCCESS('Partitions à jour'))
+
+    def handle_convert(self, table, **options):
+        partitions.convert(partitions.get_table(table))
+        self.stdout.write(self.style.SUCCESS(f'{table} partitionnée par mois'))
+
+    def handle_archive(self, dry_run=False, **options):
+        if dry_run:
+            for table in partitions.tracked_tables():
+                for month in partitions.archivable_months(table):
+                    self.stdout.write(f"{table.label}: {month:%Y-%m} serait archivé")
+            return
+        for entry in partitions.archive_expired():
+            self.stdout.write(f"{entry['table']} {entry['month']}: {entry['rows']} lignes -> {entry['file']}")
+        self.stdout.write(self.style.SUCCESS('Archivage terminé'))
+
+    def handle_restore(self, table, month, **options):
+        rows = partitions.restore_month(partitions.get_table(table), partitions.parse_month(month))
+        self.stdout.write(self.style.SUCCESS(f'{rows} lignes restaurées dans {table}'))
@@ -0,0 +1,561 @@
+"""
+Partitionnement mensuel et archivage des tables à forte volumétrie
+
+Les tables listées dans ``PARTITIONING['TABLES']`` (journaux des tickets,
+messages, webhooks, activités) sont, sous PostgreSQL, partitionnées par mois
+sur ``created_at`` (partitionnement déclaratif, une partition par défaut
+recueille les lignes hors plage). Les partitions à venir sont créées à
+l'avance ; les mois plus anciens que la rétention sont exportés en NDJSON
+compressé (gzip) dans ``ARCHIVE_DIR``, inscrits dans un manifeste, puis
+détachés et supprimés ; les lignes anciennes tombées dans la partition par
+défaut sont archivées de la même façon, par un ``DELETE`` sur l'intervalle.
+Un mois archivé peut être restauré à la demande ; il n'est archivé de nouveau
+qu'après ``RESTORE_GRACE_DAYS`` jours.
+
+La clé primaire d'une table partitionnée inclut la colonne de partitionnement :
+les contraintes d'unicité qui ne la contiennent pas (dont l'identifiant) sont
+recréées comme index uniques sur chaque partition, donc vérifiées par mois.
+Les références sans contrainte en base (``db_constraint=False``) vers des
+lignes archivées sont remises à ``NULL``.
+
+Sans partitionnement (autre base, table non convertie), l'archivage exporte
+puis supprime les lignes du mois par un ``DELETE`` sur l'intervalle.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TABLES': {},
+    'COLUMN': 'created_at',
+    'PREMAKE_MONTHS': 3,
+    'RETENTION_MONTHS': 12,
+    'ARCHIVE_DIR': os.path.join(settings.BASE_DIR, 'archive'),
+    'BATCH_SIZE': 2000,
+    # Durée de conservation d'un mois restauré avant un nouvel archivage
+    'RESTORE_GRACE_DAYS': 30,
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    """Encodeur NDJSON : les champs binaires sont écrits en base64
+
+    ``BinaryField.to_python`` décode le base64 à la restauration.
+    """
+
+    def default(self, o):
+        if isinstance(o, (bytes, memoryview)):
+            return base64.b64encode(bytes(o)).decode('ascii')
+        return super().default(o)
+
+
+class PartitionError(Exception):
+    """Opération de partitionnement ou d'archivage impossible"""
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'PARTITIONING', {}))
+    return config
+
+
+# Mois ---------------------------------------------------------------------
+
+def month_start(value):
+    """Premier instant (UTC) du mois de ``value``"""
+    value = timezone.localtime(value, dt_timezone.utc) if timezone.is_aware(value) else value
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def parse_month(value):
+    """``'YYYY-MM'`` -> début du mois"""
+    try:
+        return datetime.strptime(value, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+    except ValueError:
+        raise PartitionError(f"Mois invalide: {value} (format attendu AAAA-MM)")
+
+
+# Tables -------------------------------------------------------------------
+
+class PartitionedTable:
+    """Table suivie : modèle, colonne de partitionnement et rétention"""
+
+    def __init__(self, label, options=None, config=None):
+        config = config or get_config()
+        options = options or {}
+        self.label = label
+        self.model = apps.get_model(label)
+        self.table = self.model._meta.db_table
+        self.field = self.model._meta.get_field(options.get('COLUMN', config['COLUMN']))
+        self.column = self.field.column
+        self.retention_months = options.get('RETENTION_MONTHS', config['RETENTION_MONTHS'])
+        self._partition_re = re.compile(rf'^{re.escape(self.table)}_p(\d{{6}})$')
+
+    def partition_name(self, month):
+        return f"{self.table}_p{month:%Y%m}"
+
+    @property
+    def default_partition(self):
+        return f"{self.table}_default"
+
+    def month_of_partition(self, name):
+        match = self._partition_re.match(name)
+        if match is None:
+            return None
+        return datetime.strptime(match.group(1), '%Y%m').replace(tzinfo=dt_timezone.utc)
+
+    def unique_columns(self):
+        """Colonnes de chaque contrainte d'unicité du modèle (clé primaire comprise)"""
+        opts = self.model._meta
+        columns = [(field.column,) for field in opts.local_concrete_fields if field.unique]
+        columns += [tuple(opts.get_field(name).column for name in names) for names in opts.unique_together]
+        columns += [
+            tuple(opts.get_field(name).column for name in constraint.fields)
+            for constraint in opts.constraints
+            if isinstance(constraint, models.UniqueConstraint) and constraint.fields and constraint.condition is None
+        ]
+        return columns
+
+    def rows_in(self, month):
+        return self.model._base_manager.filter(**{
+            f'{self.field.name}__gte': month,
+            f'{self.field.name}__lt': add_months(month, 1),
+        }).order_by()
+
+
+def tracked_tables(config=None):
+    config = config or get_config()
+    return [PartitionedTable(label, options, config) for label, options in config['TABLES'].items()]
+
+
+def get_table(label, config=None):
+    config = config or get_config()
+    if label not in config['TABLES']:
+        raise PartitionError(f"Table non configurée: {label}")
+    return PartitionedTable(label, config['TABLES'][label], config)
+
+
+# PostgreSQL ---------------------------------------------------------------
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(table):
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table.table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table):
+    """Mois des partitions mensuelles existantes, triés"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [table.table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(month for month in map(table.month_of_partition, names) if month is not None)
+
+
+def create_unique_indexes(table, relation):
+    """Index uniques de ``relation``
+
+    Sur la table mère, les contraintes qui contiennent la colonne de
+    partitionnement (héritées par les partitions) ; sur une partition, les
+    autres, vérifiées à l'intérieur du mois.
+    """
+    qn = connection.ops.quote_name
+    parent = relation == table.table
+    with connection.cursor() as cursor:
+        for columns in table.unique_columns():
+            if (table.column in columns) != parent:
+                continue
+            digest = hashlib.md5(','.join(columns).encode()).hexdigest()[:8]
+            cursor.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {qn(f'{relation}_{digest}_uniq')} "
+                f"ON {qn(relation)} ({', '.join(map(qn, columns))})"
+            )
+
+
+def create_partition(table, month):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {qn(table.partition_name(month))} "
+            f"PARTITION OF {qn(table.table)} FOR VALUES FROM (%s) TO (%s)",
+            [month, add_months(month, 1)]
+        )
+    create_unique_indexes(table, table.partition_name(month))
+
+
+def default_partition_months(table, before):
+    """Mois antérieurs à ``before`` présents dans la partition par défaut"""
+    qn = connection.ops.quote_name
+    column = qn(table.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', {column} AT TIME ZONE 'UTC') "
+            f"FROM {qn(table.default_partition)} WHERE {column} < %s",
+            [before]
+        )
+        return [row[0].replace(tzinfo=dt_timezone.utc) for row in cursor.fetchall()]
+
+
+def drop_partition(table, month):
+    qn = connection.ops.quote_name
+    name = qn(table.partition_name(month))
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(table.table)} DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
+
+
+def ensure_partitions(table, now=None, config=None):
+    """Créer les partitions du mois courant et des ``PREMAKE_MONTHS`` suivants"""
+    config = config or get_config()
+    current = month_start(now or timezone.now())
+    created = []
+    existing = set(list_partitions(table))
+    for offset in range(config['PREMAKE_MONTHS'] + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            create_partition(table, month)
+            created.append(month)
+    return created
+
+
+def _referencing_constraints(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, conrelid::regclass::text FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = %s::regclass",
+            [table.table]
+        )
+        return cursor.fetchall()
+
+
+def _definitions(table):
+    """Index non uniques (``CREATE INDEX``) et clés étrangères (``(nom, définition)``) de la table"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+            [table.table]
+        )
+        indexes = [row[0] for row in cursor.fetchall() if not row[0].startswith('CREATE UNIQUE')]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE contype = 'f' AND conrelid = %s::regclass",
+            [table.table]
+        )
+        return indexes, cursor.fetchall()
+
+
+def convert(table, now=None, config=None):
+    """Convertir une table existante en table partitionnée par mois
+
+    Opération ponctuelle, à lancer en période creuse : les lignes sont
+    recopiées dans la nouvelle table, puis index et clés étrangères recréés
+    à partir des définitions lues dans le catalogue avant la conversion. La
+    clé primaire devient ``(id, colonne de partitionnement)``.
+    """
+    if not is_supported():
+        raise PartitionError("Le partitionnement nécessite PostgreSQL")
+    if is_partitioned(table):
+        raise PartitionError(f"{table.table} est déjà partitionnée")
+    references = _referencing_constraints(table)
+    if references:
+        names = ', '.join(f"{name} ({source})" for name, source in references)
+        raise PartitionError(f"Clés étrangères vers {table.table} à supprimer d'abord: {names}")
+
+    qn = connection.ops.quote_name
+    legacy = f"{table.table}__legacy"
+    pk_column = table.model._meta.pk.column
+    config = config or get_config()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        indexes, foreign_keys = _definitions(table)
+        cursor.execute(f"ALTER TABLE {qn(table.table)} RENAME TO {qn(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table.table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS "
+            f"INCLUDING CONSTRAINTS INCLUDING IDENTITY INCLUDING STORAGE) "
+            f"PARTITION BY RANGE ({qn(table.column)})"
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table.table)} ADD PRIMARY KEY ({qn(pk_column)}, {qn(table.column)})"
+        )
+        cursor.execute(
+            f"CREATE TABLE {qn(table.default_partition)} PARTITION OF {qn(table.table)} DEFAULT"
+        )
+        create_unique_indexes(table, table.table)
+        create_unique_indexes(table, table.default_partition)
+
+        cursor.execute(f"SELECT MIN({qn(table.column)}) FROM {qn(legacy)}")
+        oldest = cursor.fetchone()[0]
+        current = month_start(now or timezone.now())
+        month = month_start(oldest) if oldest else current
+        while month <= add_months(current, config['PREMAKE_MONTHS']):
+            create_partition(table, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f"INSERT INTO {qn(table.table)} SELECT * FROM {qn(legacy)}")
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+
+        # Index et clés étrangères d'origine (noms libérés par le DROP) ; un
+        # index créé sur la table mère l'est aussi sur chaque partition
+        for statement in indexes:
+            cursor.execute(statement)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table.table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+        if table.model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), "
+                f"COALESCE((SELECT MAX({qn(pk_column)}) FROM {qn(table.table)}), 1))",
+                [table.table, pk_column]
+            )
+
+
+# Archives -----------------------------------------------------------------
+
+def archive_dir(config=None):
+    return str((config or get_config())['ARCHIVE_DIR'])
+
+
+def load_manifest(config=None):
+    path = os.path.join(archive_dir(config), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(entries, config=None):
+    directory = archive_dir(config)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def _manifest_entry(entries, label, month):
+    key = f"{month:%Y-%m}"
+    for entry in entries:
+        if entry['table'] == label and entry['month'] == key:
+            return entry
+    return None
+
+
+def _file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def archivable_months(table, now=None):
+    """Mois plus anciens que la rétention contenant (potentiellement) des lignes"""
+    cutoff = add_months(month_start(now or timezone.now()), -table.retention_months)
+    if is_partitioned(table):
+        months = {month for month in list_partitions(table) if month < cutoff}
+        months.update(default_partition_months(table, cutoff))
+        return sorted(months)
+
+    oldest = table.model._base_manager.order_by(table.field.name).values_list(table.field.name, flat=True).first()
+    if oldest is None:
+        return []
+    months = []
+    month = month_start(oldest)
+    while month < cutoff:
+        if table.rows_in(month).exists():
+            months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(table, month, config=None):
+    """Exporter un mois en NDJSON compressé puis le retirer de la table active"""
+    config = config or get_config()
+    directory = os.path.join(archive_dir(config), table.table)
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{table.table}_{month:%Y%m}.ndjson.gz"
+    path = os.path.join(directory, filename)
+
+    rows = 0
+    with gzip.open(f"{path}.tmp", 'wt', encoding='utf-8') as f:
+        for row in table.rows_in(month).values().iterator(chunk_size=config['BATCH_SIZE']):
+            f.write(json.dumps(row, cls=ArchiveEncoder, ensure_ascii=False))
+            f.write('\n')
+            rows += 1
+    os.replace(f"{path}.tmp", path)
+
+    partitioned = is_partitioned(table)
+    with transaction.atomic():
+        clear_references(table, month)
+        if partitioned and month in list_partitions(table):
+            drop_partition(table, month)
+        else:
+            qn = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {qn(table.table)} WHERE {qn(table.column)} >= %s AND {qn(table.column)} < %s",
+                    [month, add_months(month, 1)]
+                )
+
+    entries = load_manifest(config)
+    entry = _manifest_entry(entries, table.label, month)
+    if entry is None:
+        entry = {'table': table.label, 'month': f"{month:%Y-%m}"}
+        entries.append(entry)
+    entry.update({
+        'db_table': table.table,
+        'file': os.path.relpath(path, archive_dir(config)),
+        'rows': rows,
+        'bytes': os.path.getsize(path),
+        'sha256': _file_digest(path),
+        'partitioned': partitioned,
+        'status': 'archived',
+        'archived_at': timezone.now().isoformat(),
+        'restored_at': None,
+    })
+    save_manifest(entries, config)
+    return entry
+
+
+def clear_references(table, month):
+    """Remettre à ``NULL`` les références sans contrainte en base vers les lignes du mois"""
+    for relation in table.model._meta.related_objects:
+        field = relation.field
+        if not isinstance(field, models.ForeignKey) or field.db_constraint:
+            continue
+        if relation.on_delete is not models.SET_NULL:
+            raise PartitionError(
+                f"{relation.related_model._meta.label}.{field.name} référence {table.label} "
+                f"sans contrainte ni SET_NULL : archivage impossible"
+            )
+        relation.related_model._base_manager.filter(**{
+            f'{field.attname}__in': table.rows_in(month).values(field.target_field.attname)
+        }).update(**{field.attname: None})
+
+
+def restored_months(table, now=None, config=None, entries=None):
+    """Mois restaurés depuis moins de ``RESTORE_GRACE_DAYS`` jours"""
+    config = config or get_config()
+    entries = load_manifest(config) if entries is None else entries
+    since = (now or timezone.now()) - timedelta(days=config['RESTORE_GRACE_DAYS'])
+    months = set()
+    for entry in entries:
+        if entry['table'] != table.label or entry.get('status') != 'restored':
+            continue
+        if datetime.fromisoformat(entry['restored_at']) > since:
+            months.add(datetime.strptime(entry['month'], '%Y-%m').replace(tzinfo=dt_timezone.utc))
+    return months
+
+
+def archive_expired(now=None, config=None):
+    """Archiver, pour chaque table suivie, les mois hors rétention
+
+    Les mois restaurés récemment sont laissés en place (``restored_months``).
+    """
+    config = config or get_config()
+    entries = load_manifest(config)
+    archived = []
+    for table in tracked_tables(config):
+        pinned = restored_months(table, now, config, entries)
+        for month in archivable_months(table, now):
+            if month in pinned:
+                continue
+            try:
+                archived.append(archive_month(table, month, config))
+            except Exception as e:
+                logger.error(f"Erreur d'archivage de {table.table} ({month:%Y-%m}): {e}")
+    return archived
+
+
+def restore_month(table, month, config=None):
+    """Réinsérer un mois archivé (la partition est recréée si besoin)"""
+    config = config or get_config()
+    entries = load_manifest(config)
+    entry = _manifest_entry(entries, table.label, month)
+    if entry is None or entry.get('status') != 'archived':
+        raise PartitionError(f"Aucune archive à restaurer pour {table.label} {month:%Y-%m}")
+
+    path = os.path.join(archive_dir(config), entry['file'])
+    if _file_digest(path) != entry['sha256']:
+        raise PartitionError(f"Empreinte invalide pour {path}")
+
+    fields = table.model._meta.concrete_fields
+    qn = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        qn(table.table),
+        ', '.join(qn(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+
+    def prepare(row):
+        return [
+            field.get_db_prep_save(field.to_python(row.get(field.attname)), connection)
+            for field in fields
+        ]
+
+    rows = 0
+    with transaction.atomic():
+        if is_partitioned(table):
+            create_partition(table, month)
+        with gzip.open(path, 'rt', encoding='utf-8') as f, connection.cursor() as cursor:
+            batch = []
+            for line in f:
+                batch.append(prepare(json.loads(line)))
+                if len(batch) >= config['BATCH_SIZE']:
+                    cursor.executemany(sql, batch)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                rows += len(batch)
+
+    entry['status'] = 'restored'
+    entry['restored_at'] = timezone.now().isoformat()
+    save_manifest(entries, config)
+    return rows
+
+
+def maintain(now=None, config=None):
+    """Tâche périodique : partitions à venir puis archivage"""
+    config = config or get_config()
+    created = {}
+    for table in tracked_tables(config):
+        if is_partitioned(table):
+            created[table.label] = [f"{month:%Y-%m}" for month in ensure_partitions(table, now, config)]
+    archived = archive_expired(now, config)
+    return {'created': created, 'archived': [f"{e['table']} {e['month']}" for e in archived]}
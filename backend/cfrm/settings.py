@@ -5,6 +5,7 @@ import os
 from pathlib import Path
 from decouple import config
 import dj_database_url
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -55,9 +56,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cfrm.admission.AdmissionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'auditlog.middleware.AuditlogMiddleware',
+    'cfrm.audit.AuditContextMiddleware',
 ]
 
 ROOT_URLCONF = 'cfrm.urls'
@@ -124,10 +126,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
+AUTHENTICATION_BACKENDS = [
+    'users.authentication.ModelBackend',
+]
+
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -150,6 +156,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# En-têtes de l'envoi par morceaux lisibles par le frontend
+CORS_EXPOSE_HEADERS = ['Location', 'Upload-Offset', 'Upload-Length']
+
 # JWT Settings
 from datetime import timedelta
 
@@ -167,6 +176,51 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Tâches périodiques (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    # Événements entrants en attente ou à retenter
+    'process-inbound-events': {
+        'task': 'channels.tasks.process_inbound_events',
+        'schedule': 60.0,
+    },
+    # Partitions des mois à venir et archivage des mois hors rétention
+    'maintain-partitions': {
+        'task': 'cfrm.tasks.maintain_partitions',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'compact-webhook-events': {
+        'task': 'channels.tasks.compact_webhook_events',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'process-stale-attachments': {
+        'task': 'tickets.tasks.process_stale_attachments',
+        'schedule': 300.0,
+    },
+    'purge-expired-uploads': {
+        'task': 'tickets.tasks.purge_expired_uploads',
+        'schedule': crontab(minute=15),
+    },
+    'backfill-ticket-predictions': {
+        'task': 'tickets.tasks.backfill_ticket_predictions',
+        'schedule': crontab(minute=45),
+    },
+    # Correction des compteurs de charge des agents
+    'reconcile-workloads': {
+        'task': 'tickets.tasks.reconcile_workloads',
+        'schedule': 600.0,
+    },
+}
+
+# Cache partagé entre tous les workers (gunicorn, Celery) : versions de règles
+# de visibilité, modèles compilés, disjoncteurs, compteurs d'admission et de charge
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL', default='redis://localhost:6379/0'),
+        'KEY_PREFIX': 'cfrm',
+    }
+}
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='localhost')
@@ -175,16 +229,76 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@cfrm.org')
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=10, cast=int)
 
 # Twilio Configuration
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
 TWILIO_PHONE_NUMBER = config('TWILIO_PHONE_NUMBER', default='')
 
+# Planification des SMS (channels.sms) ; surchargeable par canal via
+# ChannelConfiguration.configuration['planning']
+SMS_PLANNING = {
+    'TRANSLITERATE': config('SMS_TRANSLITERATE', default=True, cast=bool),
+    'COST_PER_SEGMENT': config('SMS_COST_PER_SEGMENT', default=0.0, cast=float),
+    'CURRENCY': 'USD',
+}
+
+# Messages entrants (channels.inbound) : fenêtre de conversation pendant
+# laquelle les messages d'un expéditeur rejoignent son ticket ouvert
+INBOUND_PIPELINE = {
+    'CONVERSATION_WINDOW_HOURS': config('INBOUND_CONVERSATION_WINDOW_HOURS', default=72, cast=int),
+    'DEFAULT_CATEGORY': 'Feedback',
+    'DEFAULT_PRIORITY': 'Moyenne',
+    'DEFAULT_STATUS': 'Ouvert',
+    'BATCH_SIZE': 500,
+    'SEND_CONFIRMATION': True,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 60,
+}
+
+# Classification automatique des tickets (tickets.classification) : vocabulaires
+# par catégorie (Category.keywords et VOCABULARY), termes de priorité et escalade
+# immédiate des contenus PSEA
+TICKET_CLASSIFICATION = {
+    'ENABLED': config('TICKET_CLASSIFICATION_ENABLED', default=True, cast=bool),
+    'DEFAULT_CATEGORY': 'Information',
+    'DEFAULT_PRIORITY_LEVEL': 3,
+    'PSEA_PRIORITY_LEVEL': 5,
+    'PSEA_CONTACT': config('PSEA_ESCALATION_CONTACT', default=''),
+}
+
+# Classifieur statistique optionnel (tickets.triage), entraîné par la commande
+# « train_ticket_classifier » ; les modèles publiés sont rangés dans MODEL_DIR
+TICKET_TRIAGE_MODEL = {
+    'ENABLED': config('TICKET_TRIAGE_MODEL_ENABLED', default=True, cast=bool),
+    'MODEL_DIR': config('TICKET_TRIAGE_MODEL_DIR', default=str(BASE_DIR / 'var' / 'triage')),
+    'MIN_CONFIDENCE': 0.6,
+}
+
+# Détection des quasi-doublons (tickets.duplicates) : signatures MinHash et
+# index LSH ; changer NUM_PERM, BANDS ou SEED impose « index_duplicates --rebuild »
+DUPLICATE_DETECTION = {
+    'ENABLED': config('DUPLICATE_DETECTION_ENABLED', default=True, cast=bool),
+    'NUM_PERM': 128,
+    'BANDS': 16,
+    'THRESHOLD': 0.8,
+}
+
+# Assignation automatique (tickets.assignment) : agents éligibles par
+# permission de rôle, charge = tickets ouverts assignés
+TICKET_ASSIGNMENT = {
+    'ASSIGNEE_PERMISSIONS': ['edit_tickets', 'all'],
+    'MAX_OPEN_TICKETS': config('TICKET_ASSIGNMENT_MAX_OPEN', default=None, cast=lambda v: int(v) if v else None),
+    'ORGANIZATION_FALLBACK': False,
+}
+
 # WhatsApp Configuration
 WHATSAPP_ACCESS_TOKEN = config('WHATSAPP_ACCESS_TOKEN', default='')
 WHATSAPP_PHONE_NUMBER_ID = config('WHATSAPP_PHONE_NUMBER_ID', default='')
 WHATSAPP_VERIFY_TOKEN = config('WHATSAPP_VERIFY_TOKEN', default='')
+# Secret de l'application Meta : signature X-Hub-Signature-256 des webhooks
+WHATSAPP_APP_SECRET = config('WHATSAPP_APP_SECRET', default='')
 
 # Security Settings
 SECURE_BROWSER_XSS_FILTER = True
@@ -192,12 +306,160 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
 
 # Audit Log Configuration
-AUDITLOG_INCLUDE_ALL_MODELS = True
+# Les entrées sont écrites dans auditlog.LogEntry par cfrm.audit (file asynchrone,
+# écriture par lots) pour les seuls modèles inclus ci-dessous.
+AUDITLOG_INCLUDE_ALL_MODELS = False
+
+AUDIT_PIPELINE = {
+    'INCLUDE': ['tickets', 'users', 'channels', 'analytics'],
+    # Modèles à forte volumétrie (télémétrie, journaux) exclus par défaut
+    'EXCLUDE': [
+        'tickets.TicketLog',
+        'tickets.Upload',
+        'tickets.TicketSummary',
+        'users.UserActivity',
+        'users.UserSession',
+        'channels.Message',
+        'channels.WebhookEvent',
+        'channels.ChannelStats',
+        'analytics.MetricValue',
+        'analytics.AlertEvent',
+        'analytics.ReportDailyAggregate',
+        'analytics.ExportJob',
+    ],
+    'INCLUDE_FIELDS': {},
+    'EXCLUDE_FIELDS': {
+        '*': ['created_at', 'updated_at'],
+        'users.User': ['password', 'last_login', 'last_activity', 'last_login_ip'],
+        'analytics.Report': ['data', 'charts'],
+    },
+    'FLUSH_INTERVAL': config('AUDIT_FLUSH_INTERVAL', default=2, cast=int),
+    'BATCH_SIZE': 200,
+}
+
+# Écriture différée des activités utilisateur (secondes, 0 = écriture immédiate)
+ACTIVITY_BUFFER_FLUSH_INTERVAL = config('ACTIVITY_BUFFER_FLUSH_INTERVAL', default=5, cast=int)
+ACTIVITY_BUFFER_MAX_SIZE = 500
+
+# Envoi de fichiers par morceaux (tickets.uploads)
+UPLOAD_TEMP_DIR = config('UPLOAD_TEMP_DIR', default=str(BASE_DIR / 'tmp' / 'uploads'))
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 5 * 1024 * 1024
+UPLOAD_EXPIRY_HOURS = 24
+
+# Rétention des événements webhook (channels.retention)
+WEBHOOK_RETENTION = {
+    'COMPACT_AFTER_DAYS': config('WEBHOOK_COMPACT_AFTER_DAYS', default=7, cast=int),
+    # 'compress' : charge brute compressée ; 'drop' : charge brute supprimée
+    'MODE': 'compress',
+    'BATCH_SIZE': 500,
+    'KEEP_HEADERS': [
+        'Content-Type', 'User-Agent', 'X-Forwarded-For',
+        'X-Twilio-Signature', 'X-Hub-Signature-256',
+    ],
+}
+
+# Partitionnement mensuel et archivage (cfrm.partitions, commande « partitions »)
+PARTITIONING = {
+    'TABLES': {
+        'tickets.TicketLog': {'RETENTION_MONTHS': 24},
+        'channels.Message': {'RETENTION_MONTHS': 12},
+        'channels.WebhookEvent': {'RETENTION_MONTHS': 3},
+        'users.UserActivity': {'RETENTION_MONTHS': 12},
+    },
+    'COLUMN': 'created_at',
+    'PREMAKE_MONTHS': 3,
+    'ARCHIVE_DIR': config('ARCHIVE_DIR', default=str(BASE_DIR / 'archive')),
+    'BATCH_SIZE': 2000,
+}
 
 # Rate Limiting
 RATELIMIT_ENABLE = True
 RATELIMIT_USE_CACHE = 'default'
 
+# Disjoncteurs des fournisseurs (channels.circuit) : délai réseau, fenêtre
+# d'observation et seuils d'ouverture
+CIRCUIT_BREAKER = {
+    'TIMEOUT': config('PROVIDER_TIMEOUT', default=10, cast=int),
+    'WINDOW_SECONDS': 60,
+    'MIN_CALLS': 5,
+    'FAILURE_RATE': 0.5,
+    'SLOW_CALL_SECONDS': 5,
+    'OPEN_SECONDS': 30,
+}
+
+# Contrôle d'admission des requêtes API (cfrm.admission) : débit par
+# identité (utilisateur ou IP) et plafond de requêtes anonymes simultanées,
+# par classe de points d'accès (premier motif correspondant)
+ADMISSION = {
+    'TRUST_FORWARDED_FOR': config('ADMISSION_TRUST_FORWARDED_FOR', default=False, cast=bool),
+    'CLASSES': {
+        # Webhooks signés : débit élevé par fournisseur ; non signés : par IP
+        'webhook_sms': {
+            'PATHS': [r'^/api/v1/webhooks/sms/'],
+            'SIGNATURE': 'twilio',
+            'SIGNED_RATE': '6000/m',
+            'RATE': '60/m',
+            'CONCURRENCY': 8,
+        },
+        'webhook_whatsapp': {
+            'PATHS': [r'^/api/v1/webhooks/whatsapp/'],
+            'SIGNATURE': 'meta',
+            'SIGNED_RATE': '6000/m',
+            'RATE': '60/m',
+            'CONCURRENCY': 8,
+        },
+        'webhook': {
+            'PATHS': [r'^/api/v1/webhooks/email/'],
+            'RATE': '600/m',
+            'CONCURRENCY': 8,
+        },
+        'auth': {
+            'PATHS': [r'^/api/v1/auth/'],
+            'METHODS': ['POST'],
+            'RATE': '20/m',
+            'CONCURRENCY': 4,
+        },
+        'expensive': {
+            'PATHS': [
+                r'^/api/v1/tickets/(dashboard_stats|map|summary|predict|auto_assign)/',
+                r'^/api/v1/tickets/import/',
+                r'^/api/v1/reports/',
+                r'^/api/v1/(dashboards|metrics|metric-values|exports)/',
+            ],
+            'RATE': '30/m',
+            'CONCURRENCY': 4,
+        },
+        'submission': {
+            'PATHS': [r'^/api/v1/(tickets|responses|feedback|uploads)/'],
+            'METHODS': ['POST', 'PATCH', 'PUT', 'DELETE'],
+            'RATE': '60/m',
+            'CONCURRENCY': 12,
+        },
+        'public': {
+            'PATHS': [r'^/api/'],
+            'RATE': '300/m',
+            'CONCURRENCY': 16,
+        },
+    },
+    # Utilisateurs authentifiés : débit par utilisateur, sans plafond de concurrence
+    'STAFF': {'RATE': '1200/m'},
+}
+
+# Débit des envois sortants (channels.ratelimit), en jetons (segments) par
+# seconde ; surchargeable par canal via ChannelConfiguration.configuration['rate_limit']
+OUTBOUND_RATE_LIMIT = {
+    'REDIS_URL': config('REDIS_URL', default=''),
+    'MAX_WAIT_SECONDS': 30,
+    'PRIORITY_RESERVE': 0.2,
+    'CRITICAL_LEVEL': 5,
+    'RATES': {
+        'sms': {'RATE': config('TWILIO_MPS', default=1, cast=float), 'BURST': 1},
+        'whatsapp': {'RATE': 20, 'BURST': 20},
+        'email': {'RATE': 5, 'BURST': 10},
+    },
+}
+
 # Logging
 LOGGING = {
     'version': 1,
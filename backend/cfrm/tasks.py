@@ -0,0 +1,12 @@
+"""
+Tâches asynchrones de la plateforme
+"""
+from celery import shared_task
+
+from . import partitions
+
+
+@shared_task
+def maintain_partitions():
+    """Créer les partitions à venir et archiver les mois hors rétention"""
+    return partitions.maintain()
@@ -69,6 +69,16 @@ AUTH_PASSWORD_VALIDATORS = []
 # Configuration des tests
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
+# Écrire les activités utilisateur et le journal d'audit immédiatement
+ACTIVITY_BUFFER_FLUSH_INTERVAL = 0
+AUDIT_PIPELINE = {**AUDIT_PIPELINE, 'FLUSH_INTERVAL': 0}
+
+# Fichiers temporaires des envois par morceaux
+UPLOAD_TEMP_DIR = os.path.join(tempfile.gettempdir(), 'cfrm-test-uploads')
+
+# Pas de limitation de débit (entrante ni sortante) pendant les tests
+RATELIMIT_ENABLE = False
+
 # Désactiver les tâches asynchrones
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
@@ -0,0 +1,73 @@
+import base64
+import hashlib
+import hmac
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from cfrm.admission import DEFAULTS, AdmissionController, AdmissionMiddleware, EndpointClass
+
+ADMISSION = {
+    'CONCURRENCY_TIMEOUT': 60,
+    'CLASSES': {
+        'webhook_sms': {
+            'PATHS': [r'^/api/v1/webhooks/sms/'],
+            'SIGNATURE': 'twilio',
+            'SIGNED_RATE': '100/m',
+            'RATE': '2/m',
+        },
+    },
+}
+
+
+def twilio_signature(url, params, token='secret'):
+    payload = url + ''.join(f'{key}{params[key]}' for key in sorted(params))
+    return base64.b64encode(hmac.new(token.encode(), payload.encode(), hashlib.sha1).digest()).decode()
+
+
+class ConcurrencyTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.controller = AdmissionController(dict(DEFAULTS, **ADMISSION))
+        self.endpoint = EndpointClass('public', {'CONCURRENCY': 2})
+
+    def test_cap(self):
+        first = self.controller.enter(self.endpoint, now=0)
+        self.assertTrue(self.controller.enter(self.endpoint, now=0))
+        self.assertIsNone(self.controller.enter(self.endpoint, now=0))
+        self.controller.leave(first)
+        self.assertTrue(self.controller.enter(self.endpoint, now=0))
+
+    def test_previous_window_counts_and_never_goes_negative(self):
+        slots = [self.controller.enter(self.endpoint, now=59) for _ in range(2)]
+        # Les requêtes de la fenêtre précédente occupent toujours leurs emplacements
+        self.assertIsNone(self.controller.enter(self.endpoint, now=61))
+        for slot in slots:
+            self.controller.leave(slot)
+        self.assertEqual(cache.get(slots[0]), 0)
+        self.assertTrue(self.controller.enter(self.endpoint, now=61))
+        # Sorties perdues : oubliées deux fenêtres plus tard
+        self.controller.enter(self.endpoint, now=61)
+        self.assertTrue(self.controller.enter(self.endpoint, now=181))
+
+
+@override_settings(RATELIMIT_ENABLE=True, ADMISSION=ADMISSION, TWILIO_AUTH_TOKEN='secret')
+class WebhookTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.middleware = AdmissionMiddleware(lambda request: HttpResponse('ok'))
+        self.factory = RequestFactory()
+
+    def post(self, signature=None):
+        params = {'From': '+221770000000', 'Body': 'Bonjour'}
+        headers = {}
+        if signature:
+            headers['HTTP_X_TWILIO_SIGNATURE'] = twilio_signature('http://testserver/api/v1/webhooks/sms/', params)
+        return self.middleware(self.factory.post('/api/v1/webhooks/sms/', params, **headers)).status_code
+
+    def test_signed_calls_use_the_provider_rate(self):
+        self.assertEqual([self.post(signature=True) for _ in range(5)], [200] * 5)
+
+    def test_unsigned_calls_are_limited_per_ip(self):
+        self.assertEqual([self.post() for _ in range(3)], [200, 200, 429])
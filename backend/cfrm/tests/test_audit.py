@@ -0,0 +1,76 @@
+import json
+
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from cfrm.audit import DEFAULTS, AuditPipeline, get_config
+from tickets.models import Category, TicketLog
+from users.models import User
+
+
+class AuditPipelineTests(TestCase):
+    def entries(self, instance):
+        return LogEntry.objects.filter(
+            content_type=ContentType.objects.get_for_model(instance), object_pk=str(instance.pk)
+        ).order_by('timestamp', 'pk')
+
+    def test_filtering(self):
+        pipeline = AuditPipeline()
+        config = get_config()
+        models = pipeline.tracked_models(config)
+        self.assertIn(Category, models)
+        self.assertNotIn(TicketLog, models)
+        self.assertNotIn('created_at', pipeline._tracked_fields(Category, config))
+        fields = pipeline._tracked_fields(User, config)
+        self.assertIn('email', fields)
+        self.assertNotIn('password', fields)
+
+    def test_changes_are_logged_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name='Eau')
+        with self.captureOnCommitCallbacks(execute=True):
+            category.description = 'Points d\'eau'
+            category.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            # Aucun champ modifié : pas d'entrée
+            category.save()
+
+        created, updated = self.entries(category)
+        self.assertEqual(created.action, LogEntry.Action.CREATE)
+        self.assertEqual(json.loads(updated.changes), {'description': ['', "Points d'eau"]})
+
+    @override_settings(AUDIT_PIPELINE=dict(DEFAULTS, FLUSH_INTERVAL=60))
+    def test_rolled_back_writes_are_not_logged(self):
+        pipeline = AuditPipeline()
+        self.addCleanup(lambda: pipeline._timer and pipeline._timer.cancel())
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    category = Category.objects.create(name='Annulée')
+                    pipeline.enqueue(category, 'create', {})
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        # Rien n'est confié au thread d'écriture (autre connexion)
+        self.assertEqual(pipeline._queue, [])
+        self.assertFalse(self.entries(category).exists())
+
+    @override_settings(AUDIT_PIPELINE=dict(DEFAULTS, FLUSH_INTERVAL=60, BATCH_SIZE=3))
+    def test_entries_are_written_in_batches(self):
+        pipeline = AuditPipeline()
+        self.addCleanup(lambda: pipeline._timer and pipeline._timer.cancel())
+        category = Category.objects.create(name='Lots')
+        count = LogEntry.objects.count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pipeline.enqueue(category, 'update', {'name': ['a', 'b']})
+            pipeline.enqueue(category, 'update', {'name': ['b', 'c']})
+        self.assertEqual(LogEntry.objects.count(), count)
+        self.assertIsNotNone(pipeline._timer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pipeline.enqueue(category, 'delete', {})
+        self.assertEqual(LogEntry.objects.count(), count + 3)
+        self.assertEqual(pipeline._queue, [])
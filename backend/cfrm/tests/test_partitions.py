@@ -0,0 +1,62 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase
+from django.utils import timezone
+
+from cfrm import partitions
+from channels.models import ChannelConfiguration, Message, WebhookEvent
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.config = dict(partitions.DEFAULTS, ARCHIVE_DIR=directory.name,
+                           TABLES={'channels.Message': {'RETENTION_MONTHS': 1}})
+        self.table = partitions.get_table('channels.Message', self.config)
+
+    def test_unique_columns(self):
+        self.assertEqual(self.table.unique_columns(), [('id',)])
+
+    def test_archive_clears_unconstrained_references(self):
+        channel = ChannelConfiguration.objects.create(name='Twilio', type='sms')
+        month = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        old = Message.objects.create(channel=channel, recipient='+221', content='Ancien')
+        recent = Message.objects.create(channel=channel, recipient='+221', content='Récent')
+        Message.objects.filter(pk=old.pk).update(created_at=month.replace(day=15))
+        old_event = WebhookEvent.objects.create(event_type='delivery_status', channel=channel, payload={}, message=old)
+        recent_event = WebhookEvent.objects.create(
+            event_type='delivery_status', channel=channel, payload={}, message=recent
+        )
+
+        self.assertEqual(partitions.archivable_months(self.table), [month])
+        entry = partitions.archive_month(self.table, month, self.config)
+
+        self.assertEqual(entry['rows'], 1)
+        self.assertTrue(os.path.exists(os.path.join(self.config['ARCHIVE_DIR'], entry['file'])))
+        self.assertEqual(list(Message.objects.values_list('pk', flat=True)), [recent.pk])
+        old_event.refresh_from_db()
+        recent_event.refresh_from_db()
+        self.assertIsNone(old_event.message_id)
+        self.assertEqual(recent_event.message_id, recent.pk)
+
+    def test_restored_month_is_kept_during_grace(self):
+        channel = ChannelConfiguration.objects.create(name='Twilio', type='sms')
+        month = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        old = Message.objects.create(channel=channel, recipient='+221', content='Ancien')
+        Message.objects.filter(pk=old.pk).update(created_at=month.replace(day=15))
+        partitions.archive_month(self.table, month, self.config)
+
+        self.assertEqual(partitions.restore_month(self.table, month, self.config), 1)
+        restored = Message.objects.get(pk=old.pk)
+        self.assertEqual((restored.content, restored.created_at), ('Ancien', month.replace(day=15)))
+
+        # Passage quotidien de la tâche périodique : le mois restauré reste en place
+        self.assertEqual(partitions.maintain(config=self.config)['archived'], [])
+        self.assertTrue(Message.objects.filter(pk=old.pk).exists())
+
+        later = timezone.now() + timedelta(days=self.config['RESTORE_GRACE_DAYS'] + 1)
+        self.assertEqual(partitions.maintain(later, self.config)['archived'], ['channels.Message 2020-01'])
+        self.assertFalse(Message.objects.filter(pk=old.pk).exists())
@@ -5,3 +5,6 @@ class ChannelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'channels'
     verbose_name = 'Canaux de Communication'
+
+    def ready(self):
+        from . import signals  # noqa: F401
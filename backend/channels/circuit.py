@@ -0,0 +1,220 @@
+"""
+Disjoncteurs et santé des fournisseurs (Twilio, WhatsApp, SMTP)
+
+Chaque fournisseur a un disjoncteur qui garde, sur une fenêtre glissante, les
+derniers appels (succès, durée). Un appel compte comme un échec s'il lève une
+erreur du fournisseur (erreur réseau, 5xx, 429 — pas un 4xx propre à la
+requête, comme un numéro invalide) ou s'il dépasse ``SLOW_CALL_SECONDS``.
+
+- fermé : les appels passent ; au-delà de ``FAILURE_RATE`` d'échecs sur au
+  moins ``MIN_CALLS`` appels, le disjoncteur s'ouvre ;
+- ouvert : les appels échouent immédiatement (``CircuitOpen``) pendant
+  ``OPEN_SECONDS`` ; l'ouverture est publiée dans le cache partagé pour que
+  tous les workers échouent vite ;
+- semi-ouvert : un appel d'essai par processus ; un succès referme le
+  disjoncteur, un échec le rouvre. Un essai jamais conclu (envoi abandonné
+  avant l'appel) est rendu après ``OPEN_SECONDS``.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WINDOW_SECONDS': 60,
+    'MIN_CALLS': 5,
+    'FAILURE_RATE': 0.5,
+    'SLOW_CALL_SECONDS': 5,
+    'OPEN_SECONDS': 30,
+    'TIMEOUT': 10,
+}
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Fournisseur indisponible : appel refusé sans attendre le délai réseau"""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Fournisseur '{name}' indisponible, réessayer dans {retry_after:.0f} s")
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'CIRCUIT_BREAKER', {}))
+    return config
+
+
+def is_provider_error(exc):
+    """Erreur imputable au fournisseur (et non à la requête elle-même)"""
+    status = getattr(exc, 'status', None)  # TwilioRestException
+    response = getattr(exc, 'response', None)  # requests.HTTPError
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return True
+
+
+class CircuitBreaker:
+    """Disjoncteur d'un fournisseur"""
+
+    def __init__(self, name, config=None):
+        self.name = name
+        self.config = config or get_config()
+        self._lock = threading.Lock()
+        self._calls = deque()  # (horodatage, succès, durée)
+        self._state = CLOSED
+        self._opened_until = 0.0
+        self._trial = False
+        self._trial_at = 0.0
+        self.last_error = ''
+        self.last_failure_at = None
+
+    @property
+    def _shared_key(self):
+        return f'channels:circuit:{self.name}'
+
+    def _prune(self, now):
+        horizon = now - self.config['WINDOW_SECONDS']
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_until = now + self.config['OPEN_SECONDS']
+        self._trial = False
+        try:
+            cache.set(self._shared_key, time.time() + self.config['OPEN_SECONDS'], self.config['OPEN_SECONDS'])
+        except Exception:
+            pass
+        logger.warning(f"Disjoncteur '{self.name}' ouvert: {self.last_error}")
+
+    def _close(self):
+        self._state = CLOSED
+        self._calls.clear()
+        self._trial = False
+        try:
+            cache.delete(self._shared_key)
+        except Exception:
+            pass
+        logger.info(f"Disjoncteur '{self.name}' refermé")
+
+    def _shared_retry_after(self):
+        try:
+            opened_until = cache.get(self._shared_key)
+        except Exception:
+            return 0
+        return max(0.0, opened_until - time.time()) if opened_until else 0
+
+    def allow(self, trial=True):
+        """Autoriser un appel ; lève ``CircuitOpen`` si le fournisseur est coupé
+
+        ``trial=False`` vérifie seulement l'état (avant de préparer un envoi),
+        sans prendre l'appel d'essai du mode semi-ouvert.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._state == OPEN:
+                if now < self._opened_until:
+                    raise CircuitOpen(self.name, self._opened_until - now)
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if not trial:
+                    return
+                if self._trial and now - self._trial_at < self.config['OPEN_SECONDS']:
+                    raise CircuitOpen(self.name, 1)
+                self._trial, self._trial_at = True, now
+                return
+
+        # Ouvert par un autre worker
+        retry_after = self._shared_retry_after()
+        if retry_after:
+            raise CircuitOpen(self.name, retry_after)
+
+    def record(self, success, duration, error=''):
+        now = time.monotonic()
+        if duration > self.config['SLOW_CALL_SECONDS']:
+            success = False
+            error = error or f"Appel lent ({duration:.1f} s)"
+        with self._lock:
+            if not success:
+                self.last_error = error
+                self.last_failure_at = time.time()
+            if self._state == HALF_OPEN:
+                if success:
+                    self._close()
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, success, duration))
+            self._prune(now)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            if (self._state == CLOSED and len(self._calls) >= self.config['MIN_CALLS']
+                    and failures / len(self._calls) >= self.config['FAILURE_RATE']):
+                self._open(now)
+
+    @contextmanager
+    def guard(self, allowed=False):
+        """Encadrer un appel au fournisseur (autorisation, durée, résultat)
+
+        ``allowed=True`` : l'appel a déjà été autorisé par ``allow()``.
+        """
+        if not allowed:
+            self.allow()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.record(not is_provider_error(e), time.monotonic() - started, str(e))
+            raise
+        self.record(True, time.monotonic() - started)
+
+    def snapshot(self):
+        """État de santé : état, taux d'échec et latences sur la fenêtre"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            calls = list(self._calls)
+            state = self._state
+            if state == OPEN and now >= self._opened_until:
+                state = HALF_OPEN
+        retry_after = self._shared_retry_after()
+        if state == CLOSED and retry_after:
+            state = OPEN
+
+        durations = sorted(duration for _, _, duration in calls)
+        failures = sum(1 for _, ok, _ in calls if not ok)
+        return {
+            'name': self.name,
+            'state': state,
+            'calls': len(calls),
+            'error_rate': round(failures / len(calls), 3) if calls else 0.0,
+            'avg_latency_ms': round(sum(durations) / len(durations) * 1000, 1) if durations else None,
+            'p95_latency_ms': round(durations[int(0.95 * (len(durations) - 1))] * 1000, 1) if durations else None,
+            'retry_after': round(retry_after, 1) if retry_after else None,
+            'last_error': self.last_error,
+            'last_failure_at': self.last_failure_at,
+        }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Disjoncteur (unique par processus) d'un fournisseur"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
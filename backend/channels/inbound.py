@@ -0,0 +1,409 @@
+"""
+Conversion des messages entrants (SMS, WhatsApp) en tickets
+
+Les webhooks sont enregistrés tels quels puis traités par lots en tâche de
+fond (``process_pending_events``) : les événements en attente sont verrouillés
+(``SKIP LOCKED``), leurs messages extraits et traités en une transaction. Si
+le lot d'un canal échoue, chaque expéditeur est repris séparément : un message
+invalide ne bloque que ses propres événements, retentés plus tard
+(``MAX_ATTEMPTS`` tentatives, délai doublé à chaque échec).
+
+Pour chaque expéditeur, le ticket ouvert le plus récent du même canal, actif
+depuis moins de ``CONVERSATION_WINDOW_HOURS`` heures, reçoit les messages
+comme réponses ; sinon un ticket est créé à partir du premier message et les
+suivants du lot y sont ajoutés. La correspondance expéditeur → ticket ouvert
+est gardée en cache (vérifiée par clé primaire) et, à défaut, recherchée par
+l'index ``(submitter_phone, updated_at)``. Les messages déjà reçus (même
+identifiant fournisseur) sont ignorés, ce qui rend les relivraisons sans effet.
+Les nouveaux tickets sont classés par ``tickets.classification`` (catégorie,
+priorité) ; un contenu PSEA est escaladé dans la même transaction.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tickets import classification, duplicates, read_model
+from tickets.audit import ticket_audit
+from tickets.models import Category, Channel, Priority, Response, Status, Ticket
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CONVERSATION_WINDOW_HOURS': 72,
+    'DEFAULT_CATEGORY': 'Feedback',
+    'DEFAULT_PRIORITY': 'Moyenne',
+    'DEFAULT_STATUS': 'Ouvert',
+    'TITLE_LENGTH': 80,
+    'BATCH_SIZE': 500,
+    'SEND_CONFIRMATION': True,
+    # Événement en erreur : nouvelle tentative après RETRY_DELAY secondes,
+    # doublé à chaque échec, au plus MAX_ATTEMPTS tentatives
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 60,
+}
+
+INBOUND_EVENT_TYPES = ('sms_received', 'whatsapp_received')
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'INBOUND_PIPELINE', {}))
+    return config
+
+
+def normalize_phone(number):
+    """Numéro au format ``+<chiffres>`` (``whatsapp:+33 6…`` -> ``+336…``)"""
+    digits = ''.join(char for char in str(number or '') if char.isdigit())
+    return f'+{digits}' if digits else ''
+
+
+class InboundMessage:
+    """Message entrant normalisé"""
+
+    __slots__ = ('sender', 'text', 'external_id', 'name', 'event_id')
+
+    def __init__(self, sender, text, external_id='', name='', event_id=None):
+        self.sender = normalize_phone(sender)
+        self.text = (text or '').strip()
+        self.external_id = external_id or ''
+        self.name = name or ''
+        self.event_id = event_id
+
+
+# Extraction ---------------------------------------------------------------
+
+def is_inbound_sms(payload):
+    """Twilio : un SMS reçu porte ``Body`` et pas de statut de livraison"""
+    return 'Body' in payload and not payload.get('MessageStatus')
+
+
+def extract_sms(payload, event_id=None):
+    if not is_inbound_sms(payload):
+        return []
+    return [InboundMessage(
+        payload.get('From'),
+        payload.get('Body'),
+        external_id=payload.get('MessageSid') or payload.get('SmsSid', ''),
+        event_id=event_id,
+    )]
+
+
+def _whatsapp_text(msg):
+    msg_type = msg.get('type', 'text')
+    if msg_type == 'text':
+        return msg.get('text', {}).get('body', '')
+    if msg_type == 'interactive':
+        reply = msg.get('interactive', {})
+        reply = reply.get('button_reply') or reply.get('list_reply') or {}
+        return reply.get('title', '')
+    if msg_type == 'button':
+        return msg.get('button', {}).get('text', '')
+    # Média : légende éventuelle, sinon le type (ex. « [audio] »)
+    caption = msg.get(msg_type, {}).get('caption', '') if isinstance(msg.get(msg_type), dict) else ''
+    return caption or f'[{msg_type}]'
+
+
+def extract_whatsapp(payload, event_id=None):
+    messages = []
+    for entry in payload.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            names = {
+                contact.get('wa_id'): contact.get('profile', {}).get('name', '')
+                for contact in value.get('contacts', [])
+            }
+            for msg in value.get('messages', []):
+                messages.append(InboundMessage(
+                    msg.get('from'),
+                    _whatsapp_text(msg),
+                    external_id=msg.get('id', ''),
+                    name=names.get(msg.get('from'), ''),
+                    event_id=event_id,
+                ))
+    return messages
+
+
+EXTRACTORS = {
+    'sms': extract_sms,
+    'whatsapp': extract_whatsapp,
+}
+
+
+def extract_messages(channel_type, payload, event_id=None):
+    extractor = EXTRACTORS.get(channel_type)
+    if extractor is None or not isinstance(payload, dict):
+        return []
+    return extractor(payload, event_id)
+
+
+# Fil de conversation ------------------------------------------------------
+
+def conversation_key(channel_id, sender):
+    return f'channels:inbound:open:{channel_id}:{sender}'
+
+
+class InboundPipeline:
+    """Création de tickets et ajout de réponses pour un lot de messages"""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.window = timedelta(hours=self.config['CONVERSATION_WINDOW_HOURS'])
+
+    def references(self, channel_type):
+        """Canal de ticket et valeurs par défaut (catégorie, priorité, statut)"""
+        channel = Channel.objects.filter(type=channel_type, is_active=True).first()
+        category = (Category.objects.filter(name=self.config['DEFAULT_CATEGORY']).first()
+                    or Category.objects.filter(is_sensitive=False).first())
+        priority = (Priority.objects.filter(name=self.config['DEFAULT_PRIORITY']).first()
+                    or Priority.objects.filter(level=3).first() or Priority.objects.first())
+        status = (Status.objects.filter(name=self.config['DEFAULT_STATUS']).first()
+                  or Status.objects.filter(is_final=False).first())
+        if not all([channel, category, priority, status]):
+            raise ValueError(f"Références manquantes pour les messages entrants '{channel_type}'")
+        return channel, category, priority, status
+
+    def open_tickets(self, channel, senders, now):
+        """Ticket ouvert (dans la fenêtre de conversation) de chaque expéditeur"""
+        if not senders:
+            return {}
+        base = Ticket.objects.filter(
+            status__is_final=False, updated_at__gte=now - self.window
+        ).order_by('-updated_at')
+
+        cached = cache.get_many([conversation_key(channel.pk, sender) for sender in senders])
+        by_id = {pk: key.rsplit(':', 1)[1] for key, pk in cached.items()}
+        uncached = {sender for sender in senders if conversation_key(channel.pk, sender) not in cached}
+
+        resolved = {}
+        rows = base.filter(
+            Q(pk__in=list(by_id)) | Q(channel=channel, submitter_phone__in=list(uncached))
+        ).values_list('pk', 'submitter_phone')
+        for pk, phone in rows:
+            sender = by_id.get(str(pk)) or (phone if phone in uncached else None)
+            if sender:
+                resolved.setdefault(sender, pk)
+
+        # Entrées de cache périmées (ticket fermé entre-temps) : recherche par index
+        stale = [sender for sender in by_id.values() if sender not in resolved]
+        if stale:
+            rows = base.filter(channel=channel, submitter_phone__in=stale).values_list('pk', 'submitter_phone')
+            for pk, phone in rows:
+                resolved.setdefault(phone, pk)
+        return resolved
+
+    def known_ids(self, external_ids):
+        """Identifiants fournisseur déjà enregistrés (ticket ou réponse)"""
+        if not external_ids:
+            return set()
+        known = set(Ticket.objects.filter(external_id__in=external_ids).values_list('external_id', flat=True))
+        known.update(Response.objects.filter(
+            external_message_id__in=external_ids
+        ).values_list('external_message_id', flat=True))
+        return known
+
+    def _title(self, text):
+        length = self.config['TITLE_LENGTH']
+        first_line = text.splitlines()[0] if text else ''
+        return first_line if len(first_line) <= length else first_line[:length - 1].rstrip() + '…'
+
+    def process(self, channel_type, messages):
+        """Traiter un lot de messages ; retourne les tickets touchés par événement"""
+        messages = [msg for msg in messages if msg.sender and msg.text]
+        result = {'created': [], 'threaded': set(), 'duplicates': 0, 'events': {}}
+        if not messages:
+            return result
+
+        # Relivraisons (dans le lot et déjà enregistrées)
+        seen = self.known_ids([msg.external_id for msg in messages if msg.external_id])
+        unique = []
+        for msg in messages:
+            if msg.external_id and msg.external_id in seen:
+                result['duplicates'] += 1
+                continue
+            if msg.external_id:
+                seen.add(msg.external_id)
+            unique.append(msg)
+        if not unique:
+            return result
+
+        now = timezone.now()
+        channel, category, priority, status = self.references(channel_type)
+        senders = list(dict.fromkeys(msg.sender for msg in unique))
+
+        with transaction.atomic(), ticket_audit() as audit:
+            conversations = self.open_tickets(channel, senders, now)
+            tickets, responses, psea = [], [], []
+            classifier = classification.classifier_registry.get() if classification.is_enabled() else None
+            for msg in unique:
+                ticket_id = conversations.get(msg.sender)
+                if ticket_id is None:
+                    data = {
+                        'title': self._title(msg.text) or f"Message {channel.name}",
+                        'content': msg.text,
+                        'metadata': {'source': channel_type, 'inbound': True},
+                    }
+                    if classifier is not None:
+                        classified = classifier.classify(data['title'], data['content'])
+                        data['metadata']['classification'] = classified.as_metadata(classified.fields)
+                    else:
+                        classified = classification.Classification()
+                    classification.mark_fallback(data['metadata'], [
+                        name for name in ('category', 'priority') if not getattr(classified, name)
+                    ])
+                    ticket_category = classified.category or category
+                    ticket_priority = classified.priority or priority
+                    ticket = Ticket(
+                        id=uuid.uuid4(),
+                        category=ticket_category,
+                        priority=ticket_priority,
+                        status=status,
+                        channel=channel,
+                        external_id=msg.external_id,
+                        submitter_name=msg.name,
+                        submitter_phone=msg.sender,
+                        is_psea=ticket_category.is_sensitive or classified.is_psea,
+                        sla_deadline=now + timedelta(hours=ticket_priority.sla_hours),
+                        **data
+                    )
+                    tickets.append(ticket)
+                    if ticket.is_psea:
+                        psea.append(ticket.pk)
+                    conversations[msg.sender] = ticket_id = ticket.pk
+                    audit.add(ticket.pk, 'created', f"Ticket créé via {channel.name}")
+                    result['created'].append(ticket.pk)
+                else:
+                    responses.append(Response(
+                        ticket_id=ticket_id,
+                        content=msg.text,
+                        channel=channel,
+                        delivery_status='received',
+                        external_message_id=msg.external_id,
+                        sent_at=now,
+                    ))
+                    audit.add(ticket_id, 'response_added', f"Message reçu via {channel.name}")
+                    result['threaded'].add(ticket_id)
+                result['events'].setdefault(msg.event_id, ticket_id)
+
+            Ticket.objects.bulk_create(tickets, batch_size=self.config['BATCH_SIZE'])
+            # bulk_create ne déclenche pas post_save
+            duplicates.schedule_indexing([ticket.pk for ticket in tickets])
+            Response.objects.bulk_create(responses, batch_size=self.config['BATCH_SIZE'])
+            if psea:
+                # Contenu PSEA : escalade immédiate
+                classification.escalate_psea(psea)
+            if result['threaded']:
+                # Prolonger la fenêtre de conversation
+                Ticket.objects.filter(pk__in=result['threaded']).update(updated_at=now)
+            read_model.schedule_refresh(list(conversations.values()))
+
+            timeout = int(self.window.total_seconds())
+            transaction.on_commit(lambda: cache.set_many(
+                {conversation_key(channel.pk, sender): str(pk) for sender, pk in conversations.items()},
+                timeout
+            ))
+        return result
+
+
+# Traitement des webhooks --------------------------------------------------
+
+def enqueue_events(event_ids):
+    """Traiter des événements entrants en tâche de fond après validation"""
+    from .tasks import process_inbound_events
+
+    ids = [str(pk) for pk in event_ids]
+    transaction.on_commit(lambda: process_inbound_events.delay(ids))
+
+
+def process_pending_events(event_ids=None, config=None):
+    """Traiter en une transaction un lot d'événements entrants en attente
+
+    Retourne le nombre d'événements traités.
+    """
+    config = config or get_config()
+    pipeline = InboundPipeline(config)
+    now = timezone.now()
+    queryset = WebhookEvent.objects.filter(
+        processed=False, event_type__in=INBOUND_EVENT_TYPES, attempts__lt=config['MAX_ATTEMPTS']
+    ).filter(Q(retry_at__isnull=True) | Q(retry_at__lte=now))
+    if event_ids is not None:
+        queryset = queryset.filter(pk__in=event_ids)
+
+    with transaction.atomic():
+        events = list(
+            queryset.select_for_update(skip_locked=True).order_by('created_at')[:config['BATCH_SIZE']]
+        )
+        if not events:
+            return 0
+
+        channel_types = dict(
+            WebhookEvent.objects.filter(pk__in=[event.pk for event in events])
+            .values_list('pk', 'channel__type')
+        )
+        groups = {}
+        for event in events:
+            channel_type = channel_types[event.pk]
+            messages = extract_messages(channel_type, event.payload, event.pk)
+            groups.setdefault(channel_type, []).extend(messages)
+
+        tickets_by_event, errors = {}, {}
+        for channel_type, messages in groups.items():
+            _process_messages(pipeline, channel_type, messages, tickets_by_event, errors)
+
+        for event in events:
+            error = errors.get(event.pk)
+            if error:
+                event.attempts += 1
+                event.error_message = error
+                event.retry_at = now + timedelta(seconds=config['RETRY_DELAY'] * 2 ** (event.attempts - 1))
+            else:
+                event.processed = True
+                event.processed_at = now
+                event.error_message = ''
+                event.ticket_id = tickets_by_event.get(event.pk)
+        WebhookEvent.objects.bulk_update(
+            events, ['processed', 'processed_at', 'ticket', 'error_message', 'attempts', 'retry_at']
+        )
+    return len(events)
+
+
+def _process_messages(pipeline, channel_type, messages, tickets_by_event, errors):
+    """Traiter des messages dans un point de sauvegarde, puis expéditeur par expéditeur en cas d'échec"""
+    try:
+        with transaction.atomic():
+            result = pipeline.process(channel_type, messages)
+    except Exception as e:
+        by_sender = {}
+        for msg in messages:
+            by_sender.setdefault(msg.sender, []).append(msg)
+        if len(by_sender) > 1:
+            for sender_messages in by_sender.values():
+                _process_messages(pipeline, channel_type, sender_messages, tickets_by_event, errors)
+            return
+        logger.error(f"Traitement des messages entrants '{channel_type}' impossible: {e}")
+        for msg in messages:
+            errors[msg.event_id] = str(e)
+        return
+    tickets_by_event.update(result['events'])
+    if result['created'] and pipeline.config['SEND_CONFIRMATION']:
+        _enqueue_confirmations(result['created'])
+
+
+def _enqueue_confirmations(ticket_ids, chunk=500):
+    """Accusés de réception des nouveaux tickets (tâche limitée en débit)"""
+    from .tasks import send_ticket_notifications
+
+    ids = [str(pk) for pk in ticket_ids]
+
+    def enqueue():
+        for i in range(0, len(ids), chunk):
+            send_ticket_notifications.delay(ids[i:i + chunk], 'confirmation')
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0003_webhookevent_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Tentatives de traitement en échec'),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, help_text='Prochaine tentative', null=True),
+        ),
+    ]
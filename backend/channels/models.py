@@ -171,14 +171,24 @@ class WebhookEvent(models.Model):
     # Données de l'événement
     payload = models.JSONField()
     headers = models.JSONField(default=dict)
+
+    # Rétention (channels.retention) : champs utiles conservés, charge brute
+    # compressée puis retirée une fois l'événement traité
+    summary = models.JSONField(default=dict, blank=True)
+    payload_compressed = models.BinaryField(null=True, blank=True, editable=False)
+    compacted_at = models.DateTimeField(null=True, blank=True)
     
     # Traitement
     processed = models.BooleanField(default=False)
     processed_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Tentatives de traitement en échec")
+    retry_at = models.DateTimeField(null=True, blank=True, help_text="Prochaine tentative")
     
     # Liens
-    message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True)
+    # Sans contrainte en base : la table des messages peut être partitionnée
+    # (cfrm.partitions) et sa clé primaire inclut alors created_at
+    message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False)
     ticket = models.ForeignKey('tickets.Ticket', on_delete=models.SET_NULL, null=True, blank=True)
     
     # Métadonnées
@@ -192,11 +202,24 @@ class WebhookEvent(models.Model):
         indexes = [
             models.Index(fields=['event_type', 'processed']),
             models.Index(fields=['created_at']),
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(processed=True, compacted_at__isnull=True),
+                name='channels_webhook_compact_idx',
+            ),
         ]
 
     def __str__(self):
         return f"Webhook {self.event_type} - {self.created_at}"
 
+    @property
+    def full_payload(self):
+        """Charge d'origine, décompressée si l'événement a été compacté"""
+        if self.payload_compressed is not None:
+            from .retention import decompress_payload
+            return decompress_payload(self.payload_compressed)
+        return self.payload
+
     def mark_as_processed(self):
         """Marquer l'événement comme traité"""
         self.processed = True
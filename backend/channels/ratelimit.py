@@ -0,0 +1,249 @@
+"""
+Limitation du débit des envois sortants (seau à jetons)
+
+Chaque canal (ou expéditeur, pour les SMS) a un seau de ``BURST`` jetons
+rechargé à ``RATE`` jetons par seconde ; un envoi consomme un jeton par
+segment. Le seau est partagé entre processus via Redis (script Lua atomique,
+horloge du serveur Redis) ; sans Redis, un seau en mémoire par processus prend
+le relais.
+
+Priorité : le trafic courant doit laisser une réserve de jetons
+(``PRIORITY_RESERVE`` × ``BURST``) et ne s'endette jamais ; les messages
+critiques (tickets PSEA ou de priorité critique) peuvent consommer la réserve et
+réserver des jetons à découvert (au plus ``MAX_WAIT_SECONDS`` de débit), ce
+qui fait patienter le trafic courant jusqu'à leur envoi.
+
+Dans une requête HTTP, l'envoi ne patiente pas : ``acquire(block=False)``
+tente une seule fois, sans découvert, et lève ``Throttled`` pour que l'appelant
+replanifie le message en tâche de fond.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - Redis est optionnel
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'REDIS_URL': None,
+    'KEY_PREFIX': 'cfrm:ratelimit:',
+    'MAX_WAIT_SECONDS': 30,
+    'PRIORITY_RESERVE': 0.2,
+    'CRITICAL_LEVEL': 5,
+    'RATES': {
+        'sms': {'RATE': 1, 'BURST': 1},
+        'whatsapp': {'RATE': 20, 'BURST': 20},
+        'email': {'RATE': 5, 'BURST': 10},
+    },
+}
+
+# Retourne {accordé (0/1), attente en secondes}
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local needed = tonumber(ARGV[4])
+local critical = tonumber(ARGV[5])
+local ttl = tonumber(ARGV[6])
+local debt = tonumber(ARGV[7])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local granted = 0
+local wait = 0
+if critical == 1 and tokens - cost >= -debt then
+    if tokens < cost then wait = (cost - tokens) / rate end
+    tokens = tokens - cost
+    granted = 1
+elseif critical == 1 then
+    wait = (cost - debt - tokens) / rate
+elseif tokens >= needed then
+    tokens = tokens - cost
+    granted = 1
+else
+    wait = (needed - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ttl)
+return {granted, tostring(wait)}
+"""
+
+
+class Throttled(Exception):
+    """Envoi refusé : débit du canal atteint"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Débit d'envoi atteint, réessayer dans {retry_after:.1f} s")
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'OUTBOUND_RATE_LIMIT', {}))
+    return config
+
+
+# Stockage des seaux -------------------------------------------------------
+
+class MemoryBuckets:
+    """Seaux locaux au processus (repli sans Redis)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, rate, burst, cost, needed, critical, debt=0.0):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+            granted, wait = False, 0.0
+            if critical and tokens - cost >= -debt:
+                if tokens < cost:
+                    wait = (cost - tokens) / rate
+                tokens -= cost
+                granted = True
+            elif critical:
+                wait = (cost - debt - tokens) / rate
+            elif tokens >= needed:
+                tokens -= cost
+                granted = True
+            else:
+                wait = (needed - tokens) / rate
+            self._buckets[key] = (tokens, now)
+        return granted, wait
+
+
+class RedisBuckets:
+    """Seaux partagés ; repli sur la mémoire si Redis est injoignable"""
+
+    def __init__(self, url, fallback):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.script = self.client.register_script(TAKE_SCRIPT)
+        self.fallback = fallback
+
+    def take(self, key, rate, burst, cost, needed, critical, debt=0.0):
+        ttl = int((max(burst, cost) + debt) / rate) + 60
+        try:
+            granted, wait = self.script(
+                keys=[key], args=[rate, burst, cost, needed, int(critical), ttl, debt]
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Limiteur Redis indisponible, repli en mémoire: {e}")
+            return self.fallback.take(key, rate, burst, cost, needed, critical, debt)
+        return bool(granted), float(wait)
+
+
+_memory = MemoryBuckets()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = get_config()['REDIS_URL']
+                _backend = RedisBuckets(url, _memory) if url and redis is not None else _memory
+    return _backend
+
+
+# Limiteur -----------------------------------------------------------------
+
+class RateLimiter:
+    """Seau à jetons d'un canal ou d'un expéditeur"""
+
+    def __init__(self, key, rate, burst, reserve=0.0, max_wait=None, backend=None):
+        self.key = key
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.reserve = float(reserve) * self.burst
+        self.max_wait = max_wait
+        self.backend = backend or get_backend()
+
+    def take(self, cost=1, critical=False, debt=0.0):
+        """Tenter de consommer ``cost`` jetons ; retourne ``(accordé, attente)``
+
+        ``debt`` : jetons qu'un message critique peut emprunter à découvert.
+        """
+        # Le trafic courant attend un seau rempli au-delà de la réserve
+        # (plafonné à la capacité pour qu'un envoi reste toujours possible)
+        needed = min(self.burst, cost + self.reserve)
+        return self.backend.take(self.key, self.rate, self.burst, cost, needed, critical, debt)
+
+    def acquire(self, cost=1, critical=False, max_wait=None, block=True):
+        """Attendre son tour ; lève ``Throttled`` au-delà de ``max_wait`` secondes
+
+        Le découvert d'un message critique est plafonné à ``max_wait`` secondes
+        de débit : il n'attend jamais plus longtemps. ``block=False`` ne
+        patiente pas (une seule tentative, sans découvert).
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        if not block:
+            granted, wait = self.take(cost, critical)
+            if not granted:
+                raise Throttled(wait)
+            return 0.0
+
+        debt = self.rate * max_wait if max_wait is not None else 1e12
+        waited = 0.0
+        while True:
+            granted, wait = self.take(cost, critical, debt)
+            if granted:
+                # Un message critique peut avoir réservé à découvert
+                if wait > 0:
+                    time.sleep(wait)
+                return waited + wait
+            if max_wait is not None and waited + wait > max_wait:
+                raise Throttled(wait)
+            time.sleep(wait)
+            waited += wait
+
+
+def channel_rate(channel_config):
+    """Débit ``(rate, burst)`` d'un canal : configuration du canal, sinon réglages"""
+    config = get_config()
+    rates = dict(config['RATES'].get(channel_config.type, {}))
+    overrides = (channel_config.configuration or {}).get('rate_limit', {})
+    rates.update({key.upper(): value for key, value in overrides.items()})
+    rate = float(rates.get('RATE') or 0)
+    return rate, float(rates.get('BURST') or rate)
+
+
+def limiter_for(channel_config, key=None):
+    """Limiteur d'un canal, ou ``None`` si la limitation est désactivée"""
+    if not getattr(settings, 'RATELIMIT_ENABLE', True):
+        return None
+    rate, burst = channel_rate(channel_config)
+    if rate <= 0:
+        return None
+    config = get_config()
+    key = key or f'{channel_config.type}:{channel_config.pk}'
+    return RateLimiter(
+        config['KEY_PREFIX'] + key, rate, burst,
+        reserve=config['PRIORITY_RESERVE'],
+        max_wait=config['MAX_WAIT_SECONDS'],
+    )
+
+
+def is_critical(ticket):
+    """Messages prioritaires : tickets PSEA ou de priorité critique"""
+    if ticket is None:
+        return False
+    if ticket.is_psea:
+        return True
+    priority = ticket.priority
+    return priority is not None and priority.level >= get_config()['CRITICAL_LEVEL']
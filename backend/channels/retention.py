@@ -0,0 +1,132 @@
+"""
+Rétention des événements webhook
+
+À la réception, seuls les en-têtes utiles (signature, type de contenu, agent)
+sont enregistrés. Après ``COMPACT_AFTER_DAYS`` jours, les événements traités
+avec succès sont compactés par lots : les champs utiles (identifiants du
+fournisseur, statut, erreur) sont extraits dans ``summary``, la charge brute
+est compressée (``MODE='compress'``) ou supprimée (``MODE='drop'``) et les
+en-têtes vidés, en un ``bulk_update`` par lot. Les événements en échec ou non
+traités gardent leur charge complète.
+"""
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import WebhookEvent
+
+DEFAULTS = {
+    'COMPACT_AFTER_DAYS': 7,
+    'MODE': 'compress',
+    'BATCH_SIZE': 500,
+    'KEEP_HEADERS': [
+        'Content-Type', 'User-Agent', 'X-Forwarded-For',
+        'X-Twilio-Signature', 'X-Hub-Signature-256',
+    ],
+}
+
+# Champs conservés par type de canal (charges à plat)
+SUMMARY_KEYS = {
+    'sms': ['MessageSid', 'SmsSid', 'AccountSid', 'MessageStatus', 'SmsStatus',
+            'ErrorCode', 'ErrorMessage', 'From', 'To'],
+    'email': ['id', 'message_id', 'event', 'status', 'error', 'reason', 'recipient'],
+}
+DEFAULT_SUMMARY_KEYS = ['id', 'message_id', 'status', 'event', 'error']
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'WEBHOOK_RETENTION', {}))
+    return config
+
+
+def webhook_headers(request):
+    """En-têtes à enregistrer avec un événement (liste ``KEEP_HEADERS``)"""
+    keep = get_config()['KEEP_HEADERS']
+    return {name: request.headers[name] for name in keep if name in request.headers}
+
+
+def _summarize_whatsapp(payload):
+    messages, statuses = [], []
+    for entry in payload.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            for msg in value.get('messages', []):
+                messages.append({'id': msg.get('id'), 'from': msg.get('from'), 'type': msg.get('type')})
+            for item in value.get('statuses', []):
+                statuses.append({
+                    'id': item.get('id'),
+                    'status': item.get('status'),
+                    'errors': [error.get('code') for error in item.get('errors', [])],
+                })
+    summary = {}
+    if messages:
+        summary['messages'] = messages
+    if statuses:
+        summary['statuses'] = statuses
+    return summary
+
+
+def summarize(channel_type, payload):
+    """Champs utiles d'une charge de fournisseur"""
+    if not isinstance(payload, dict):
+        return {}
+    if channel_type == 'whatsapp':
+        return _summarize_whatsapp(payload)
+    keys = SUMMARY_KEYS.get(channel_type, DEFAULT_SUMMARY_KEYS)
+    return {key: payload[key] for key in keys if payload.get(key) not in (None, '')}
+
+
+def compress_payload(payload):
+    return zlib.compress(json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8'), 6)
+
+
+def decompress_payload(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+
+
+def compactable(now=None, config=None):
+    config = config or get_config()
+    cutoff = (now or timezone.now()) - timedelta(days=config['COMPACT_AFTER_DAYS'])
+    return WebhookEvent.objects.filter(
+        processed=True, compacted_at__isnull=True, created_at__lt=cutoff
+    ).exclude(error_message__gt='')
+
+
+def compact_events(now=None, config=None, max_batches=None):
+    """Compacter les événements traités anciens ; retourne le nombre compacté"""
+    config = config or get_config()
+    now = now or timezone.now()
+    compress = config['MODE'] == 'compress'
+    total = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        rows = list(
+            compactable(now, config).order_by().values(
+                'pk', 'payload', 'channel__type'
+            )[:config['BATCH_SIZE']]
+        )
+        if not rows:
+            break
+
+        events = [
+            WebhookEvent(
+                pk=row['pk'],
+                summary=summarize(row['channel__type'], row['payload']),
+                payload={},
+                headers={},
+                payload_compressed=compress_payload(row['payload']) if compress else None,
+                compacted_at=now,
+            )
+            for row in rows
+        ]
+        WebhookEvent.objects.bulk_update(
+            events, ['summary', 'payload', 'headers', 'payload_compressed', 'compacted_at']
+        )
+        total += len(events)
+        batches += 1
+    return total
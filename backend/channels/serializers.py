@@ -51,8 +51,8 @@ class WebhookEventSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = WebhookEvent
-        fields = '__all__'
-        read_only_fields = ['id', 'created_at', 'processed_at']
+        exclude = ['payload_compressed']
+        read_only_fields = ['id', 'created_at', 'processed_at', 'summary', 'compacted_at']
 
 
 class ChannelStatsSerializer(serializers.ModelSerializer):
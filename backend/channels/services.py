@@ -2,12 +2,19 @@
 Services pour la gestion des canaux de communication
 """
 import logging
+import math
 import requests
 from django.conf import settings
 from django.utils import timezone
 from twilio.rest import Client as TwilioClient
 from twilio.base.exceptions import TwilioException
-from .models import Message, MessageTemplate, ChannelStats, WebhookEvent
+from twilio.http.http_client import TwilioHttpClient
+from .circuit import CircuitOpen, get_breaker, get_config as get_circuit_config
+from .inbound import enqueue_events as enqueue_inbound_events, extract_whatsapp, is_inbound_sms
+from .models import Message, ChannelStats, WebhookEvent
+from .ratelimit import Throttled, is_critical, limiter_for
+from .sms import get_config as get_sms_config, plan_message as plan_sms
+from .templates import template_registry
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +33,53 @@ class BaseChannelService:
     def process_webhook(self, payload, headers):
         """Traiter un webhook reçu"""
         raise NotImplementedError
+    
+    def rate_limit_key(self):
+        """Clé du seau à jetons (par canal par défaut)"""
+        return f"{self.channel_config.type}:{self.channel_config.pk}"
+    
+    def throttle(self, cost=1, ticket=None, critical=None, block=True):
+        """Attendre le débit du canal ; lève ``Throttled`` si l'attente est trop longue
+
+        ``block=False`` (requêtes HTTP) : pas d'attente, ``Throttled`` si le
+        seau est vide.
+        """
+        limiter = limiter_for(self.channel_config, self.rate_limit_key())
+        if limiter is None:
+            return 0
+        if critical is None:
+            critical = is_critical(ticket)
+        return limiter.acquire(cost, critical=critical, block=block)
+    
+    def circuit_name(self):
+        """Nom du disjoncteur (par canal par défaut)"""
+        return f"{self.channel_config.type}:{self.channel_config.pk}"
+    
+    @property
+    def circuit(self):
+        return get_breaker(self.circuit_name())
+    
+    @property
+    def timeout(self):
+        """Délai réseau maximal d'un appel au fournisseur (secondes)"""
+        return get_circuit_config()['TIMEOUT']
+    
+    def before_send(self, cost=1, ticket=None, critical=None, block=True):
+        """Échouer vite si le fournisseur est coupé, respecter le débit, puis
+        prendre l'appel (l'appel d'essai en semi-ouvert)
+
+        ``CircuitOpen`` est levée ici, avant la création du ``Message``, pour
+        que l'appelant replanifie l'envoi ; l'appel au fournisseur se fait
+        ensuite sous ``circuit.guard(allowed=True)``.
+        """
+        self.circuit.allow(trial=False)
+        waited = self.throttle(cost, ticket, critical, block)
+        self.circuit.allow()
+        return waited
+    
+    def check_connection(self):
+        """Vérifier l'accès au fournisseur ; retourne des détails ou lève une erreur"""
+        raise NotImplementedError
 
 
 class SMSService(BaseChannelService):
@@ -35,29 +89,53 @@ class SMSService(BaseChannelService):
         super().__init__(channel_config)
         self.client = TwilioClient(
             settings.TWILIO_ACCOUNT_SID,
-            settings.TWILIO_AUTH_TOKEN
+            settings.TWILIO_AUTH_TOKEN,
+            http_client=TwilioHttpClient(timeout=self.timeout)
         )
         self.phone_number = settings.TWILIO_PHONE_NUMBER
     
+    def rate_limit_key(self):
+        # Le débit Twilio s'applique par numéro d'expéditeur
+        return f"sms:{self.phone_number}"
+    
+    def circuit_name(self):
+        return "sms:twilio"
+    
+    def check_connection(self):
+        """Lire le compte Twilio (identifiants et disponibilité de l'API)"""
+        with self.circuit.guard():
+            account = self.client.api.accounts(settings.TWILIO_ACCOUNT_SID).fetch()
+        return {'account_status': account.status}
+    
     def send_message(self, recipient, content, subject=None, template=None, **kwargs):
         """Envoyer un SMS"""
+        # Planifier : encodage, segments, translittération et coût estimé
+        plan = plan_sms(content, get_sms_config(self.channel_config))
+        
+        # Respecter le débit de l'expéditeur (segments par seconde)
+        self.before_send(
+            plan.segments, kwargs.get('ticket'), kwargs.get('critical'), kwargs.get('block', True)
+        )
+        
         try:
             # Créer le message en base
             message = Message.objects.create(
                 channel=self.channel_config,
                 recipient=recipient,
-                content=content,
+                content=plan.text,
                 template=template,
                 ticket=kwargs.get('ticket'),
-                response=kwargs.get('response')
+                response=kwargs.get('response'),
+                metadata={'sms': plan.as_metadata()}
             )
             
             # Envoyer via Twilio
-            twilio_message = self.client.messages.create(
-                body=content,
-                from_=self.phone_number,
-                to=recipient
-            )
+            with self.circuit.guard(allowed=True):
+                twilio_message = self.client.messages.create(
+                    body=plan.text,
+                    from_=self.phone_number,
+                    to=recipient
+                )
             
             # Mettre à jour le statut
             message.mark_as_sent(twilio_message.sid)
@@ -76,7 +154,18 @@ class SMSService(BaseChannelService):
             return None
     
     def process_webhook(self, payload, headers):
-        """Traiter les webhooks Twilio"""
+        """Traiter les webhooks Twilio (SMS reçus et statuts de livraison)"""
+        if is_inbound_sms(payload):
+            # SMS reçu : ticket ou réponse créés en tâche de fond
+            webhook_event = WebhookEvent.objects.create(
+                event_type='sms_received',
+                channel=self.channel_config,
+                payload=payload,
+                headers=headers
+            )
+            enqueue_inbound_events([webhook_event.pk])
+            return webhook_event
+        
         event_type = payload.get('MessageStatus', 'unknown')
         
         webhook_event = WebhookEvent.objects.create(
@@ -117,8 +206,25 @@ class WhatsAppService(BaseChannelService):
         self.phone_number_id = settings.WHATSAPP_PHONE_NUMBER_ID
         self.api_url = f"https://graph.facebook.com/v17.0/{self.phone_number_id}/messages"
     
+    def circuit_name(self):
+        return f"whatsapp:{self.phone_number_id}"
+    
+    def check_connection(self):
+        """Lire le numéro WhatsApp Business (jeton et disponibilité de l'API)"""
+        with self.circuit.guard():
+            response = requests.get(
+                f"https://graph.facebook.com/v17.0/{self.phone_number_id}",
+                params={'fields': 'display_phone_number,quality_rating'},
+                headers={"Authorization": f"Bearer {self.access_token}"},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        return response.json()
+    
     def send_message(self, recipient, content, subject=None, template=None, **kwargs):
         """Envoyer un message WhatsApp"""
+        self.before_send(1, kwargs.get('ticket'), kwargs.get('critical'), kwargs.get('block', True))
+        
         try:
             # Créer le message en base
             message = Message.objects.create(
@@ -144,8 +250,9 @@ class WhatsAppService(BaseChannelService):
             }
             
             # Envoyer via l'API WhatsApp
-            response = requests.post(self.api_url, json=data, headers=headers)
-            response.raise_for_status()
+            with self.circuit.guard(allowed=True):
+                response = requests.post(self.api_url, json=data, headers=headers, timeout=self.timeout)
+                response.raise_for_status()
             
             result = response.json()
             message_id = result.get('messages', [{}])[0].get('id')
@@ -167,7 +274,11 @@ class WhatsAppService(BaseChannelService):
             return None
     
     def process_webhook(self, payload, headers):
-        """Traiter les webhooks WhatsApp"""
+        """Traiter les webhooks WhatsApp
+        
+        Les messages reçus sont convertis en tickets ou en réponses en tâche de
+        fond, par lots (voir ``channels.inbound``).
+        """
         webhook_event = WebhookEvent.objects.create(
             event_type='whatsapp_received',
             channel=self.channel_config,
@@ -175,43 +286,37 @@ class WhatsAppService(BaseChannelService):
             headers=headers
         )
         
-        # Traiter les messages entrants
-        entries = payload.get('entry', [])
-        for entry in entries:
-            changes = entry.get('changes', [])
-            for change in changes:
-                value = change.get('value', {})
-                messages = value.get('messages', [])
-                
-                for msg in messages:
-                    from_number = msg.get('from')
-                    text = msg.get('text', {}).get('body', '')
-                    
-                    if from_number and text:
-                        # Créer un ticket ou une réponse
-                        # Cette logique dépend de votre implémentation
-                        webhook_event.ticket = self._create_ticket_from_message(
-                            from_number, text, webhook_event
-                        )
-        
-        webhook_event.mark_as_processed()
+        if extract_whatsapp(payload):
+            enqueue_inbound_events([webhook_event.pk])
+        else:
+            # Notifications sans message (statuts) : rien à convertir
+            webhook_event.mark_as_processed()
         return webhook_event
-    
-    def _create_ticket_from_message(self, from_number, text, webhook_event):
-        """Créer un ticket à partir d'un message WhatsApp"""
-        # Implémentation spécifique pour créer un ticket
-        # depuis un message WhatsApp
-        pass
 
 
 class EmailService(BaseChannelService):
     """Service pour l'envoi d'emails"""
     
+    def circuit_name(self):
+        return f"email:{settings.EMAIL_HOST}"
+    
+    def check_connection(self):
+        """Ouvrir une connexion au serveur d'envoi"""
+        from django.core.mail import get_connection
+        
+        with self.circuit.guard():
+            connection = get_connection(fail_silently=False, timeout=self.timeout)
+            connection.open()
+            connection.close()
+        return {'host': settings.EMAIL_HOST, 'port': settings.EMAIL_PORT}
+    
     def send_message(self, recipient, content, subject=None, template=None, **kwargs):
         """Envoyer un email"""
         from django.core.mail import send_mail
         from django.template.loader import render_to_string
         
+        self.before_send(1, kwargs.get('ticket'), kwargs.get('critical'), kwargs.get('block', True))
+        
         try:
             # Créer le message en base
             message = Message.objects.create(
@@ -225,13 +330,14 @@ class EmailService(BaseChannelService):
             )
             
             # Envoyer l'email
-            send_mail(
-                subject=message.subject,
-                message=content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[recipient],
-                fail_silently=False
-            )
+            with self.circuit.guard(allowed=True):
+                send_mail(
+                    subject=message.subject,
+                    message=content,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipient_list=[recipient],
+                    fail_silently=False
+                )
             
             # Mettre à jour le statut
             message.mark_as_sent()
@@ -266,27 +372,51 @@ class ChannelServiceFactory:
 class MessageService:
     """Service central pour la gestion des messages"""
     
+    @staticmethod
+    def ticket_language(ticket):
+        """Langue du soumetteur (métadonnées du ticket), sinon langue par défaut"""
+        return (ticket.metadata or {}).get('language')
+    
     @staticmethod
     def send_ticket_confirmation(ticket):
         """Envoyer une confirmation de réception de ticket"""
-        # Récupérer le template de confirmation
-        template = MessageTemplate.objects.filter(
-            channel__type=ticket.channel.type,
-            template_type='confirmation',
-            is_active=True
-        ).first()
+        return MessageService.send_ticket_notification(ticket, 'confirmation')
+    
+    @staticmethod
+    def defer_ticket_notification(ticket_ids, template_type, retry_after):
+        """Replanifier des notifications refusées par le limiteur de débit"""
+        from .tasks import send_ticket_notifications
         
-        if not template:
-            logger.warning(f"Template de confirmation non trouvé pour {ticket.channel.type}")
-            return None
+        send_ticket_notifications.apply_async(
+            ([str(pk) for pk in ticket_ids], template_type),
+            countdown=max(1, math.ceil(retry_after))
+        )
+    
+    @staticmethod
+    def send_ticket_notification(ticket, template_type, defer=True):
+        """Envoyer une notification de ticket (confirmation, escalade, fermeture...)
         
-        # Remplacer les variables dans le template
-        content = template.content.format(
-            ticket_id=ticket.id,
-            title=ticket.title,
-            category=ticket.category.name,
-            priority=ticket.priority.name
+        Si le débit du canal est atteint ou le fournisseur coupé, l'envoi est
+        replanifié en tâche de fond (``defer=True``) ou l'exception
+        (``Throttled``, ``CircuitOpen``) est propagée à l'appelant.
+        """
+        # Modèle compilé (registre en mémoire, sans requête)
+        rendered = template_registry.render(
+            ticket.channel.type,
+            template_type,
+            {
+                'ticket_id': ticket.id,
+                'title': ticket.title,
+                'category': ticket.category.name,
+                'priority': ticket.priority.name,
+                'status': ticket.status.name,
+            },
+            language=MessageService.ticket_language(ticket),
         )
+        if not rendered:
+            logger.warning(f"Template '{template_type}' non trouvé pour {ticket.channel.type}")
+            return None
+        template, subject, content = rendered
         
         # Obtenir le service approprié
         service = ChannelServiceFactory.get_service(ticket.channel)
@@ -298,38 +428,48 @@ class MessageService:
             return None
         
         # Envoyer le message
-        return service.send_message(
-            recipient=recipient,
-            content=content,
-            subject=template.subject,
-            template=template,
-            ticket=ticket
-        )
+        try:
+            return service.send_message(
+                recipient=recipient,
+                content=content,
+                subject=subject,
+                template=template,
+                ticket=ticket,
+                # Hors tâche de fond : replanifier plutôt que patienter
+                block=not defer
+            )
+        except (Throttled, CircuitOpen) as e:
+            if not defer:
+                raise
+            logger.info(f"Notification '{template_type}' du ticket {ticket.id} replanifiée ({e})")
+            MessageService.defer_ticket_notification([ticket.pk], template_type, e.retry_after)
+            return None
     
     @staticmethod
     def send_ticket_response(response):
         """Envoyer une réponse à un ticket"""
         ticket = response.ticket
         
-        # Récupérer le template de réponse
-        template = MessageTemplate.objects.filter(
-            channel__type=ticket.channel.type,
-            template_type='response',
-            is_active=True
-        ).first()
+        # Modèle de réponse compilé (registre en mémoire, sans requête)
+        rendered = template_registry.render(
+            ticket.channel.type,
+            'response',
+            {
+                'ticket_id': ticket.id,
+                'response_content': response.content,
+                'responder': response.author.get_full_name() if response.author else 'Équipe CFRM',
+            },
+            language=MessageService.ticket_language(ticket),
+        )
         
-        if not template:
+        if not rendered:
             # Utiliser le contenu de la réponse directement
+            template = None
             content = response.content
             subject = f"Réponse à votre ticket #{ticket.id}"
         else:
-            # Remplacer les variables dans le template
-            content = template.content.format(
-                ticket_id=ticket.id,
-                response_content=response.content,
-                responder=response.author.get_full_name() if response.author else 'Équipe CFRM'
-            )
-            subject = template.subject or f"Réponse à votre ticket #{ticket.id}"
+            template, subject, content = rendered
+            subject = subject or f"Réponse à votre ticket #{ticket.id}"
         
         # Obtenir le service approprié
         service = ChannelServiceFactory.get_service(ticket.channel)
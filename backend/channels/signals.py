@@ -0,0 +1,17 @@
+"""
+Signaux de l'application channels
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ChannelConfiguration, MessageTemplate
+from .templates import template_registry
+
+
+@receiver([post_save, post_delete], sender=MessageTemplate)
+@receiver([post_save, post_delete], sender=ChannelConfiguration)
+def invalidate_templates(sender, raw=False, **kwargs):
+    """Recharger les modèles compilés après validation de la modification"""
+    if not raw:
+        transaction.on_commit(template_registry.reload)
@@ -0,0 +1,143 @@
+"""
+Planification des SMS avant envoi
+
+Un SMS est facturé et limité par segment : 160 caractères GSM-7 (153 par
+segment concaténé) ou 70 unités UCS-2 (67 par segment) dès qu'un seul
+caractère sort de l'alphabet GSM-7 — un « ê » ou une apostrophe typographique
+suffit. Le plan détecte l'encodage, compte les segments, translittère si
+possible vers GSM-7 (sans jamais perdre de caractère : un texte non latin reste
+en UCS-2) et estime le coût. Les segments sont ensuite décomptés par le
+limiteur de débit de l'expéditeur (voir ``channels.ratelimit``), le débit des
+fournisseurs (MPS) étant compté en segments par seconde.
+"""
+import unicodedata
+
+from django.conf import settings
+
+DEFAULTS = {
+    'TRANSLITERATE': True,
+    'COST_PER_SEGMENT': 0.0,
+    'CURRENCY': 'USD',
+}
+
+GSM7_BASIC = set(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+# Caractères de la table d'extension (deux septets : échappement + caractère)
+GSM7_EXTENSION = set('^{}\\[~]|€\f')
+GSM7 = GSM7_BASIC | GSM7_EXTENSION
+
+GSM7_SINGLE, GSM7_MULTI = 160, 153
+UCS2_SINGLE, UCS2_MULTI = 70, 67
+
+# Équivalents GSM-7 des caractères fréquents en français
+TRANSLITERATIONS = {
+    'ç': 'c', 'œ': 'oe', 'Œ': 'OE',
+    '‘': "'", '’': "'", '‚': "'", '′': "'", '`': "'",
+    '“': '"', '”': '"', '„': '"', '«': '"', '»': '"', '″': '"',
+    '–': '-', '—': '-', '−': '-', '•': '-',
+    '…': '...',
+    '\u00a0': ' ', '\u202f': ' ', '\u2009': ' ', '\u2007': ' ',
+}
+
+
+def get_config(channel_config=None):
+    """Réglages ``SMS_PLANNING``, surchargés par ``configuration['planning']`` du canal"""
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'SMS_PLANNING', {}))
+    if channel_config is not None:
+        overrides = (channel_config.configuration or {}).get('planning', {})
+        config.update({key.upper(): value for key, value in overrides.items()})
+    return config
+
+
+def is_gsm7(text):
+    return all(char in GSM7 for char in text)
+
+
+def detect_encoding(text):
+    return 'GSM-7' if is_gsm7(text) else 'UCS-2'
+
+
+def _transliterate_char(char):
+    if char in GSM7:
+        return char
+    if char in TRANSLITERATIONS:
+        return TRANSLITERATIONS[char]
+    # Lettre accentuée : retirer les diacritiques (ê -> e, Â -> A)
+    base = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+    if base and is_gsm7(base):
+        return base
+    return None
+
+
+def transliterate(text):
+    """Texte équivalent en GSM-7, ou ``None`` si un caractère n'a pas d'équivalent"""
+    parts = []
+    for char in text:
+        replacement = _transliterate_char(char)
+        if replacement is None:
+            return None
+        parts.append(replacement)
+    return ''.join(parts)
+
+
+def _units(text, encoding):
+    """Longueur de chaque caractère en septets (GSM-7) ou unités de 16 bits (UCS-2)"""
+    if encoding == 'GSM-7':
+        return [2 if char in GSM7_EXTENSION else 1 for char in text]
+    return [2 if ord(char) > 0xFFFF else 1 for char in text]
+
+
+def count_segments(text, encoding=None):
+    """Nombre de segments ; un caractère n'est jamais coupé entre deux segments"""
+    encoding = encoding or detect_encoding(text)
+    single, multi = (GSM7_SINGLE, GSM7_MULTI) if encoding == 'GSM-7' else (UCS2_SINGLE, UCS2_MULTI)
+    units = _units(text, encoding)
+    if sum(units) <= single:
+        return 1 if units else 0
+
+    segments, used = 1, 0
+    for size in units:
+        if used + size > multi:
+            segments += 1
+            used = 0
+        used += size
+    return segments
+
+
+class SMSPlan:
+    """Texte à envoyer, encodage, segments et coût estimé"""
+
+    def __init__(self, text, config=None):
+        config = config or get_config()
+        self.original_encoding = detect_encoding(text)
+        self.transliterated = False
+        if self.original_encoding == 'UCS-2' and config['TRANSLITERATE']:
+            converted = transliterate(text)
+            if converted is not None and count_segments(converted, 'GSM-7') <= count_segments(text, 'UCS-2'):
+                text = converted
+                self.transliterated = True
+
+        self.text = text
+        self.encoding = 'GSM-7' if self.transliterated else self.original_encoding
+        self.characters = len(text)
+        self.segments = count_segments(text, self.encoding)
+        self.cost = round(self.segments * float(config['COST_PER_SEGMENT']), 6)
+        self.currency = config['CURRENCY']
+
+    def as_metadata(self):
+        return {
+            'encoding': self.encoding,
+            'original_encoding': self.original_encoding,
+            'transliterated': self.transliterated,
+            'characters': self.characters,
+            'segments': self.segments,
+            'estimated_cost': self.cost,
+            'currency': self.currency,
+        }
+
+
+def plan_message(text, config=None):
+    return SMSPlan(text, config)
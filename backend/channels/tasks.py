@@ -0,0 +1,58 @@
+"""
+Tâches asynchrones des canaux de communication
+"""
+import logging
+
+from celery import shared_task
+
+from .circuit import CircuitOpen
+from .ratelimit import Throttled
+from .services import MessageService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def send_ticket_notifications(ticket_ids, template_type):
+    """Envoyer une notification pour un lot de tickets
+
+    Les tickets critiques (PSEA, priorité critique) passent en premier ; si le
+    débit du canal est atteint ou le fournisseur coupé, le reste du lot est
+    replanifié.
+    """
+    from tickets.models import Ticket
+
+    tickets = list(
+        Ticket.objects.filter(pk__in=ticket_ids).select_related(
+            'channel', 'category', 'priority', 'status'
+        ).order_by('-is_psea', '-priority__level', 'created_at')
+    )
+    sent = 0
+    for index, ticket in enumerate(tickets):
+        try:
+            if MessageService.send_ticket_notification(ticket, template_type, defer=False):
+                sent += 1
+        except (Throttled, CircuitOpen) as e:
+            remaining = [t.pk for t in tickets[index:]]
+            logger.info(f"{e} : {len(remaining)} notification(s) '{template_type}' replanifiée(s)")
+            MessageService.defer_ticket_notification(remaining, template_type, e.retry_after)
+            break
+        except Exception as e:
+            logger.error(f"Erreur de notification '{template_type}' pour le ticket {ticket.pk}: {e}")
+    return sent
+
+
+@shared_task
+def compact_webhook_events():
+    """Compacter les événements webhook traités (voir channels.retention)"""
+    from .retention import compact_events
+
+    return compact_events()
+
+
+@shared_task
+def process_inbound_events(event_ids=None):
+    """Convertir des messages entrants en tickets (sans liste : tous les événements en attente)"""
+    from .inbound import process_pending_events
+
+    return process_pending_events(event_ids)
@@ -0,0 +1,163 @@
+"""
+Registre des modèles de messages
+
+Les modèles actifs sont chargés en une requête et compilés une fois par
+processus, indexés par (type de canal, type de modèle, langue). Chaque modèle
+est découpé en segments (texte, variable) et ses variables sont vérifiées
+contre ``MessageTemplate.variables`` au chargement : un modèle invalide est
+écarté et signalé, au lieu d'échouer à l'envoi. Toute modification d'un modèle
+incrémente une version partagée (cache) qui provoque le rechargement dans
+chaque processus.
+"""
+import logging
+import string
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'channels:templates:version'
+# Délai entre deux lectures de la version partagée (secondes)
+CHECK_INTERVAL = 5
+
+_formatter = string.Formatter()
+
+
+class TemplateError(ValueError):
+    """Modèle de message invalide"""
+
+
+def default_language():
+    return settings.LANGUAGE_CODE.split('-')[0].lower()
+
+
+def normalize_language(language):
+    return (language or '').replace('_', '-').lower()
+
+
+class CompiledTemplate:
+    """Modèle pré-analysé, rendu sans nouvelle analyse du texte"""
+
+    def __init__(self, template):
+        self.template = template
+        self.subject = template.subject
+        self.segments = self._compile(template.content)
+        self.fields = {field for _, field, _, _ in self.segments if field is not None}
+        declared = set(template.variables or [])
+        undeclared = self.fields - declared
+        if declared and undeclared:
+            raise TemplateError(f"Variables non déclarées: {', '.join(sorted(undeclared))}")
+
+    @staticmethod
+    def _compile(content):
+        try:
+            segments = list(_formatter.parse(content))
+        except ValueError as e:
+            raise TemplateError(f"Syntaxe invalide: {e}")
+        for _, field, _, _ in segments:
+            if field is not None and not field.isidentifier():
+                raise TemplateError(f"Variable invalide: {{{field}}}")
+        return segments
+
+    def render(self, context):
+        missing = self.fields - context.keys()
+        if missing:
+            raise TemplateError(f"Variables manquantes: {', '.join(sorted(missing))}")
+        parts = []
+        for literal, field, spec, conversion in self.segments:
+            parts.append(literal)
+            if field is not None:
+                value = _formatter.convert_field(context[field], conversion)
+                parts.append(_formatter.format_field(value, spec or ''))
+        return ''.join(parts)
+
+
+class TemplateRegistry:
+    """Modèles compilés par (type de canal, type de modèle, langue)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def shared_version():
+        return cache.get(VERSION_KEY, 0)
+
+    @staticmethod
+    def bump_version():
+        """Invalider les registres de tous les processus"""
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = None
+
+    def reload(self):
+        """Invalider ce processus et les autres (via la version partagée)"""
+        self.bump_version()
+        self.invalidate()
+
+    def _load(self):
+        from .models import MessageTemplate
+
+        templates = {}
+        queryset = MessageTemplate.objects.filter(is_active=True).select_related('channel').order_by('name')
+        for template in queryset:
+            key = (template.channel.type, template.template_type, normalize_language(template.language))
+            if key in templates:
+                continue
+            try:
+                templates[key] = CompiledTemplate(template)
+            except TemplateError as e:
+                logger.error(f"Modèle de message '{template.name}' ignoré: {e}")
+        return templates
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._templates is not None and now - self._checked_at < CHECK_INTERVAL:
+            return self._templates
+
+        version = self.shared_version()
+        with self._lock:
+            if self._templates is None or version != self._version:
+                self._templates = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._templates
+
+    def get(self, channel_type, template_type, language=None):
+        """Modèle compilé ; repli sur la langue de base, la langue par défaut puis toute langue"""
+        templates = self._ensure_loaded()
+        language = normalize_language(language)
+        candidates = [language, language.split('-')[0], default_language()]
+        for candidate in candidates:
+            compiled = templates.get((channel_type, template_type, candidate))
+            if compiled is not None:
+                return compiled
+        for (ctype, ttype, _), compiled in sorted(templates.items()):
+            if ctype == channel_type and ttype == template_type:
+                return compiled
+        return None
+
+    def render(self, channel_type, template_type, context, language=None):
+        """Rendu ``(modèle, sujet, contenu)`` ou ``None`` si aucun modèle utilisable"""
+        compiled = self.get(channel_type, template_type, language)
+        if compiled is None:
+            return None
+        try:
+            content = compiled.render(context)
+        except (TemplateError, ValueError) as e:
+            logger.error(f"Rendu du modèle '{compiled.template.name}' impossible: {e}")
+            return None
+        return compiled.template, compiled.subject, content
+
+
+template_registry = TemplateRegistry()
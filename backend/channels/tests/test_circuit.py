@@ -0,0 +1,127 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from channels.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, get_breaker
+from channels.services import BaseChannelService
+from tickets.models import Channel
+
+CONFIG = {
+    'WINDOW_SECONDS': 60, 'MIN_CALLS': 4, 'FAILURE_RATE': 0.5,
+    'SLOW_CALL_SECONDS': 5, 'OPEN_SECONDS': 30, 'TIMEOUT': 10,
+}
+
+
+class ProviderError(Exception):
+    def __init__(self, status=None):
+        self.status = status
+        super().__init__(f'HTTP {status}')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = Clock()
+        patcher = mock.patch('channels.circuit.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', CONFIG)
+
+    def fail(self, breaker=None, status=None):
+        with self.assertRaises(ProviderError):
+            with (breaker or self.breaker).guard():
+                raise ProviderError(status)
+
+    def open(self):
+        for _ in range(CONFIG['MIN_CALLS']):
+            self.fail()
+        self.assertEqual(self.breaker.snapshot()['state'], OPEN)
+
+    def test_opens_after_failure_rate(self):
+        for _ in range(CONFIG['MIN_CALLS'] - 1):
+            self.fail()
+        self.assertEqual(self.breaker.snapshot()['state'], CLOSED)
+        self.fail()
+        self.assertEqual(self.breaker.snapshot()['state'], OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+
+    def test_request_errors_do_not_count(self):
+        for _ in range(CONFIG['MIN_CALLS']):
+            self.fail(status=400)
+        self.assertEqual(self.breaker.snapshot()['state'], CLOSED)
+        self.assertEqual(self.breaker.snapshot()['error_rate'], 0.0)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(CONFIG['MIN_CALLS']):
+            self.breaker.record(True, 6)
+        self.assertEqual(self.breaker.snapshot()['state'], OPEN)
+
+    def test_half_open_allows_one_trial(self):
+        self.open()
+        self.clock.now += CONFIG['OPEN_SECONDS']
+        self.breaker.allow(trial=False)
+        self.breaker.allow()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow()
+
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.snapshot()['state'], CLOSED)
+        self.breaker.allow()
+
+    def test_failed_trial_reopens(self):
+        self.open()
+        self.clock.now += CONFIG['OPEN_SECONDS']
+        self.fail()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.allow(trial=False)
+
+    def test_abandoned_trial_is_given_back(self):
+        self.open()
+        self.clock.now += CONFIG['OPEN_SECONDS']
+        self.breaker.allow()
+        self.clock.now += CONFIG['OPEN_SECONDS']
+        self.breaker.allow()
+
+    def test_open_state_is_shared(self):
+        self.open()
+        other = CircuitBreaker('test', CONFIG)
+        with self.assertRaises(CircuitOpen):
+            other.allow()
+
+
+@override_settings(CIRCUIT_BREAKER=CONFIG)
+class BeforeSendTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = Clock()
+        patcher = mock.patch('channels.circuit.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_half_open_refuses_concurrent_sends_before_sending(self):
+        service = BaseChannelService(Channel(pk=999, name='Email', type='email'))
+        breaker = get_breaker(service.circuit_name())
+        for _ in range(CONFIG['MIN_CALLS']):
+            breaker.record(False, 0.1, 'down')
+        self.clock.now += CONFIG['OPEN_SECONDS']
+
+        service.before_send()
+        self.assertEqual(breaker.snapshot()['state'], HALF_OPEN)
+        # Deuxième envoi concurrent : refusé avant la création du message
+        with self.assertRaises(CircuitOpen):
+            service.before_send()
+        breaker.record(True, 0.1)
+        service.before_send()
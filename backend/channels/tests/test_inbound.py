@@ -0,0 +1,109 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from channels.inbound import InboundMessage, InboundPipeline, get_config, normalize_phone, process_pending_events
+from channels.models import ChannelConfiguration, WebhookEvent
+from tickets.models import Category, Channel, Priority, Response, Status, Ticket
+
+
+class InboundPipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.channel = Channel.objects.create(name='SMS', type='sms')
+        Category.objects.create(name='Feedback')
+        Priority.objects.create(name='Moyenne', level=3, sla_hours=48)
+        Status.objects.create(name='Ouvert')
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone('whatsapp:+33 6 12 34 56 78'), '+33612345678')
+        self.assertEqual(normalize_phone(None), '')
+
+    def test_new_sender_creates_ticket(self):
+        result = InboundPipeline().process('sms', [
+            InboundMessage('+22370000001', "Bonjour, la distribution d'eau est interrompue", 'SM1', event_id=1),
+        ])
+
+        self.assertEqual(len(result['created']), 1)
+        self.assertEqual(result['threaded'], set())
+        ticket = Ticket.objects.get(pk=result['created'][0])
+        self.assertEqual(ticket.channel, self.channel)
+        self.assertEqual(ticket.submitter_phone, '+22370000001')
+        self.assertEqual(ticket.external_id, 'SM1')
+        self.assertEqual(result['events'], {1: ticket.pk})
+
+    def test_threaded_sender_adds_responses(self):
+        pipeline = InboundPipeline()
+        first = pipeline.process('sms', [InboundMessage('+22370000002', "Premier message du soumetteur", 'SM2')])
+        ticket_id = first['created'][0]
+
+        result = pipeline.process('sms', [
+            InboundMessage('+22370000002', "Deuxième message", 'SM3', event_id=3),
+            InboundMessage('+22370000002', "Deuxième message", 'SM3', event_id=4),
+        ])
+
+        self.assertEqual(result['created'], [])
+        self.assertEqual(result['threaded'], {ticket_id})
+        self.assertEqual(result['duplicates'], 1)
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(Response.objects.get(ticket_id=ticket_id).external_message_id, 'SM3')
+
+
+class PendingEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Channel.objects.create(name='SMS', type='sms')
+        Category.objects.create(name='Feedback')
+        Priority.objects.create(name='Moyenne', level=3, sla_hours=48)
+        Status.objects.create(name='Ouvert')
+        cls.configuration = ChannelConfiguration.objects.create(name='Twilio', type='sms')
+
+    def event(self, sender, sid):
+        return WebhookEvent.objects.create(
+            event_type='sms_received', channel=self.configuration,
+            payload={'From': sender, 'Body': 'Bonjour', 'MessageSid': sid},
+        )
+
+    def process(self, failing=()):
+        original = InboundPipeline.process
+
+        def process(pipeline, channel_type, messages):
+            if any(msg.sender in failing for msg in messages):
+                raise ValueError("message invalide")
+            return original(pipeline, channel_type, messages)
+
+        with mock.patch.object(InboundPipeline, 'process', process), \
+                self.captureOnCommitCallbacks(execute=False):
+            return process_pending_events()
+
+    def test_failing_sender_does_not_block_the_batch(self):
+        good, bad = self.event('+22370000001', 'SM1'), self.event('+22370000002', 'SM2')
+        self.assertEqual(self.process(failing={'+22370000002'}), 2)
+
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertTrue(good.processed)
+        self.assertIsNotNone(good.ticket_id)
+        self.assertFalse(bad.processed)
+        self.assertEqual((bad.attempts, bad.error_message), (1, 'message invalide'))
+        self.assertGreater(bad.retry_at, timezone.now())
+
+        # Retentée seulement une fois le délai écoulé
+        self.assertEqual(self.process(), 0)
+        WebhookEvent.objects.filter(pk=bad.pk).update(retry_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.process(), 1)
+        bad.refresh_from_db()
+        self.assertTrue(bad.processed)
+        self.assertEqual(bad.error_message, '')
+
+    def test_retries_are_bounded(self):
+        event = self.event('+22370000003', 'SM3')
+        for _ in range(get_config()['MAX_ATTEMPTS']):
+            WebhookEvent.objects.filter(pk=event.pk).update(retry_at=None)
+            self.assertEqual(self.process(failing={'+22370000003'}), 1)
+        WebhookEvent.objects.filter(pk=event.pk).update(retry_at=None)
+        self.assertEqual(self.process(), 0)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, get_config()['MAX_ATTEMPTS'])
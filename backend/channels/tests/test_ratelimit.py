@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from channels.ratelimit import MemoryBuckets, RateLimiter, Throttled
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('channels.ratelimit.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def limiter(self, rate=1, burst=5, reserve=0.0, max_wait=30):
+        return RateLimiter('test', rate, burst, reserve=reserve, max_wait=max_wait, backend=MemoryBuckets())
+
+    def test_burst_then_refill(self):
+        limiter = self.limiter(rate=2, burst=3)
+        for _ in range(3):
+            self.assertEqual(limiter.take(), (True, 0.0))
+        granted, wait = limiter.take()
+        self.assertFalse(granted)
+        self.assertAlmostEqual(wait, 0.5)
+
+        self.clock.now += 0.5
+        self.assertTrue(limiter.take()[0])
+
+    def test_reserve_is_kept_for_critical_messages(self):
+        limiter = self.limiter(burst=5, reserve=0.4)
+        self.assertTrue(limiter.take(3)[0])
+        # 2 jetons restants : la réserve de 2 est refusée au trafic courant
+        self.assertFalse(limiter.take(1)[0])
+        self.assertEqual(limiter.take(2, critical=True), (True, 0.0))
+
+    def test_acquire_waits_for_tokens(self):
+        limiter = self.limiter(burst=1)
+        limiter.acquire()
+        self.assertEqual(limiter.acquire(), 1.0)
+        self.assertEqual(self.clock.slept, [1.0])
+
+    def test_acquire_gives_up_after_max_wait(self):
+        limiter = self.limiter(burst=1, max_wait=0.5)
+        limiter.acquire()
+        with self.assertRaises(Throttled):
+            limiter.acquire()
+        self.assertEqual(self.clock.slept, [])
+
+    def test_critical_debt_is_capped_by_max_wait(self):
+        limiter = self.limiter(burst=1, max_wait=5)
+        for _ in range(20):
+            limiter.acquire(critical=True)
+        self.assertTrue(all(wait <= 5 for wait in self.clock.slept))
+
+    def test_non_blocking_never_sleeps(self):
+        limiter = self.limiter(burst=1)
+        limiter.acquire(block=False)
+        for critical in (False, True):
+            with self.assertRaises(Throttled) as raised:
+                limiter.acquire(critical=critical, block=False)
+            self.assertAlmostEqual(raised.exception.retry_after, 1.0)
+        self.assertEqual(self.clock.slept, [])
@@ -0,0 +1,51 @@
+from django.test import SimpleTestCase
+
+from channels import sms
+
+CONFIG = dict(sms.DEFAULTS, COST_PER_SEGMENT=0.05)
+
+
+class SegmentTests(SimpleTestCase):
+    def test_gsm7_limits(self):
+        self.assertEqual(sms.count_segments(''), 0)
+        self.assertEqual(sms.count_segments('a' * 160), 1)
+        self.assertEqual(sms.count_segments('a' * 161), 2)
+        self.assertEqual(sms.count_segments('a' * 306), 2)
+        self.assertEqual(sms.count_segments('a' * 307), 3)
+
+    def test_extension_characters_count_twice(self):
+        self.assertEqual(sms.count_segments('€' * 80), 1)
+        self.assertEqual(sms.count_segments('€' * 81), 2)
+        # Un caractère d'extension n'est pas coupé entre deux segments
+        self.assertEqual(sms.count_segments('a' * 152 + '€' + 'a' * 152), 3)
+
+    def test_ucs2_limits(self):
+        self.assertEqual(sms.detect_encoding('Ελληνικά ש'), 'UCS-2')
+        self.assertEqual(sms.count_segments('ש' * 70), 1)
+        self.assertEqual(sms.count_segments('ש' * 71), 2)
+        # Hors plan multilingue de base : deux unités de 16 bits
+        self.assertEqual(sms.count_segments('😀' * 35), 1)
+        self.assertEqual(sms.count_segments('😀' * 36), 2)
+
+
+class PlanTests(SimpleTestCase):
+    def test_transliterates_french(self):
+        plan = sms.plan_message('Votre demande est reçue – l’équipe vous répondra bientôt', CONFIG)
+        self.assertEqual(plan.original_encoding, 'UCS-2')
+        self.assertEqual(plan.encoding, 'GSM-7')
+        self.assertTrue(plan.transliterated)
+        # « é » fait partie de l'alphabet GSM-7, « ç » et « ô » non
+        self.assertEqual(plan.text, "Votre demande est recue - l'équipe vous répondra bientot")
+        self.assertEqual(plan.segments, 1)
+        self.assertEqual(plan.cost, 0.05)
+
+    def test_non_latin_text_is_kept(self):
+        text = 'Votre demande est enregistrée: شكرا'
+        plan = sms.plan_message(text, CONFIG)
+        self.assertEqual(plan.text, text)
+        self.assertEqual(plan.encoding, 'UCS-2')
+        self.assertFalse(plan.transliterated)
+
+    def test_transliteration_can_be_disabled(self):
+        plan = sms.plan_message('Reçu', dict(CONFIG, TRANSLITERATE=False))
+        self.assertEqual((plan.text, plan.encoding), ('Reçu', 'UCS-2'))
@@ -1,6 +1,9 @@
 """
 Vues pour l'API des canaux
 """
+import math
+import time
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -13,6 +16,7 @@ from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
+from django.db.models import Q
 
 from .models import (
     ChannelConfiguration, MessageTemplate, Message, 
@@ -22,7 +26,22 @@ from .serializers import (
     ChannelConfigurationSerializer, MessageTemplateSerializer,
     MessageSerializer, WebhookEventSerializer, ChannelStatsSerializer
 )
+from .retention import webhook_headers
 from .services import MessageService, ChannelServiceFactory
+from .circuit import CircuitOpen
+from .ratelimit import Throttled, channel_rate
+from .sms import get_config as get_sms_config, plan_message as plan_sms
+from users.visibility import get_rules, ticket_predicate
+
+
+def throttled_response(exc):
+    """Réponse 429 (débit d'envoi atteint) ou 503 (fournisseur coupé)"""
+    return Response(
+        {'error': str(exc)},
+        status=(status.HTTP_503_SERVICE_UNAVAILABLE if isinstance(exc, CircuitOpen)
+                else status.HTTP_429_TOO_MANY_REQUESTS),
+        headers={'Retry-After': str(max(1, math.ceil(exc.retry_after)))}
+    )
 
 
 class ChannelConfigurationViewSet(viewsets.ModelViewSet):
@@ -33,18 +52,72 @@ class ChannelConfigurationViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def test_connection(self, request, pk=None):
-        """Tester la connexion d'un canal"""
+        """Tester la connexion d'un canal (appel réel au fournisseur) et son état de santé"""
         channel = self.get_object()
         try:
             service = ChannelServiceFactory.get_service(channel)
-            # Implémenter le test de connexion selon le type de canal
-            return Response({'status': 'Connexion réussie'})
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        started = time.monotonic()
+        try:
+            details = service.check_connection()
+        except CircuitOpen as e:
+            return Response(
+                {'error': str(e), 'health': service.circuit.snapshot()},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(max(1, math.ceil(e.retry_after)))}
+            )
         except Exception as e:
             return Response(
-                {'error': f'Erreur de connexion: {str(e)}'}, 
+                {'error': f'Erreur de connexion: {str(e)}', 'health': service.circuit.snapshot()}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response({
+            'status': 'Connexion réussie',
+            'latency_ms': round((time.monotonic() - started) * 1000, 1),
+            'details': details,
+            'health': service.circuit.snapshot(),
+        })
     
+    @action(detail=False, methods=['get'])
+    def health(self, request):
+        """État des disjoncteurs des canaux actifs (sans appel aux fournisseurs)"""
+        health = []
+        for channel in self.get_queryset().filter(is_active=True):
+            try:
+                service = ChannelServiceFactory.get_service(channel)
+            except ValueError:
+                continue
+            health.append({'channel': channel.pk, 'type': channel.type, **service.circuit.snapshot()})
+        return Response(health)
+    
+    @action(detail=True, methods=['post'])
+    def plan_message(self, request, pk=None):
+        """Estimer segments, coût et durée d'envoi d'un SMS pour N destinataires"""
+        channel = self.get_object()
+        content = request.data.get('content', '')
+        try:
+            recipients = max(1, int(request.data.get('recipients', 1)))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Nombre de destinataires invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        plan = plan_sms(content, get_sms_config(channel))
+        segments = plan.segments * recipients
+        mps, _ = channel_rate(channel)
+        return Response({
+            **plan.as_metadata(),
+            'text': plan.text,
+            'recipients': recipients,
+            'total_segments': segments,
+            'total_cost': round(plan.cost * recipients, 6),
+            'mps': mps,
+            'estimated_duration_seconds': round(segments / mps, 1) if mps > 0 else None,
+        })
+
     @action(detail=True, methods=['post'])
     def send_test_message(self, request, pk=None):
         """Envoyer un message de test"""
@@ -60,7 +133,7 @@ class ChannelConfigurationViewSet(viewsets.ModelViewSet):
         
         try:
             service = ChannelServiceFactory.get_service(channel)
-            message = service.send_message(recipient, content)
+            message = service.send_message(recipient, content, block=False)
             
             if message:
                 return Response({
@@ -72,6 +145,8 @@ class ChannelConfigurationViewSet(viewsets.ModelViewSet):
                     {'error': 'Échec de l\'envoi'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        except (Throttled, CircuitOpen) as e:
+            return throttled_response(e)
         except Exception as e:
             return Response(
                 {'error': f'Erreur d\'envoi: {str(e)}'}, 
@@ -98,6 +173,13 @@ class MessageViewSet(viewsets.ModelViewSet):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        predicate = ticket_predicate(get_rules(self.request.user), prefix='ticket__')
+        if predicate is None:
+            return queryset
+        return queryset.filter(Q(ticket__isnull=True) | predicate)
     
     @action(detail=True, methods=['post'])
     def resend(self, request, pk=None):
@@ -112,7 +194,8 @@ class MessageViewSet(viewsets.ModelViewSet):
                 subject=message.subject,
                 template=message.template,
                 ticket=message.ticket,
-                response=message.response
+                response=message.response,
+                block=False
             )
             
             if new_message:
@@ -125,6 +208,8 @@ class MessageViewSet(viewsets.ModelViewSet):
                     {'error': 'Échec du renvoi'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        except (Throttled, CircuitOpen) as e:
+            return throttled_response(e)
         except Exception as e:
             return Response(
                 {'error': f'Erreur de renvoi: {str(e)}'}, 
@@ -214,7 +299,7 @@ class SMSWebhookView(APIView):
             service = ChannelServiceFactory.get_service(sms_channel)
             webhook_event = service.process_webhook(
                 payload=request.data,
-                headers=dict(request.headers)
+                headers=webhook_headers(request)
             )
             
             return JsonResponse({'status': 'success', 'event_id': str(webhook_event.id)})
@@ -250,7 +335,7 @@ class WhatsAppWebhookView(APIView):
             service = ChannelServiceFactory.get_service(whatsapp_channel)
             webhook_event = service.process_webhook(
                 payload=request.data,
-                headers=dict(request.headers)
+                headers=webhook_headers(request)
             )
             
             return JsonResponse({'status': 'success', 'event_id': str(webhook_event.id)})
@@ -279,7 +364,7 @@ class EmailWebhookView(APIView):
             service = ChannelServiceFactory.get_service(email_channel)
             webhook_event = service.process_webhook(
                 payload=request.data,
-                headers=dict(request.headers)
+                headers=webhook_headers(request)
             )
             
             return JsonResponse({'status': 'success', 'event_id': str(webhook_event.id)})
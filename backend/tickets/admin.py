@@ -5,7 +5,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
     Category, Priority, Status, Channel, Ticket, 
-    Response, TicketLog, Feedback
+    Response, TicketLog, Feedback, Attachment
 )
 
 
@@ -69,6 +69,14 @@ class TicketLogInline(admin.TabularInline):
     readonly_fields = ['created_at', 'action', 'user', 'description']
 
 
+class AttachmentInline(admin.TabularInline):
+    model = Attachment
+    extra = 0
+    fields = ['name', 'content_type', 'size', 'status', 'sha256', 'created_at']
+    readonly_fields = ['name', 'content_type', 'size', 'status', 'sha256', 'created_at']
+    can_delete = False
+
+
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
     list_display = [
@@ -81,7 +89,7 @@ class TicketAdmin(admin.ModelAdmin):
     ]
     search_fields = ['id', 'title', 'content', 'submitter_name', 'submitter_phone', 'submitter_email']
     readonly_fields = ['id', 'created_at', 'updated_at', 'closed_at', 'days_since_creation']
-    inlines = [ResponseInline, TicketLogInline]
+    inlines = [ResponseInline, TicketLogInline, AttachmentInline]
     
     fieldsets = (
         ('Informations générales', {
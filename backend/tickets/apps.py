@@ -5,3 +5,6 @@ class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
     verbose_name = 'Tickets de Feedback'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,302 @@
+"""
+Assignation automatique des tickets à l'agent le moins chargé
+
+Les agents éligibles sont les utilisateurs actifs dont le rôle permet de
+traiter des tickets (``ASSIGNEE_PERMISSIONS``) ; un ticket PSEA n'est confié
+qu'à un rôle habilité PSEA, un ticket d'une organisation qu'à ses agents, et
+l'agent qui parle la langue du soumetteur est préféré. La demande
+d'assignation automatique est réservée aux rôles ``can_assign``.
+
+Chaque processus garde, par groupe d'agents éligibles, un tas binaire
+``(charge, ordre, agent)`` : l'agent le moins chargé est trouvé et sa charge
+mise à jour en O(log n). Les charges viennent des compteurs partagés de
+``workload`` : quand leur version change (un ticket a été assigné ou clos),
+seuls les agents concernés sont relus et remis à jour dans les tas ; les tas
+ne sont reconstruits que si les agents changent ou si la liste des
+changements n'est plus disponible.
+"""
+import heapq
+import itertools
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import read_model, workload
+from .audit import ticket_audit
+from .models import Ticket
+from .workflow import WorkflowError, apply_transition
+
+DEFAULTS = {
+    # Permissions de rôle qui rendent un utilisateur assignable
+    'ASSIGNEE_PERMISSIONS': ['edit_tickets', 'all'],
+    # Au-delà, l'agent ne reçoit plus de ticket (None : pas de plafond)
+    'MAX_OPEN_TICKETS': None,
+    'MATCH_LANGUAGE': True,
+    # Aucun agent ne parle la langue : assigner quand même
+    'LANGUAGE_FALLBACK': True,
+    # Aucun agent dans l'organisation du ticket : chercher hors organisation
+    'ORGANIZATION_FALLBACK': False,
+    'BATCH_SIZE': 500,
+}
+
+AGENTS_VERSION_KEY = 'tickets:assignment:agents-version'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TICKET_ASSIGNMENT', {}))
+    return config
+
+
+class NoEligibleAgent(WorkflowError):
+    """Aucun agent éligible n'est disponible pour le ticket"""
+
+
+def can_request(user):
+    """L'utilisateur peut-il demander une assignation automatique ?"""
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+    return user.role_id is not None and user.role.can_assign
+
+
+def base_language(language):
+    return (language or '').split('-')[0].split('_')[0].lower() or None
+
+
+def ticket_profile(ticket):
+    """Critères d'éligibilité d'un ticket : ``(psea, organisation, langue)``"""
+    organization_id = ticket.created_by.organization_id if ticket.created_by_id else None
+    return ticket.is_psea, organization_id, base_language((ticket.metadata or {}).get('language'))
+
+
+class Agent:
+    __slots__ = ('pk', 'organization_id', 'language', 'psea')
+
+    def __init__(self, user):
+        self.pk = str(user.pk)
+        self.organization_id = user.organization_id
+        self.language = base_language(user.language)
+        self.psea = user.role.is_psea_authorized
+
+
+class LoadHeap:
+    """Tas des agents par charge croissante, avec suppression paresseuse
+
+    Une mise à jour empile une nouvelle entrée ; les entrées dont la charge ne
+    correspond plus sont écartées au sommet. À charge égale, l'agent servi le
+    moins récemment passe en premier.
+    """
+
+    def __init__(self, loads):
+        self.loads = dict(loads)
+        self._order = itertools.count()
+        self._heap = [(load, next(self._order), user_id) for user_id, load in self.loads.items()]
+        heapq.heapify(self._heap)
+
+    def __contains__(self, user_id):
+        return user_id in self.loads
+
+    def peek(self):
+        """``(agent, charge)`` le moins chargé, ou ``None``"""
+        while self._heap:
+            load, _, user_id = self._heap[0]
+            if self.loads.get(user_id) == load:
+                return user_id, load
+            heapq.heappop(self._heap)
+        return None
+
+    def add(self, user_id, delta=1):
+        self.set(user_id, self.loads[user_id] + delta)
+
+    def set(self, user_id, load):
+        load = self.loads[user_id] = max(load, 0)
+        heapq.heappush(self._heap, (load, next(self._order), user_id))
+        if len(self._heap) > 4 * len(self.loads) + 64:
+            self._heap = [(load, next(self._order), pk) for pk, load in self.loads.items()]
+            heapq.heapify(self._heap)
+
+
+class AssignmentEngine:
+    """Choix de l'agent le moins chargé, un tas par groupe d'éligibilité"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents = None
+        self._agents_version = None
+        self._heaps = {}
+        self._load_version = None
+
+    @staticmethod
+    def bump_agents_version():
+        try:
+            cache.incr(AGENTS_VERSION_KEY)
+        except ValueError:
+            cache.set(AGENTS_VERSION_KEY, 1, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._heaps = {}
+            self._load_version = None
+
+    def _sync(self, config):
+        agents_version = cache.get(AGENTS_VERSION_KEY, 0)
+        if self._agents is None or agents_version != self._agents_version:
+            permissions = set(config['ASSIGNEE_PERMISSIONS'])
+            users = get_user_model().objects.filter(is_active=True, role__isnull=False).select_related('role')
+            self._agents = [Agent(user) for user in users if permissions & set(user.role.permissions)]
+            self._agents_version = agents_version
+            self._heaps = {}
+
+        load_version = workload.version()
+        if load_version != self._load_version:
+            changed = workload.changed_since(self._load_version, load_version) if self._heaps else None
+            if changed is None:
+                self._heaps = {}
+            elif changed:
+                # Relire seulement les agents modifiés : O(k log n)
+                agents = {agent.pk for agent in self._agents}
+                for user_id, load in workload.loads(changed & agents).items():
+                    for heap in self._heaps.values():
+                        if user_id in heap:
+                            heap.set(user_id, load)
+            self._load_version = load_version
+
+    def pool(self, psea, organization_id, language, config):
+        """Agents éligibles pour un profil de ticket"""
+        agents = self._agents
+        if psea:
+            agents = [agent for agent in agents if agent.psea]
+        if organization_id is not None:
+            members = [agent for agent in agents if agent.organization_id == organization_id]
+            agents = members or (agents if config['ORGANIZATION_FALLBACK'] else [])
+        if language and config['MATCH_LANGUAGE']:
+            speakers = [agent for agent in agents if agent.language == language]
+            agents = speakers or (agents if config['LANGUAGE_FALLBACK'] else [])
+        return agents
+
+    def _heap(self, profile, config):
+        heap = self._heaps.get(profile)
+        if heap is None:
+            agents = self.pool(*profile, config)
+            heap = self._heaps[profile] = LoadHeap(workload.loads([agent.pk for agent in agents]))
+        return heap
+
+    def pick(self, profile, config=None):
+        """Réserver l'agent le moins chargé pour ``profile`` ; retourne son id ou ``None``"""
+        config = config or get_config()
+        with self._lock:
+            self._sync(config)
+            best = self._heap(profile, config).peek()
+            if best is None:
+                return None
+            user_id, load = best
+            if config['MAX_OPEN_TICKETS'] is not None and load >= config['MAX_OPEN_TICKETS']:
+                return None
+            self._add(user_id, 1)
+            return user_id
+
+    def release(self, user_id):
+        """Annuler une réservation dont l'assignation a échoué"""
+        with self._lock:
+            self._add(user_id, -1)
+
+    def _add(self, user_id, delta):
+        # L'agent figure dans plusieurs groupes : tous ses tas suivent
+        for heap in self._heaps.values():
+            if user_id in heap:
+                heap.add(user_id, delta)
+
+    def loads(self):
+        """``{agent: charge}`` des agents assignables"""
+        with self._lock:
+            self._sync(get_config())
+            return workload.loads([agent.pk for agent in self._agents])
+
+
+engine = AssignmentEngine()
+
+
+def auto_assign(ticket, request=None):
+    """Assigner un ticket à l'agent éligible le moins chargé ; retourne l'agent"""
+    if ticket.assigned_to_id is not None:
+        raise NoEligibleAgent("Le ticket est déjà assigné")
+    user_id = engine.pick(ticket_profile(ticket))
+    if user_id is None:
+        raise NoEligibleAgent("Aucun agent disponible pour ce ticket")
+
+    assignee = get_user_model().objects.get(pk=user_id)
+    try:
+        apply_transition(ticket, 'assign', request=request, assignee=assignee)
+    except Exception:
+        engine.release(user_id)
+        raise
+    return assignee
+
+
+def assign_backlog(queryset, request=None, limit=None, batch_size=None):
+    """Répartir les tickets ouverts non assignés entre les agents les moins chargés
+
+    Les tickets sont traités par lots (PSEA puis priorité décroissante, puis
+    ancienneté), verrouillés sans attendre les lignes déjà prises : un ``UPDATE``
+    par agent et par lot, journaux en ``bulk_create``. Retourne
+    ``{'assigned', 'unassigned', 'agents': {agent: nombre}}``.
+    """
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    queryset = queryset.filter(assigned_to__isnull=True, status__is_final=False)
+    stats = {'assigned': 0, 'unassigned': 0, 'agents': {}}
+    skipped = set()
+    while limit is None or stats['assigned'] + stats['unassigned'] < limit:
+        size = batch_size if limit is None else min(batch_size, limit - stats['assigned'] - stats['unassigned'])
+        try:
+            assigned, unassigned = _assign_batch(queryset.exclude(pk__in=skipped), size, request, stats)
+        except Exception:
+            # Réservations non validées : repartir des compteurs partagés
+            engine.invalidate()
+            raise
+        stats['assigned'] += assigned
+        stats['unassigned'] += len(unassigned)
+        skipped.update(unassigned)
+        if not assigned and not unassigned:
+            break
+    return stats
+
+
+def _assign_batch(queryset, size, request, stats):
+    config = get_config()
+    now = timezone.now()
+    with transaction.atomic(), ticket_audit(request) as audit:
+        rows = list(
+            queryset.select_for_update(of=('self',), skip_locked=True).order_by(
+                '-is_psea', '-priority__level', 'created_at'
+            ).values('pk', 'is_psea', 'created_by__organization_id', 'metadata')[:size]
+        )
+        by_agent, unassigned = {}, []
+        for row in rows:
+            profile = (
+                row['is_psea'], row['created_by__organization_id'],
+                base_language((row['metadata'] or {}).get('language')),
+            )
+            user_id = engine.pick(profile, config)
+            if user_id is None:
+                unassigned.append(row['pk'])
+            else:
+                by_agent.setdefault(user_id, []).append(row['pk'])
+
+        users = {str(pk): user for pk, user in get_user_model().objects.in_bulk(list(by_agent)).items()}
+        assigned = []
+        for user_id, ids in by_agent.items():
+            assignee = users[user_id]
+            Ticket.objects.filter(pk__in=ids).update(assigned_to=assignee, updated_at=now)
+            for pk in ids:
+                audit.add(pk, 'assigned', f"Ticket assigné automatiquement à {assignee.get_full_name()}",
+                          new_value=str(assignee))
+            stats['agents'][user_id] = stats['agents'].get(user_id, 0) + len(ids)
+            assigned.extend(ids)
+        read_model.schedule_refresh(assigned)
+    return len(assigned), unassigned
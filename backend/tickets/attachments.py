@@ -0,0 +1,286 @@
+"""
+Stockage et traitement des pièces jointes
+
+Les fichiers reçus sont lus par blocs (``File.chunks``) pour calculer leur
+empreinte SHA-256 puis stockés à un chemin dérivé de cette empreinte : un même
+contenu envoyé plusieurs fois n'est écrit qu'une fois. Les miniatures et
+métadonnées d'image sont produites en arrière-plan (``tickets.tasks``) avec
+Pillow, après validation de la transaction.
+
+Le stockage n'est pas transactionnel : les fichiers écrits dans un bloc
+``discard_on_rollback`` qui échoue sont supprimés s'ils ne sont référencés par
+aucune pièce jointe ni aucun envoi.
+"""
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import read_model
+from .models import Attachment, Upload
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+STORAGE_PREFIX = 'attachments'
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 80
+# Pièce jointe encore « pending » après ce délai : planification perdue
+STALE_DELAY = timedelta(minutes=10)
+
+# Balises EXIF conservées dans les métadonnées (identifiant -> nom)
+EXIF_TAGS = {
+    0x010F: 'make',
+    0x0110: 'model',
+    0x0112: 'orientation',
+    0x0132: 'datetime',
+}
+EXIF_GPS_IFD = 0x8825
+
+
+def content_path(digest, name):
+    """Chemin de stockage dérivé de l'empreinte (``attachments/ab/cd/<sha><ext>``)"""
+    ext = os.path.splitext(name)[1].lower()[:10]
+    return f"{STORAGE_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def thumbnail_path(digest):
+    return f"{STORAGE_PREFIX}/thumbnails/{digest[:2]}/{digest}.jpg"
+
+
+def hash_file(f):
+    """Empreinte SHA-256 et taille d'un fichier, lu par blocs"""
+    sha = hashlib.sha256()
+    size = 0
+    for chunk in f.chunks():
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size
+
+
+def store_file(f, name=None):
+    """Stocker un fichier par empreinte ; retourne ``(sha256, chemin, taille)``
+
+    Le fichier n'est pas réécrit si le même contenu est déjà stocké.
+    """
+    name = name or f.name
+    digest, size = hash_file(f)
+    path = content_path(digest, name)
+    if not default_storage.exists(path):
+        # ``save`` relit le fichier par blocs depuis le début
+        path = default_storage.save(path, f)
+        written = getattr(_local, 'written', None)
+        if written is not None:
+            written.append(path)
+    return digest, path, size
+
+
+@contextmanager
+def discard_on_rollback():
+    """Supprimer les fichiers écrits dans le bloc si celui-ci lève une exception
+
+    À placer autour du ``transaction.atomic()`` : la suppression a lieu après
+    l'annulation. Un bloc imbriqué qui réussit confie ses fichiers au bloc
+    englobant.
+    """
+    outer = getattr(_local, 'written', None)
+    written = _local.written = []
+    try:
+        yield
+    except BaseException:
+        _local.written = outer
+        _discard(written)
+        raise
+    _local.written = outer
+    if outer is not None:
+        outer.extend(written)
+
+
+def _discard(paths):
+    for path in paths:
+        try:
+            # Même contenu rattaché entre-temps par une autre transaction
+            if Attachment.objects.filter(path=path).exists() or Upload.objects.filter(path=path).exists():
+                continue
+            default_storage.delete(path)
+        except Exception as e:
+            logger.warning(f"Fichier orphelin non supprimé {path}: {e}")
+
+
+def guess_content_type(f, name):
+    content_type = getattr(f, 'content_type', None)
+    if not content_type:
+        content_type, _ = mimetypes.guess_type(name)
+    return (content_type or 'application/octet-stream')[:100]
+
+
+def attach_files(ticket, files, user=None):
+    """Stocker les fichiers envoyés et créer les pièces jointes du ticket"""
+    stored = []
+    for f in files:
+        name = os.path.basename(f.name)
+        stored.append((name, guess_content_type(f, name), *store_file(f, name)))
+    return create_attachments(ticket, stored, user=user)
+
+
+def create_attachments(ticket, stored, user=None):
+    """Créer les pièces jointes de fichiers déjà stockés
+
+    ``stored`` : tuples ``(nom, type, sha256, chemin, taille)``. Le traitement
+    (miniature, métadonnées) est mis en file après validation.
+    """
+    attachments = [
+        Attachment(
+            ticket=ticket,
+            name=name[:255],
+            sha256=digest,
+            path=path,
+            size=size,
+            content_type=content_type,
+            uploaded_by=user,
+        )
+        for name, content_type, digest, path, size in stored
+    ]
+    if not attachments:
+        return []
+
+    Attachment.objects.bulk_create(attachments)
+    # ``bulk_create`` ne déclenche pas post_save : compteur du ticket
+    read_model.schedule_refresh([ticket.pk])
+    enqueue_processing([attachment.pk for attachment in attachments])
+    return attachments
+
+
+def enqueue_processing(attachment_ids):
+    from .tasks import process_attachments
+
+    ids = [str(pk) for pk in attachment_ids]
+
+    def enqueue():
+        try:
+            process_attachments.delay(ids)
+        except Exception as e:
+            # Les pièces jointes restent « pending » : rattrapées par « stale_pending_ids »
+            logger.warning(f"Traitement des pièces jointes non planifié: {e}")
+
+    transaction.on_commit(enqueue)
+
+
+def _is_image(attachment):
+    return attachment.content_type.startswith('image/')
+
+
+def _exif_metadata(image):
+    try:
+        exif = image.getexif()
+    except Exception:
+        return {}
+    metadata = {
+        label: str(exif[tag])[:100]
+        for tag, label in EXIF_TAGS.items()
+        if tag in exif
+    }
+    if EXIF_GPS_IFD in exif:
+        metadata['has_gps'] = True
+    return metadata
+
+
+def _render_thumbnail(image):
+    from PIL import ImageOps
+
+    thumbnail = ImageOps.exif_transpose(image)
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    if thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('RGB')
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def process_attachment(attachment):
+    """Extraire les métadonnées et produire la miniature d'une pièce jointe"""
+    from PIL import Image
+
+    # Contenu déjà traité pour une autre pièce jointe : réutiliser le résultat
+    done = Attachment.objects.filter(
+        sha256=attachment.sha256, status='processed'
+    ).exclude(pk=attachment.pk).first()
+
+    if done is not None:
+        attachment.thumbnail_path = done.thumbnail_path
+        attachment.width = done.width
+        attachment.height = done.height
+        attachment.metadata = done.metadata
+    elif _is_image(attachment):
+        with default_storage.open(attachment.path, 'rb') as f:
+            with Image.open(f) as image:
+                attachment.width, attachment.height = image.size
+                attachment.metadata = {
+                    'format': image.format,
+                    'mode': image.mode,
+                    **_exif_metadata(image),
+                }
+                path = thumbnail_path(attachment.sha256)
+                if not default_storage.exists(path):
+                    path = default_storage.save(path, _render_thumbnail(image))
+                attachment.thumbnail_path = path
+
+    attachment.status = 'processed'
+    attachment.processed_at = timezone.now()
+    attachment.save(update_fields=[
+        'thumbnail_path', 'width', 'height', 'metadata', 'status', 'processed_at'
+    ])
+    return attachment
+
+
+def process_pending(attachment_ids):
+    """Traiter un lot de pièces jointes en attente ; retourne le nombre traité"""
+    processed = 0
+    for attachment in Attachment.objects.filter(pk__in=attachment_ids, status='pending'):
+        try:
+            process_attachment(attachment)
+            processed += 1
+        except Exception as e:
+            logger.error(f"Erreur de traitement de la pièce jointe {attachment.pk}: {e}")
+            Attachment.objects.filter(pk=attachment.pk).update(
+                status='failed', processed_at=timezone.now(),
+                metadata={'error': str(e)[:200]}
+            )
+    return processed
+
+
+def stale_pending_ids(now=None, limit=500):
+    """Pièces jointes toujours en attente après ``STALE_DELAY``"""
+    now = now or timezone.now()
+    return [
+        str(pk) for pk in Attachment.objects.filter(
+            status='pending', created_at__lt=now - STALE_DELAY
+        ).order_by('created_at').values_list('pk', flat=True)[:limit]
+    ]
+
+
+def serialize_attachment(attachment):
+    """Représentation d'une pièce jointe (compatible avec l'ancien format JSON)"""
+    return {
+        'id': str(attachment.pk),
+        'name': attachment.name,
+        'path': attachment.path,
+        'url': default_storage.url(attachment.path),
+        'size': attachment.size,
+        'content_type': attachment.content_type,
+        'sha256': attachment.sha256,
+        'status': attachment.status,
+        'thumbnail_url': default_storage.url(attachment.thumbnail_path) if attachment.thumbnail_path else None,
+        'width': attachment.width,
+        'height': attachment.height,
+    }
@@ -0,0 +1,95 @@
+"""
+Écriture groupée du journal des tickets (TicketLog)
+
+Les entrées de journal produites pendant une requête ou une transaction sont
+accumulées puis écrites en un seul ``bulk_create`` au ``transaction.on_commit``.
+Aucune entrée n'est écrite pour une transaction annulée.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .models import TicketLog
+
+_local = threading.local()
+
+
+def _stack():
+    if not hasattr(_local, 'batches'):
+        _local.batches = []
+    return _local.batches
+
+
+def request_context(request):
+    """Utilisateur et adresse IP à associer aux entrées d'une requête"""
+    if request is None:
+        return None, None
+    user = request.user if request.user.is_authenticated else None
+    return user, request.META.get('REMOTE_ADDR')
+
+
+class AuditBatch:
+    """Lot d'entrées de journal partageant le même contexte utilisateur/IP"""
+
+    def __init__(self, user=None, ip_address=None, depth=0):
+        self.user = user
+        self.ip_address = ip_address
+        # Blocs ``atomic`` ouverts à l'entrée du lot
+        self.depth = depth
+        self.entries = []
+
+    def add(self, ticket, action, description, old_value='', new_value='', user=None, ip_address=None):
+        """Ajouter une entrée (``ticket`` : instance ou clé primaire)"""
+        self.entries.append(TicketLog(
+            ticket_id=getattr(ticket, 'pk', ticket),
+            action=action,
+            user=user or self.user,
+            description=description,
+            old_value=old_value,
+            new_value=new_value,
+            ip_address=ip_address or self.ip_address,
+        ))
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        if entries:
+            TicketLog.objects.bulk_create(entries)
+
+
+@contextmanager
+def ticket_audit(request=None):
+    """Regrouper les entrées de journal du bloc et les écrire à la validation
+
+    Un bloc imbriqué est fusionné dans le bloc englobant s'il s'exécute dans
+    la même transaction ; ouvert dans un point de sauvegarde (``atomic``
+    imbriqué), il est écrit à part à la validation, et abandonné si ce point
+    de sauvegarde est annulé. En cas d'exception, les entrées du bloc sont
+    abandonnées.
+    """
+    stack = _stack()
+    if request is None and stack:
+        user, ip_address = stack[-1].user, stack[-1].ip_address
+    else:
+        user, ip_address = request_context(request)
+    depth = len(transaction.get_connection().atomic_blocks)
+    batch = AuditBatch(user=user, ip_address=ip_address, depth=depth)
+    stack.append(batch)
+    try:
+        yield batch
+    finally:
+        stack.pop()
+
+    if not batch.entries:
+        return
+    if stack and stack[-1].depth == depth:
+        stack[-1].entries.extend(batch.entries)
+    else:
+        # Rappel retiré par Django si le point de sauvegarde est annulé
+        transaction.on_commit(batch.flush)
+
+
+def log_ticket_action(ticket, action, description, request=None, old_value='', new_value='', user=None):
+    """Ajouter une entrée au lot courant (ou à un lot d'une entrée hors bloc)"""
+    with ticket_audit(request) as batch:
+        batch.add(ticket, action, description, old_value=old_value, new_value=new_value, user=user)
@@ -0,0 +1,557 @@
+"""
+Classification automatique des tickets (catégorie, priorité, PSEA)
+
+Les vocabulaires français et anglais de chaque catégorie et les termes de
+priorité sont compilés une fois par processus en un automate d'Aho-Corasick :
+le texte du ticket, replié (minuscules, sans accents, ponctuation remplacée
+par des espaces), est parcouru une seule fois quel que soit le nombre de
+termes. Les termes sont bornés par des espaces, donc reconnus comme mots
+entiers ; un terme terminé par ``*`` est un préfixe (``harcel*``). Les entrées
+``re:…`` sont des expressions régulières appliquées au texte replié.
+
+Le vocabulaire d'une catégorie est ``Category.keywords`` complété par
+``VOCABULARY`` (par nom de catégorie). Un terme d'une catégorie sensible
+l'emporte sur toute autre catégorie : le ticket est marqué PSEA, passe en
+priorité critique et est escaladé immédiatement vers le contact de la
+catégorie. Toute modification d'une catégorie ou d'une priorité incrémente une
+version partagée (cache) qui provoque la recompilation dans chaque processus.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import read_model
+from .audit import ticket_audit
+from .models import Category, Priority, Ticket
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'tickets:classification:version'
+# Délai entre deux lectures de la version partagée (secondes)
+CHECK_INTERVAL = 5
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SCORE': 1,
+    'DEFAULT_CATEGORY': 'Information',
+    'DEFAULT_PRIORITY_LEVEL': 3,
+    'PSEA_PRIORITY_LEVEL': 5,
+    # Contact d'escalade PSEA si la catégorie sensible n'en a pas
+    'PSEA_CONTACT': '',
+    'BATCH_SIZE': 1000,
+    # Vocabulaire par nom de catégorie (l'ordre départage les égalités)
+    'VOCABULARY': {
+        'PSEA': [
+            'abus sexuel', 'abus sexuels', 'exploitation sexuelle', 'agression sexuelle',
+            'harcel*', 'viol', 'violee', 'violer', 'attouchement*', 'faveurs sexuelles',
+            'sexe contre', 'relations sexuelles', 'psea', 'peas',
+            'sexual abuse', 'sexual exploitation', 'sexual assault', 'sexual favours',
+            'sexual favors', 'harass*', 'rape', 'raped', 'sex for', 'sexually',
+        ],
+        'Complaint': [
+            'plainte*', 'reclamation*', 'probleme*', 'difficile*', 'mecontent*', 'pas recu',
+            'jamais recu', 'refuse*', 'injuste*', 'corruption', 'fraude', 'detourne*', 'retard*',
+            'complain*', 'problem*', 'issue*', 'not received', 'never received', 'unfair',
+            'fraud', 'dissatisfied', 'delay*',
+        ],
+        'Request': [
+            'aide', 'aider', 'besoin*', 'demande*', 'demander', 'svp', 's il vous plait',
+            'comment obtenir', 'inscri*',
+            'help', 'need*', 'request*', 'please', 'how can i', 'apply', 'register*',
+        ],
+        'Feedback': [
+            'merci', 'excellent*', 'parfait*', 'satisfait*', 'bravo', 'felicit*',
+            'bon travail', 'suggestion*', 'suggere*',
+            'thank*', 'great', 'perfect', 'satisfied', 'well done', 'good job', 'suggest*',
+        ],
+        'Information': [
+            'information*', 'renseignement*', 'quand', 'ou se trouve', 'horaire*', 'question*',
+            'info', 'when', 'where', 'what time', 'schedule*',
+        ],
+    },
+    # Termes de priorité par niveau (le niveau le plus élevé l'emporte)
+    'PRIORITY_TERMS': {
+        5: [
+            'urgent*', 'urgence*', 'critique*', 'danger*', 'menace*', 'mort', 'deces',
+            'blesse*', 'bloque*',
+            'emergency', 'critical', 'blocked', 'life threatening', 'injur*', 'threat*',
+        ],
+        4: [
+            'important*', 'rapide*', 'vite', 'grave*', 'escalade*',
+            'asap', 'quick*', 'serious*',
+            r're:depuis \d+ (jours|semaines|mois)', r're:for \d+ (days|weeks|months)',
+        ],
+    },
+}
+
+_LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss'})
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TICKET_CLASSIFICATION', {}))
+    return config
+
+
+def is_enabled():
+    return bool(get_config()['ENABLED'])
+
+
+def fold(text):
+    """Texte replié et borné par des espaces (``"L'Abus !"`` -> ``" l abus "``)"""
+    text = unicodedata.normalize('NFKD', (text or '').lower().translate(_LIGATURES))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return f" {_NON_WORD.sub(' ', text).strip()} "
+
+
+class Matcher:
+    """Automate d'Aho-Corasick
+
+    Les transitions sont complétées à la construction (automate déterministe) :
+    la recherche fait une seule consultation de dictionnaire par caractère.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._out = [[]]
+        self._built = False
+
+    def add(self, pattern, payload):
+        node = 0
+        for char in pattern:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._out.append([])
+                self._goto[node][char] = child
+            node = child
+        self._out[node].append(payload)
+        self._built = False
+
+    def build(self):
+        alphabet = {char for transitions in self._goto for char in transitions}
+        fail = [0] * len(self._goto)
+        delta = [dict(transitions) for transitions in self._goto]
+        out = [list(payloads) for payloads in self._out]
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            # Sorties héritées du plus long suffixe reconnu
+            if fail[node]:
+                out[node].extend(out[fail[node]])
+            for char in alphabet:
+                child = self._goto[node].get(char)
+                fallback = delta[fail[node]].get(char, 0)
+                if child is None:
+                    if fallback:
+                        delta[node][char] = fallback
+                else:
+                    fail[child] = fallback
+                    queue.append(child)
+        self._delta, self._outputs = delta, out
+        self._built = True
+        return self
+
+    @property
+    def states(self):
+        return len(self._goto)
+
+    def search(self, text):
+        """Charges utiles de tous les motifs présents dans ``text`` (chevauchements compris)"""
+        if not self._built:
+            self.build()
+        delta, out = self._delta, self._outputs
+        found = []
+        node = 0
+        for char in text:
+            node = delta[node].get(char, 0)
+            if out[node]:
+                found.extend(out[node])
+        return found
+
+
+def compile_term(term):
+    """Motif de l'automate (ou expression régulière) d'un terme du vocabulaire"""
+    term = (term or '').strip()
+    if term.startswith('re:'):
+        return re.compile(term[3:])
+    prefix = term.endswith('*')
+    words = fold(term.rstrip('*')).strip()
+    if not words:
+        return None
+    return f' {words}' if prefix else f' {words} '
+
+
+class Classification:
+    """Résultat de la classification d'un texte"""
+
+    def __init__(self, category=None, priority=None, is_psea=False, confidence=0.0, terms=()):
+        self.category = category
+        self.priority = priority
+        self.is_psea = is_psea
+        self.confidence = confidence
+        self.terms = sorted(terms)
+
+    @property
+    def fields(self):
+        """Champs déterminés par la classification"""
+        values = (('category', self.category), ('priority', self.priority), ('is_psea', self.is_psea))
+        return [name for name, value in values if value]
+
+    def as_metadata(self, applied=()):
+        """Trace enregistrée dans ``Ticket.metadata['classification']``"""
+        return {
+            'auto': bool(applied),
+            'applied': sorted(applied),
+            'category': self.category.name if self.category else None,
+            'priority_level': self.priority.level if self.priority else None,
+            'is_psea': self.is_psea,
+            'confidence': self.confidence,
+            'terms': self.terms[:20],
+        }
+
+
+class Classifier:
+    """Vocabulaires compilés des catégories et des priorités"""
+
+    def __init__(self, categories, priorities, config=None):
+        self.config = config or get_config()
+        self.categories = {category.pk: category for category in categories}
+        self.priorities = {priority.level: priority for priority in priorities}
+        self.sensitive = {category.pk for category in categories if category.is_sensitive}
+        vocabulary = self.config['VOCABULARY']
+        names = list(vocabulary)
+        self.rank = {
+            category.pk: names.index(category.name) if category.name in names else len(names)
+            for category in categories
+        }
+        self.matcher = Matcher()
+        self.patterns = []
+        for category in categories:
+            terms = list(category.keywords or []) + list(vocabulary.get(category.name, []))
+            for term in terms:
+                self._add(term, ('category', category.pk))
+        for level, terms in self.config['PRIORITY_TERMS'].items():
+            for term in terms:
+                self._add(term, ('priority', int(level)))
+        self.matcher.build()
+
+    def _add(self, term, target):
+        try:
+            pattern = compile_term(term)
+        except re.error as e:
+            logger.error(f"Terme de classification '{term}' ignoré: {e}")
+            return
+        if pattern is None:
+            return
+        # Une expression de plusieurs mots est plus spécifique qu'un mot seul
+        weight = 1 if isinstance(pattern, re.Pattern) else len(pattern.split())
+        payload = (term, *target, weight)
+        if isinstance(pattern, re.Pattern):
+            self.patterns.append((pattern, payload))
+        else:
+            self.matcher.add(pattern, payload)
+
+    def classify(self, title='', content=''):
+        text = fold(f'{title} {content}')
+        hits = set(self.matcher.search(text))
+        hits.update(payload for pattern, payload in self.patterns if pattern.search(text))
+
+        scores, levels, terms = {}, [], set()
+        for term, kind, key, weight in hits:
+            terms.add(term)
+            if kind == 'category':
+                scores[key] = scores.get(key, 0) + weight
+            else:
+                levels.append(key)
+
+        is_psea = False
+        category = None
+        confidence = 0.0
+        sensitive = [pk for pk in scores if pk in self.sensitive]
+        candidates = sensitive or list(scores)
+        if candidates:
+            best = min(candidates, key=lambda pk: (-scores[pk], self.rank[pk]))
+            if sensitive or scores[best] >= self.config['MIN_SCORE']:
+                category = self.categories[best]
+                is_psea = bool(sensitive)
+                confidence = round(scores[best] / sum(scores.values()), 2)
+
+        level = max(levels) if levels else None
+        if is_psea:
+            level = max(level or 0, self.config['PSEA_PRIORITY_LEVEL'])
+        priority = self.priorities.get(level) if level else None
+        return Classification(category, priority, is_psea, confidence, terms)
+
+
+class ClassifierRegistry:
+    """Classifieur compilé une fois par processus, invalidé par version partagée"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._classifier = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def shared_version():
+        return cache.get(VERSION_KEY, 0)
+
+    @staticmethod
+    def bump_version():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._classifier = None
+
+    def reload(self):
+        """Invalider ce processus et les autres (via la version partagée)"""
+        self.bump_version()
+        self.invalidate()
+
+    def get(self):
+        now = time.monotonic()
+        if self._classifier is not None and now - self._checked_at < CHECK_INTERVAL:
+            return self._classifier
+
+        version = self.shared_version()
+        with self._lock:
+            if self._classifier is None or version != self._version:
+                self._classifier = Classifier(list(Category.objects.all()), list(Priority.objects.all()))
+                self._version = version
+            self._checked_at = now
+            return self._classifier
+
+
+classifier_registry = ClassifierRegistry()
+
+
+def classify(title='', content=''):
+    return classifier_registry.get().classify(title, content)
+
+
+def default_category():
+    """Catégorie des tickets sans terme reconnu"""
+    name = get_config()['DEFAULT_CATEGORY']
+    return (Category.objects.filter(name=name).first()
+            or Category.objects.filter(is_sensitive=False).first())
+
+
+def default_priority():
+    return Priority.objects.filter(level=get_config()['DEFAULT_PRIORITY_LEVEL']).first()
+
+
+def apply_to_data(data):
+    """Compléter les données d'un ticket à créer (dictionnaire de champs)
+
+    La catégorie et la priorité fournies explicitement sont conservées ; un
+    contenu PSEA marque toujours le ticket. Retourne la classification.
+    """
+    result = classify(data.get('title', ''), data.get('content', ''))
+    applied = []
+    if not data.get('category') and result.category:
+        data['category'] = result.category
+        applied.append('category')
+    if not data.get('priority') and result.priority:
+        data['priority'] = result.priority
+        applied.append('priority')
+    if result.is_psea:
+        data['is_psea'] = True
+        applied.append('is_psea')
+    data['metadata'] = {**(data.get('metadata') or {}), 'classification': result.as_metadata(applied)}
+    return result
+
+
+def mark_fallback(metadata, fields):
+    """Noter dans ``metadata`` les champs remplis par défaut, faute de classification
+
+    Ces valeurs ne sont pas des étiquettes : ``triage`` ne s'en sert pas pour
+    entraîner son modèle tant qu'un agent ne les a pas changées.
+    """
+    if fields:
+        trace = metadata.setdefault('classification', {})
+        trace['fallback'] = sorted(set(trace.get('fallback', [])) | set(fields))
+    return metadata
+
+
+def confirm_fields(ticket, fields):
+    """Retirer de la trace ``fallback`` les champs changés par un agent"""
+    trace = (ticket.metadata or {}).get('classification') or {}
+    remaining = [name for name in trace.get('fallback', []) if name not in fields]
+    if remaining == trace.get('fallback', remaining):
+        return
+    ticket.metadata = {**ticket.metadata, 'classification': {**trace, 'fallback': remaining}}
+    Ticket.objects.filter(pk=ticket.pk).update(metadata=ticket.metadata)
+
+
+def psea_contact(category):
+    if category is not None and category.is_sensitive and category.escalation_contact:
+        return category.escalation_contact
+    sensitive = Category.objects.filter(is_sensitive=True).exclude(escalation_contact='').first()
+    return sensitive.escalation_contact if sensitive else get_config()['PSEA_CONTACT']
+
+
+def escalate_psea(ticket_ids):
+    """Escalader immédiatement des tickets PSEA détectés
+
+    Un ``UPDATE`` par contact, journal groupé et notifications d'escalade en
+    file après validation. Les tickets déjà escaladés sont ignorés. Retourne
+    ``{id: contact}``.
+    """
+    from .workflow import _enqueue_notifications
+
+    rows = Ticket.objects.filter(pk__in=list(ticket_ids), psea_escalated=False).select_related('category')
+    by_contact = {}
+    for ticket in rows.only('pk', 'category'):
+        contact = psea_contact(ticket.category)
+        if not contact:
+            logger.warning(f"Ticket PSEA #{ticket.pk} non escaladé : aucun contact PSEA configuré")
+            continue
+        by_contact.setdefault(contact, []).append(ticket.pk)
+    if not by_contact:
+        return {}
+
+    now = timezone.now()
+    escalated = {}
+    with transaction.atomic(), ticket_audit() as audit:
+        for contact, ids in by_contact.items():
+            Ticket.objects.filter(pk__in=ids).update(
+                psea_escalated=True, psea_contact=contact,
+                escalated_at=now, escalated_to=contact, updated_at=now
+            )
+            for pk in ids:
+                audit.add(pk, 'escalated', f"Contenu PSEA détecté : ticket escaladé vers {contact}",
+                          new_value=contact)
+                escalated[pk] = contact
+        read_model.schedule_refresh(list(escalated))
+        transaction.on_commit(lambda: _enqueue_notifications(list(escalated), 'escalation'))
+    return escalated
+
+
+# Reclassification par lots ------------------------------------------------
+
+def reclassify(queryset, fields=('category', 'priority'), dry_run=False, batch_size=None):
+    """Reclasser un ensemble de tickets
+
+    Les tickets sont lus par lots de colonnes (``values``), reclassés en
+    mémoire puis mis à jour par ``bulk_update`` ; les tickets devenus PSEA sont
+    escaladés. Retourne les compteurs ``{'scanned', 'changed', 'psea'}``.
+    """
+    classifier = classifier_registry.get()
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    stats = {'scanned': 0, 'changed': 0, 'psea': 0}
+
+    last_pk = None
+    queryset = queryset.order_by('pk')
+    while True:
+        batch = queryset.filter(pk__gt=last_pk) if last_pk else queryset
+        rows = list(batch.values(
+            'pk', 'title', 'content', 'category_id', 'priority_id', 'is_psea', 'metadata',
+            'category__name', 'priority__name'
+        )[:batch_size])
+        if not rows:
+            break
+        last_pk = rows[-1]['pk']
+        stats['scanned'] += len(rows)
+
+        changed, new_psea, logs = [], [], []
+        for row in rows:
+            result = classifier.classify(row['title'], row['content'])
+            values, applied = {}, []
+            if 'category' in fields and result.category and result.category.pk != row['category_id']:
+                values['category_id'] = result.category.pk
+                applied.append('category')
+                logs.append((row['pk'], 'updated',
+                             f"Catégorie reclassée de {row['category__name']} à {result.category.name}",
+                             row['category__name'], result.category.name))
+            if 'priority' in fields and result.priority and result.priority.pk != row['priority_id']:
+                values['priority_id'] = result.priority.pk
+                applied.append('priority')
+                logs.append((row['pk'], 'priority_changed',
+                             f"Priorité reclassée de {row['priority__name']} à {result.priority.name}",
+                             row['priority__name'], result.priority.name))
+            if result.is_psea and not row['is_psea']:
+                values['is_psea'] = True
+                applied.append('is_psea')
+                new_psea.append(row['pk'])
+            if not applied:
+                continue
+            metadata = dict(row['metadata'] or {})
+            metadata['classification'] = result.as_metadata(applied)
+            values = {
+                'category_id': row['category_id'], 'priority_id': row['priority_id'],
+                'is_psea': row['is_psea'], **values,
+            }
+            changed.append(Ticket(pk=row['pk'], metadata=metadata, **values))
+
+        stats['changed'] += len(changed)
+        stats['psea'] += len(new_psea)
+        if dry_run or not changed:
+            continue
+
+        now = timezone.now()
+        for ticket in changed:
+            ticket.updated_at = now
+        with transaction.atomic(), ticket_audit() as audit:
+            Ticket.objects.bulk_update(
+                changed, ['category', 'priority', 'is_psea', 'metadata', 'updated_at'], batch_size=batch_size
+            )
+            for pk, action, description, old_value, new_value in logs:
+                audit.add(pk, action, description, old_value=old_value, new_value=new_value)
+            read_model.schedule_refresh([ticket.pk for ticket in changed])
+            if new_psea:
+                escalate_psea(new_psea)
+    return stats
+
+
+# Mesure ------------------------------------------------------------------
+
+SAMPLE_TEXTS = [
+    ("Problème de distribution", "Je n'ai pas reçu ma ration depuis 3 semaines, c'est urgent."),
+    ("Merci", "Merci beaucoup pour votre aide, excellent travail de l'équipe."),
+    ("Demande d'inscription", "J'ai besoin d'aide pour m'inscrire sur la liste, svp."),
+    ("Question", "Quand aura lieu la prochaine distribution et où se trouve le point de collecte ?"),
+    ("Signalement", "Un agent demande des faveurs sexuelles en échange de l'aide."),
+    ("Complaint", "The water point has been blocked for 5 days, this is a serious problem."),
+]
+
+
+def benchmark(texts=None, repeat=5):
+    """Durées de compilation et de classification (microsecondes par ticket)"""
+    texts = list(texts or SAMPLE_TEXTS)
+    started = time.perf_counter()
+    classifier = Classifier(list(Category.objects.all()), list(Priority.objects.all()))
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    durations = []
+    for _ in range(repeat):
+        for title, content in texts:
+            started = time.perf_counter()
+            classifier.classify(title, content)
+            durations.append((time.perf_counter() - started) * 1e6)
+    durations.sort()
+    return {
+        'tickets': len(texts),
+        'runs': len(durations),
+        'states': classifier.matcher.states,
+        'patterns': len(classifier.patterns),
+        'compile_ms': round(compile_ms, 2),
+        'mean_us': round(sum(durations) / len(durations), 1) if durations else None,
+        'p50_us': round(durations[len(durations) // 2], 1) if durations else None,
+        'p95_us': round(durations[int(0.95 * (len(durations) - 1))], 1) if durations else None,
+        'max_us': round(durations[-1], 1) if durations else None,
+    }
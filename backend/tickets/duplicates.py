@@ -0,0 +1,267 @@
+"""
+Détection des quasi-doublons (MinHash / LSH)
+
+Chaque ticket est réduit à l'ensemble des n-grammes de mots de son titre et
+de son contenu repliés, puis à une signature MinHash de ``NUM_PERM`` valeurs :
+la part de valeurs égales entre deux signatures estime la similarité de
+Jaccard des textes. La signature est découpée en ``BANDS`` bandes ; deux
+tickets qui partagent une bande sont candidats, ce qui retrouve avec une forte
+probabilité les paires au-delà de ``(1 / BANDS) ** (BANDS / NUM_PERM)`` sans
+comparer le ticket à tous les autres.
+
+Seuls les tickets d'origine alimentent l'index (``TicketBand``, index sur
+l'empreinte de bande) : un quasi-doublon est rattaché au premier ticket de son
+groupe (``TicketSignature.duplicate_of``), si bien qu'une vague de messages
+identiques reste un seul candidat. Les tickets sont signés en tâche de fond
+après la création, par lots.
+"""
+import hashlib
+import logging
+import random
+import threading
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy est optionnel
+    np = None
+
+from .audit import ticket_audit
+from .classification import fold
+from .models import Ticket, TicketBand, TicketSignature
+from .read_model import _registered
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'NUM_PERM': 128,
+    'BANDS': 16,
+    'SHINGLE_SIZE': 3,
+    # Textes plus courts ignorés (« merci », « ok »…)
+    'MIN_WORDS': 4,
+    'THRESHOLD': 0.8,
+    'MAX_CANDIDATES': 50,
+    'BATCH_SIZE': 200,
+    # Changer la graine, NUM_PERM ou BANDS impose « index_duplicates --rebuild »
+    'SEED': 1,
+}
+
+PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+_local = threading.local()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'DUPLICATE_DETECTION', {}))
+    return config
+
+
+def pack(signature):
+    return array('I', signature).tobytes()
+
+
+def unpack(value):
+    signature = array('I')
+    signature.frombytes(bytes(value))
+    return signature
+
+
+def similarity(first, second):
+    """Similarité de Jaccard estimée (part de valeurs égales)"""
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+class MinHasher:
+    """Signatures MinHash et empreintes de bandes
+
+    Les ``NUM_PERM`` fonctions ``(a·x + b) mod p`` sont tirées d'une graine
+    fixe : les signatures enregistrées restent comparables d'un processus à
+    l'autre.
+    """
+
+    def __init__(self, config):
+        if config['NUM_PERM'] % config['BANDS']:
+            raise ValueError("NUM_PERM doit être un multiple de BANDS")
+        self.bands = config['BANDS']
+        self.rows = config['NUM_PERM'] // config['BANDS']
+        self.shingle_size = config['SHINGLE_SIZE']
+        self.min_words = config['MIN_WORDS']
+        rng = random.Random(config['SEED'])
+        # a, b < 2^31 et x < 2^32 : a·x + b tient sur 64 bits non signés
+        self.a = [rng.randrange(1, 1 << 31) for _ in range(config['NUM_PERM'])]
+        self.b = [rng.randrange(0, 1 << 31) for _ in range(config['NUM_PERM'])]
+        if np is not None:
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+
+    def shingles(self, text):
+        words = fold(text).split()
+        if len(words) < self.min_words:
+            return set()
+        size = min(self.shingle_size, len(words))
+        return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+    @staticmethod
+    def hash32(value):
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=4).digest(), 'little')
+
+    def signature(self, text):
+        """Signature MinHash, ou ``None`` si le texte est trop court"""
+        hashes = [self.hash32(shingle) for shingle in self.shingles(text)]
+        if not hashes:
+            return None
+        if np is not None:
+            values = (self._a * np.array(hashes, dtype=np.uint64) + self._b) % np.uint64(PRIME)
+            return (values & np.uint64(MAX_HASH)).min(axis=1).tolist()
+        return [min(((a * x + b) % PRIME) & MAX_HASH for x in hashes) for a, b in zip(self.a, self.b)]
+
+    def band_keys(self, signature):
+        """Empreinte signée sur 64 bits de chaque bande (numéro de bande compris)"""
+        keys = []
+        for band in range(self.bands):
+            values = array('I', [band, *signature[band * self.rows:(band + 1) * self.rows]])
+            digest = hashlib.blake2b(values.tobytes(), digest_size=8).digest()
+            keys.append(int.from_bytes(digest, 'little', signed=True))
+        return keys
+
+
+_hashers = {}
+
+
+def get_hasher(config=None):
+    config = config or get_config()
+    key = (config['NUM_PERM'], config['BANDS'], config['SHINGLE_SIZE'], config['MIN_WORDS'], config['SEED'])
+    hasher = _hashers.get(key)
+    if hasher is None:
+        hasher = _hashers[key] = MinHasher(config)
+    return hasher
+
+
+def index_tickets(ticket_ids, config=None):
+    """Signer des tickets et les rattacher à leur groupe de quasi-doublons
+
+    Les tickets sont traités par date de création : le plus ancien d'un groupe
+    en est l'origine. Retourne les compteurs ``{'indexed', 'duplicates', 'skipped'}``.
+    """
+    config = config or get_config()
+    hasher = get_hasher(config)
+    rows = Ticket.objects.filter(pk__in=list(ticket_ids), signature__isnull=True).order_by(
+        'created_at', 'pk'
+    ).values_list('pk', 'title', 'content')
+
+    stats = {'indexed': 0, 'duplicates': 0, 'skipped': 0}
+    records, pending = [], []
+    for pk, title, content in rows:
+        signature = hasher.signature(f'{title} {content}')
+        if signature is None:
+            # Signature vide : le ticket n'est plus proposé à l'indexation
+            records.append(TicketSignature(ticket_id=pk, signature=b''))
+            stats['skipped'] += 1
+        else:
+            pending.append((pk, signature, hasher.band_keys(signature)))
+    if not records and not pending:
+        return stats
+
+    # Origines existantes partageant au moins une bande
+    buckets = {}
+    keys = {key for _, _, band_keys in pending for key in band_keys}
+    for key, ticket_id in TicketBand.objects.filter(key__in=keys).values_list('key', 'ticket_id'):
+        buckets.setdefault(key, []).append(ticket_id)
+    candidate_ids = {ticket_id for ids in buckets.values() for ticket_id in ids}
+    signatures = {
+        ticket_id: unpack(value)
+        for ticket_id, value in TicketSignature.objects.filter(
+            ticket_id__in=candidate_ids
+        ).values_list('ticket_id', 'signature')
+    }
+
+    bands, links = [], []
+    for pk, signature, band_keys in pending:
+        shared = Counter(ticket_id for key in band_keys for ticket_id in buckets.get(key, ()))
+        origin, best = None, 0.0
+        for candidate, _ in shared.most_common(config['MAX_CANDIDATES']):
+            if candidate in signatures:
+                score = similarity(signature, signatures[candidate])
+                if score > best:
+                    origin, best = candidate, score
+
+        if origin is not None and best >= config['THRESHOLD']:
+            records.append(TicketSignature(
+                ticket_id=pk, signature=pack(signature), duplicate_of_id=origin, similarity=round(best, 3)
+            ))
+            links.append((pk, origin, best))
+        else:
+            # Nouvelle origine, candidate pour la suite du lot
+            records.append(TicketSignature(ticket_id=pk, signature=pack(signature)))
+            bands.extend(TicketBand(ticket_id=pk, key=key) for key in band_keys)
+            for key in band_keys:
+                buckets.setdefault(key, []).append(pk)
+            signatures[pk] = signature
+    stats['indexed'] = len(pending)
+    stats['duplicates'] = len(links)
+
+    with transaction.atomic(), ticket_audit() as audit:
+        TicketSignature.objects.bulk_create(records, ignore_conflicts=True)
+        TicketBand.objects.bulk_create(bands, batch_size=1000)
+        for pk, origin, score in links:
+            audit.add(pk, 'updated', f"Doublon probable du ticket #{origin} (similarité {score:.0%})",
+                      new_value=str(origin))
+    return stats
+
+
+def group_of(ticket):
+    """Identifiant du ticket d'origine et ``[(id, similarité)]`` des doublons du groupe"""
+    origin_id = TicketSignature.objects.filter(ticket=ticket).values_list('duplicate_of_id', flat=True).first()
+    origin_id = origin_id or ticket.pk
+    members = list(TicketSignature.objects.filter(duplicate_of_id=origin_id).values_list('ticket_id', 'similarity'))
+    return origin_id, members
+
+
+# Indexation à la création -------------------------------------------------
+
+def enqueue(ticket_ids, batch_size=None):
+    from .tasks import index_ticket_duplicates
+
+    ids = [str(pk) for pk in ticket_ids]
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    try:
+        for i in range(0, len(ids), batch_size):
+            index_ticket_duplicates.delay(ids[i:i + batch_size])
+    except Exception as e:
+        # Rattrapé par « index_duplicates »
+        logger.warning(f"Indexation des doublons non planifiée: {e}")
+
+
+class _PendingIndex:
+    """Tickets créés dans la transaction en cours, indexés après validation"""
+
+    def __init__(self):
+        self.ids = []
+
+    def __call__(self):
+        if getattr(_local, 'pending', None) is self:
+            _local.pending = None
+        enqueue(self.ids)
+
+
+def schedule_indexing(ticket_ids):
+    """Planifier l'indexation de tickets créés (en un lot à la validation)"""
+    if not ticket_ids or not get_config()['ENABLED']:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        enqueue(ticket_ids)
+        return
+
+    pending = getattr(_local, 'pending', None)
+    if pending is None or not _registered(connection, pending):
+        pending = _local.pending = _PendingIndex()
+        transaction.on_commit(pending)
+    pending.ids.extend(ticket_ids)
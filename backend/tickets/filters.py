@@ -2,8 +2,10 @@
 Filtres pour l'API des tickets
 """
 import django_filters
+from rest_framework.exceptions import ValidationError
 from django.db.models import Q
-from .models import Ticket
+from .geo import filter_bbox, parse_bbox
+from .models import Ticket, TicketSummary
 
 
 class TicketFilter(django_filters.FilterSet):
@@ -32,6 +34,7 @@ class TicketFilter(django_filters.FilterSet):
     
     # Filtres de localisation
     has_location = django_filters.BooleanFilter(method='filter_has_location')
+    bbox = django_filters.CharFilter(method='filter_bbox')
     
     class Meta:
         model = Ticket
@@ -39,7 +42,7 @@ class TicketFilter(django_filters.FilterSet):
             'category', 'priority', 'status', 'channel', 'assigned_to',
             'is_anonymous', 'is_psea', 'is_overdue',
             'created_after', 'created_before', 'updated_after', 'updated_before',
-            'search', 'has_location'
+            'search', 'has_location', 'bbox'
         ]
     
     def filter_overdue(self, queryset, name, value):
@@ -75,3 +78,43 @@ class TicketFilter(django_filters.FilterSet):
             return queryset.filter(
                 Q(latitude__isnull=True) | Q(longitude__isnull=True)
             )
+
+    def filter_bbox(self, queryset, name, value):
+        """Filtrer les tickets dans une emprise min_lng,min_lat,max_lng,max_lat"""
+        try:
+            bbox = parse_bbox(value)
+        except ValueError as e:
+            raise ValidationError({'bbox': str(e)})
+        return filter_bbox(queryset, bbox)
+
+
+class TicketSummaryFilter(TicketFilter):
+    """Mêmes filtres, appliqués au modèle de lecture (une seule table)"""
+
+    category = django_filters.CharFilter(field_name='category_name')
+    priority = django_filters.CharFilter(field_name='priority_name')
+    status = django_filters.CharFilter(field_name='status_name')
+    channel = django_filters.CharFilter(field_name='channel_name')
+    assigned_to = django_filters.UUIDFilter(field_name='assigned_to_id')
+
+    class Meta(TicketFilter.Meta):
+        model = TicketSummary
+
+    def filter_overdue(self, queryset, name, value):
+        """Filtrer les tickets en retard"""
+        if value:
+            from django.utils import timezone
+            return queryset.filter(sla_deadline__lt=timezone.now(), is_final=False)
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Recherche textuelle (le contenu n'est lu sur Ticket que pour une recherche)"""
+        if value:
+            return queryset.filter(
+                Q(title__icontains=value) |
+                Q(ticket__content__icontains=value) |
+                Q(submitter_name__icontains=value) |
+                Q(submitter_phone__icontains=value) |
+                Q(submitter_email__icontains=value)
+            )
+        return queryset
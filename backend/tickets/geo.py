@@ -0,0 +1,85 @@
+"""
+Requêtes géospatiales pour les cartes de tickets
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Avg, Count, FloatField
+from django.db.models.functions import Cast, Floor
+
+# Nombre de cellules par tuile de carte (tuile de 256px -> cellules de 32px)
+CELLS_PER_TILE = 8
+MIN_ZOOM = 0
+MAX_ZOOM = 20
+# Plafond de la réponse : les cellules les plus peuplées sont conservées
+MAX_CLUSTERS = 2000
+
+
+def parse_bbox(value):
+    """Lire une emprise ``min_lng,min_lat,max_lng,max_lat``"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (Decimal(part.strip()) for part in value.split(','))
+    except (ValueError, InvalidOperation, AttributeError):
+        raise ValueError("Emprise invalide, format attendu: min_lng,min_lat,max_lng,max_lat")
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError("Emprise invalide: minimum supérieur au maximum")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def filter_bbox(queryset, bbox):
+    """Filtrer sur l'emprise (parcours de l'index composite latitude/longitude)"""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return queryset.filter(
+        latitude__gte=min_lat,
+        latitude__lte=max_lat,
+        longitude__gte=min_lng,
+        longitude__lte=max_lng,
+    )
+
+
+def clamp_zoom(zoom):
+    """Niveau de zoom ramené dans ``[MIN_ZOOM, MAX_ZOOM]``"""
+    return max(MIN_ZOOM, min(int(zoom), MAX_ZOOM))
+
+
+def cell_size(zoom):
+    """Taille d'une cellule de grille en degrés pour un niveau de zoom"""
+    return 360.0 / (2 ** clamp_zoom(zoom) * CELLS_PER_TILE)
+
+
+def cluster_tickets(queryset, zoom, limit=MAX_CLUSTERS):
+    """Regrouper les tickets géolocalisés par cellule de grille
+
+    Le regroupement est calculé en SQL : la taille de la réponse dépend du
+    nombre de cellules visibles et non du nombre de tickets ; au-delà de
+    ``limit`` cellules, seules les plus peuplées sont renvoyées.
+    """
+    size = cell_size(zoom)
+    rows = (
+        queryset.filter(latitude__isnull=False, longitude__isnull=False)
+        .annotate(
+            cell_lat=Floor(Cast('latitude', FloatField()) / size),
+            cell_lng=Floor(Cast('longitude', FloatField()) / size),
+        )
+        .values('cell_lat', 'cell_lng')
+        .annotate(
+            count=Count('id'),
+            lat=Avg(Cast('latitude', FloatField())),
+            lng=Avg(Cast('longitude', FloatField())),
+        )
+        .order_by('-count', 'cell_lat', 'cell_lng')[:limit]
+    )
+    return [
+        {
+            'cell': [int(row['cell_lat']), int(row['cell_lng'])],
+            'count': row['count'],
+            'lat': row['lat'],
+            'lng': row['lng'],
+            'bounds': [
+                row['cell_lng'] * size,
+                row['cell_lat'] * size,
+                (row['cell_lng'] + 1) * size,
+                (row['cell_lat'] + 1) * size,
+            ],
+        }
+        for row in rows
+    ]
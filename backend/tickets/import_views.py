@@ -13,6 +13,83 @@ from django.utils import timezone
 from .models import Ticket, Category, Priority, Channel, Status
 
 
+def import_rows(csv_reader):
+    """
+    Créer les tickets à partir des lignes d'un ``csv.DictReader``
+
+    Retourne ``(nombre importé, erreurs)``. Utilisé par l'import direct et par
+    l'import d'un fichier envoyé par morceaux (``tickets.uploads``).
+    """
+    imported_count = 0
+    errors = []
+    
+    # Obtenir les objets de référence
+    categories = {cat.name: cat for cat in Category.objects.all()}
+    priorities = {pri.name: pri for pri in Priority.objects.all()}
+    channels = {ch.name: ch for ch in Channel.objects.all()}
+    statuses = {st.name: st for st in Status.objects.all()}
+    
+    # Canal par défaut
+    default_channel = channels.get('Portail Web')
+    if not default_channel:
+        default_channel = Channel.objects.first()
+    
+    # Statut par défaut
+    default_status = statuses.get('Ouvert')
+    if not default_status:
+        default_status = Status.objects.first()
+    
+    # Priorité par défaut
+    default_priority = priorities.get('Moyenne')
+    if not default_priority:
+        default_priority = Priority.objects.first()
+    
+    with transaction.atomic():
+        for row_num, row in enumerate(csv_reader, start=2):  # Commencer à 2 car la ligne 1 est l'en-tête
+            try:
+                # Validation des champs requis
+                if not row.get('title') or not row.get('content'):
+                    errors.append(f"Ligne {row_num}: Le titre et le contenu sont requis")
+                    continue
+                
+                # Récupérer les objets de référence
+                category = categories.get(row.get('category', ''))
+                if not category:
+                    errors.append(f"Ligne {row_num}: Catégorie '{row.get('category')}' non trouvée")
+                    continue
+                
+                priority = priorities.get(row.get('priority', ''))
+                if not priority:
+                    priority = default_priority
+                
+                channel = channels.get(row.get('channel', ''))
+                if not channel:
+                    channel = default_channel
+                
+                # Créer le ticket
+                ticket = Ticket.objects.create(
+                    title=row['title'],
+                    content=row['content'],
+                    category=category,
+                    priority=priority,
+                    channel=channel,
+                    status=default_status,
+                    submitter_name=row.get('submitter_name', ''),
+                    submitter_phone=row.get('submitter_phone', ''),
+                    submitter_email=row.get('submitter_email', ''),
+                    submitter_location=row.get('submitter_location', ''),
+                    is_anonymous=row.get('is_anonymous', '').lower() in ['true', '1', 'yes', 'oui'],
+                )
+                
+                imported_count += 1
+                
+            except Exception as e:
+                errors.append(f"Ligne {row_num}: Erreur lors de la création du ticket - {str(e)}")
+                continue
+
+    return imported_count, errors
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def import_tickets(request):
@@ -35,77 +112,10 @@ def import_tickets(request):
         )
     
     try:
-        # Lire le contenu du fichier
-        content = file.read().decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(content))
-        
-        imported_count = 0
-        errors = []
-        
-        # Obtenir les objets de référence
-        categories = {cat.name: cat for cat in Category.objects.all()}
-        priorities = {pri.name: pri for pri in Priority.objects.all()}
-        channels = {ch.name: ch for ch in Channel.objects.all()}
-        statuses = {st.name: st for st in Status.objects.all()}
-        
-        # Canal par défaut
-        default_channel = channels.get('Portail Web')
-        if not default_channel:
-            default_channel = Channel.objects.first()
-        
-        # Statut par défaut
-        default_status = statuses.get('Ouvert')
-        if not default_status:
-            default_status = Status.objects.first()
-        
-        # Priorité par défaut
-        default_priority = priorities.get('Moyenne')
-        if not default_priority:
-            default_priority = Priority.objects.first()
-        
-        with transaction.atomic():
-            for row_num, row in enumerate(csv_reader, start=2):  # Commencer à 2 car la ligne 1 est l'en-tête
-                try:
-                    # Validation des champs requis
-                    if not row.get('title') or not row.get('content'):
-                        errors.append(f"Ligne {row_num}: Le titre et le contenu sont requis")
-                        continue
-                    
-                    # Récupérer les objets de référence
-                    category = categories.get(row.get('category', ''))
-                    if not category:
-                        errors.append(f"Ligne {row_num}: Catégorie '{row.get('category')}' non trouvée")
-                        continue
-                    
-                    priority = priorities.get(row.get('priority', ''))
-                    if not priority:
-                        priority = default_priority
-                    
-                    channel = channels.get(row.get('channel', ''))
-                    if not channel:
-                        channel = default_channel
-                    
-                    # Créer le ticket
-                    ticket = Ticket.objects.create(
-                        title=row['title'],
-                        content=row['content'],
-                        category=category,
-                        priority=priority,
-                        channel=channel,
-                        status=default_status,
-                        submitter_name=row.get('submitter_name', ''),
-                        submitter_phone=row.get('submitter_phone', ''),
-                        submitter_email=row.get('submitter_email', ''),
-                        submitter_location=row.get('submitter_location', ''),
-                        is_anonymous=row.get('is_anonymous', '').lower() in ['true', '1', 'yes', 'oui'],
-                    )
-                    
-                    imported_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Ligne {row_num}: Erreur lors de la création du ticket - {str(e)}")
-                    continue
-        
+        # Lire le fichier en flux plutôt que de le charger entièrement
+        csv_reader = csv.DictReader(io.TextIOWrapper(file.file, encoding='utf-8'))
+        imported_count, errors = import_rows(csv_reader)
+
         return Response({
             'message': f'Importation terminée. {imported_count} tickets importés.',
             'imported_count': imported_count,
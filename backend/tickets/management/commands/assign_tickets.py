@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from tickets import assignment, workload
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = "Assign open unassigned tickets to the least-loaded eligible agents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Maximum number of tickets to process")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--psea-only', action='store_true')
+        parser.add_argument('--reconcile', action='store_true',
+                            help="Recompute the per-agent open-ticket counters from the database first")
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            counts = workload.reconcile()
+            self.stdout.write(f"Workload counters rebuilt for {len(counts)} agents with open tickets")
+
+        queryset = Ticket.objects.all()
+        if options['psea_only']:
+            queryset = queryset.filter(is_psea=True)
+        stats = assignment.assign_backlog(queryset, limit=options['limit'], batch_size=options['batch_size'])
+
+        for user_id, count in sorted(stats['agents'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {user_id}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['assigned']} tickets assigned, {stats['unassigned']} without an eligible agent"
+        ))
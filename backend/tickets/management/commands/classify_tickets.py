@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from tickets import classification
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = "Reclassify tickets (category, priority, PSEA) with the rule-based classifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Include tickets that were already classified")
+        parser.add_argument('--include-closed', action='store_true',
+                            help="Include tickets in a final status")
+        parser.add_argument('--fields', nargs='+', choices=['category', 'priority'],
+                            default=['category', 'priority'])
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--benchmark', type=int, metavar='N', default=None,
+                            help="Time the classifier on N tickets (sample texts if none) and exit")
+
+    def handle(self, *args, **options):
+        if options['benchmark'] is not None:
+            return self.benchmark(options['benchmark'])
+
+        queryset = Ticket.objects.all()
+        if not options['all']:
+            queryset = queryset.exclude(metadata__has_key='classification')
+        if not options['include_closed']:
+            queryset = queryset.filter(status__is_final=False)
+
+        stats = classification.reclassify(
+            queryset, fields=options['fields'],
+            dry_run=options['dry_run'], batch_size=options['batch_size']
+        )
+        prefix = "[dry run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats['scanned']} tickets scanned, {stats['changed']} reclassified, "
+            f"{stats['psea']} newly flagged PSEA"
+        ))
+
+    def benchmark(self, count):
+        texts = list(Ticket.objects.order_by('-created_at').values_list('title', 'content')[:count])
+        result = classification.benchmark(texts or None)
+        self.stdout.write(
+            f"{result['tickets']} tickets x {result['runs'] // max(result['tickets'], 1)} runs, "
+            f"{result['states']} automaton states, {result['patterns']} regex rules, "
+            f"compiled in {result['compile_ms']} ms"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"mean {result['mean_us']} us, p50 {result['p50_us']} us, "
+            f"p95 {result['p95_us']} us, max {result['max_us']} us per ticket"
+        ))
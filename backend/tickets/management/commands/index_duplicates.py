@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from tickets import duplicates
+from tickets.models import Ticket, TicketBand, TicketSignature
+
+
+class Command(BaseCommand):
+    help = "Compute MinHash signatures of unindexed tickets and link near-duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Drop all signatures and LSH bands first (after changing NUM_PERM, BANDS or SEED)")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        config = duplicates.get_config()
+        batch_size = options['batch_size'] or config['BATCH_SIZE']
+        if options['rebuild']:
+            TicketBand.objects.all().delete()
+            TicketSignature.objects.all().delete()
+
+        # Par date de création : le plus ancien ticket d'un groupe en est l'origine
+        queryset = Ticket.objects.filter(signature__isnull=True).order_by('created_at', 'pk')
+        totals = {'indexed': 0, 'duplicates': 0, 'skipped': 0}
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            stats = duplicates.index_tickets(ids, config)
+            for key, value in stats.items():
+                totals[key] += value
+            if not any(stats.values()):
+                break
+            self.stdout.write(f"{totals['indexed'] + totals['skipped']} tickets processed")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['indexed']} tickets indexed, {totals['duplicates']} near-duplicates linked, "
+            f"{totals['skipped']} too short to compare"
+        ))
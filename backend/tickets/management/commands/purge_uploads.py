@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tickets.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired chunked uploads and their temporary files"
+
+    def handle(self, *args, **options):
+        count = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"{count} expired upload(s) purged"))
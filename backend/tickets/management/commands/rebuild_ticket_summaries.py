@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tickets import read_model
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized ticket read model (TicketSummary)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=read_model.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = read_model.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{count} ticket summaries rebuilt"))
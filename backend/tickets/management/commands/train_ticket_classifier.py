@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import triage
+
+
+class Command(BaseCommand):
+    help = "Train the TF-IDF ticket classifier on agent-classified tickets and publish it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-samples', type=int, default=None)
+        parser.add_argument('--max-features', type=int, default=None)
+        parser.add_argument('--min-df', type=int, default=None)
+        parser.add_argument('--epochs', type=int, default=None)
+        parser.add_argument('--holdout', type=float, default=None,
+                            help="Share of tickets kept aside to measure accuracy")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Train and report accuracy without publishing the model")
+        parser.add_argument('--backfill', action='store_true',
+                            help="Score open unclassified tickets with the new model")
+
+    def handle(self, *args, **options):
+        config = triage.get_config()
+        for option, key in (('max_samples', 'MAX_SAMPLES'), ('max_features', 'MAX_FEATURES'),
+                            ('min_df', 'MIN_DF'), ('epochs', 'EPOCHS'), ('holdout', 'HOLDOUT')):
+            if options[option] is not None:
+                config[key] = options[option]
+
+        try:
+            model = triage.train(config=config)
+        except triage.ModelError as e:
+            raise CommandError(str(e))
+
+        metrics = ', '.join(f"{key}={value}" for key, value in model.metrics.items())
+        self.stdout.write(f"Model {model.version}: {metrics}")
+        if options['dry_run']:
+            return
+
+        triage.publish(model, config)
+        self.stdout.write(self.style.SUCCESS(f"Model {model.version} published to {triage.model_dir(config)}"))
+
+        if options['backfill']:
+            stats = triage.backfill(config=config)
+            self.stdout.write(self.style.SUCCESS(
+                f"{stats['scored']} tickets scored, {stats['changed']} reclassified, "
+                f"{stats['psea']} newly flagged PSEA"
+            ))
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tickets', '0004_attachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('purpose', models.CharField(choices=[('attachment', 'Pièce jointe'), ('import', 'Import de tickets')], max_length=20)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.BigIntegerField(help_text='Taille totale annoncée (octets)')),
+                ('offset', models.BigIntegerField(default=0, help_text='Octets reçus')),
+                ('checksum', models.CharField(blank=True, help_text='SHA-256 attendu (optionnel)', max_length=64)),
+                ('status', models.CharField(choices=[('uploading', 'En cours'), ('complete', 'Terminé'), ('processing', 'En traitement'), ('failed', 'Échec')], default='uploading', max_length=20)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('path', models.CharField(blank=True, max_length=500)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField()),
+                ('attachment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tickets.attachment')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Envoi de fichier',
+                'verbose_name_plural': 'Envois de fichiers',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='upload',
+            index=models.Index(fields=['status', 'expires_at'], name='tickets_upl_status_00c258_idx'),
+        ),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketSummary = apps.get_model('tickets', 'TicketSummary')
+
+    tickets = Ticket.objects.select_related(
+        'category', 'priority', 'status', 'channel', 'assigned_to', 'created_by'
+    ).annotate(
+        response_total=models.Count('responses', distinct=True),
+        attachment_total=models.Count('files', distinct=True),
+        feedback_total=models.Count('feedback', distinct=True),
+    ).order_by()
+
+    batch = []
+    for ticket in tickets.iterator(chunk_size=1000):
+        assignee = ticket.assigned_to
+        batch.append(TicketSummary(
+            ticket_id=ticket.pk,
+            title=ticket.title,
+            category_id=ticket.category_id,
+            category_name=ticket.category.name,
+            priority_id=ticket.priority_id,
+            priority_name=ticket.priority.name,
+            priority_level=ticket.priority.level,
+            priority_color=ticket.priority.color,
+            status_id=ticket.status_id,
+            status_name=ticket.status.name,
+            status_color=ticket.status.color,
+            is_final=ticket.status.is_final,
+            channel_id=ticket.channel_id,
+            channel_name=ticket.channel.name,
+            assigned_to_id=ticket.assigned_to_id,
+            assigned_to_name=f"{assignee.first_name} {assignee.last_name}".strip() if assignee else '',
+            assigned_to_organization_id=assignee.organization_id if assignee else None,
+            created_by_organization_id=ticket.created_by.organization_id if ticket.created_by else None,
+            submitter_name=ticket.submitter_name,
+            submitter_phone=ticket.submitter_phone,
+            submitter_email=ticket.submitter_email,
+            is_anonymous=ticket.is_anonymous,
+            is_psea=ticket.is_psea,
+            latitude=ticket.latitude,
+            longitude=ticket.longitude,
+            sla_deadline=ticket.sla_deadline,
+            created_at=ticket.created_at,
+            updated_at=ticket.updated_at,
+            closed_at=ticket.closed_at,
+            response_count=ticket.response_total,
+            attachment_count=ticket.attachment_total,
+            has_feedback=ticket.feedback_total > 0,
+        ))
+        if len(batch) >= 1000:
+            TicketSummary.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        TicketSummary.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSummary',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='tickets.ticket')),
+                ('title', models.CharField(max_length=200)),
+                ('category_id', models.BigIntegerField()),
+                ('category_name', models.CharField(max_length=100)),
+                ('priority_id', models.BigIntegerField()),
+                ('priority_name', models.CharField(max_length=50)),
+                ('priority_level', models.IntegerField()),
+                ('priority_color', models.CharField(max_length=7)),
+                ('status_id', models.BigIntegerField()),
+                ('status_name', models.CharField(max_length=50)),
+                ('status_color', models.CharField(max_length=7)),
+                ('is_final', models.BooleanField(default=False)),
+                ('channel_id', models.BigIntegerField()),
+                ('channel_name', models.CharField(max_length=100)),
+                ('assigned_to_id', models.UUIDField(blank=True, null=True)),
+                ('assigned_to_name', models.CharField(blank=True, max_length=300)),
+                ('assigned_to_organization_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_by_organization_id', models.BigIntegerField(blank=True, null=True)),
+                ('submitter_name', models.CharField(blank=True, max_length=100)),
+                ('submitter_phone', models.CharField(blank=True, max_length=20)),
+                ('submitter_email', models.EmailField(blank=True, max_length=254)),
+                ('is_anonymous', models.BooleanField(default=False)),
+                ('is_psea', models.BooleanField(default=False)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('sla_deadline', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('response_count', models.PositiveIntegerField(default=0)),
+                ('attachment_count', models.PositiveIntegerField(default=0)),
+                ('has_feedback', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Résumé de ticket',
+                'verbose_name_plural': 'Résumés de tickets',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ticketsummary',
+            index=models.Index(fields=['-created_at'], name='tickets_tic_created_f651a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsummary',
+            index=models.Index(fields=['status_name', 'created_at'], name='tickets_tic_status__e4fcc6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsummary',
+            index=models.Index(fields=['category_name', 'created_at'], name='tickets_tic_categor_f451bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsummary',
+            index=models.Index(fields=['is_final', 'sla_deadline'], name='tickets_tic_is_fina_7bb719_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsummary',
+            index=models.Index(fields=['assigned_to_id', 'created_at'], name='tickets_tic_assigne_03367e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticketsummary',
+            index=models.Index(fields=['is_psea', 'created_at'], name='tickets_tic_is_psea_6fd076_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_ticketsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['submitter_phone', 'updated_at'], name='tickets_tic_submitt_fedeab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['external_id'], name='tickets_tic_externa_9e0213_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['external_message_id'], name='tickets_res_externa_864a3b_idx'),
+        ),
+    ]
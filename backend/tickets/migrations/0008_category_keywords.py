@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_inbound_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='keywords',
+            field=models.JSONField(blank=True, default=list, help_text='Termes de classification automatique (français/anglais) ; « mot* » pour un préfixe, « re:… » pour une expression régulière'),
+        ),
+    ]
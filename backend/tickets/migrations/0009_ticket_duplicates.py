@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_category_keywords'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSignature',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='tickets.ticket')),
+                ('signature', models.BinaryField()),
+                ('similarity', models.FloatField(blank=True, help_text="Similarité estimée avec le ticket d'origine", null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duplicate_of', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Signature de ticket',
+                'verbose_name_plural': 'Signatures de tickets',
+            },
+        ),
+        migrations.CreateModel(
+            name='TicketBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(help_text='Empreinte (numéro de bande, valeurs de la bande)')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_bands', to='tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Bande LSH',
+                'verbose_name_plural': 'Bandes LSH',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ticketband',
+            index=models.Index(fields=['key'], name='tickets_tic_key_949795_idx'),
+        ),
+    ]
@@ -15,6 +15,11 @@ class Category(models.Model):
     is_sensitive = models.BooleanField(default=False, help_text="Catégorie sensible (PSEA/SEA)")
     requires_escalation = models.BooleanField(default=False, help_text="Nécessite une escalade automatique")
     escalation_contact = models.EmailField(blank=True, help_text="Contact pour escalade")
+    keywords = models.JSONField(
+        default=list, blank=True,
+        help_text="Termes de classification automatique (français/anglais) ; "
+                  "« mot* » pour un préfixe, « re:… » pour une expression régulière"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -151,6 +156,11 @@ class Ticket(models.Model):
             models.Index(fields=['category', 'is_psea']),
             models.Index(fields=['created_at']),
             models.Index(fields=['assigned_to']),
+            models.Index(fields=['latitude', 'longitude']),
+            models.Index(fields=['is_psea', 'created_at']),
+            # Fil de conversation des messages entrants (channels.inbound)
+            models.Index(fields=['submitter_phone', 'updated_at']),
+            models.Index(fields=['external_id']),
         ]
 
     def __str__(self):
@@ -180,6 +190,103 @@ class Ticket(models.Model):
         return (timezone.now() - self.created_at).days
 
 
+class Attachment(models.Model):
+    """Pièce jointe d'un ticket
+
+    Le contenu est stocké une seule fois par empreinte SHA-256 ; plusieurs
+    pièces jointes peuvent pointer vers le même fichier.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processed', 'Traitée'),
+        ('failed', 'Échec'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='files')
+    name = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    path = models.CharField(max_length=500)
+    size = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True)
+
+    # Résultats du traitement en arrière-plan
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    thumbnail_path = models.CharField(max_length=500, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    metadata = models.JSONField(default=dict, blank=True)
+
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Pièce jointe"
+        verbose_name_plural = "Pièces jointes"
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.name} - #{self.ticket_id}"
+
+
+class Upload(models.Model):
+    """Envoi de fichier en plusieurs morceaux, reprenable après interruption
+
+    Les morceaux sont ajoutés à un fichier temporaire ; ``offset`` est le
+    nombre d'octets reçus. Une fois complet, le fichier est transmis au
+    stockage des pièces jointes ou à l'import CSV.
+    """
+    PURPOSE_CHOICES = [
+        ('attachment', 'Pièce jointe'),
+        ('import', 'Import de tickets'),
+    ]
+    STATUS_CHOICES = [
+        ('uploading', 'En cours'),
+        ('complete', 'Terminé'),
+        ('processing', 'En traitement'),
+        ('failed', 'Échec'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField(help_text="Taille totale annoncée (octets)")
+    offset = models.BigIntegerField(default=0, help_text="Octets reçus")
+    checksum = models.CharField(max_length=64, blank=True, help_text="SHA-256 attendu (optionnel)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+
+    # Cible : ticket pour une pièce jointe
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, null=True, blank=True, related_name='uploads')
+    attachment = models.ForeignKey('Attachment', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Fichier stocké (par empreinte) une fois l'envoi terminé
+    sha256 = models.CharField(max_length=64, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    result = models.JSONField(default=dict, blank=True)
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Envoi de fichier"
+        verbose_name_plural = "Envois de fichiers"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def is_finished(self):
+        return self.offset >= self.size
+
+
 class Response(models.Model):
     """Réponses aux tickets"""
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='responses')
@@ -198,6 +305,9 @@ class Response(models.Model):
         verbose_name = "Réponse"
         verbose_name_plural = "Réponses"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['external_message_id']),
+        ]
 
     def __str__(self):
         return f"Réponse pour #{self.ticket.id}"
@@ -260,3 +370,112 @@ class Feedback(models.Model):
 
     def __str__(self):
         return f"Feedback pour #{self.ticket.id} - {self.satisfaction_rating}/5"
+
+
+class TicketSummary(models.Model):
+    """Modèle de lecture dénormalisé des tickets
+
+    Une ligne étroite par ticket avec les libellés des références, l'état SLA
+    et des compteurs, pour que les listes, filtres et tableaux de bord soient
+    servis par une seule table indexée. Maintenu par ``tickets.read_model``.
+    """
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    title = models.CharField(max_length=200)
+
+    category_id = models.BigIntegerField()
+    category_name = models.CharField(max_length=100)
+    priority_id = models.BigIntegerField()
+    priority_name = models.CharField(max_length=50)
+    priority_level = models.IntegerField()
+    priority_color = models.CharField(max_length=7)
+    status_id = models.BigIntegerField()
+    status_name = models.CharField(max_length=50)
+    status_color = models.CharField(max_length=7)
+    is_final = models.BooleanField(default=False)
+    channel_id = models.BigIntegerField()
+    channel_name = models.CharField(max_length=100)
+
+    # Assignation (et organisations, pour les règles de visibilité)
+    assigned_to_id = models.UUIDField(null=True, blank=True)
+    assigned_to_name = models.CharField(max_length=300, blank=True)
+    assigned_to_organization_id = models.BigIntegerField(null=True, blank=True)
+    created_by_organization_id = models.BigIntegerField(null=True, blank=True)
+
+    # Champs de recherche et de filtre
+    submitter_name = models.CharField(max_length=100, blank=True)
+    submitter_phone = models.CharField(max_length=20, blank=True)
+    submitter_email = models.EmailField(blank=True)
+    is_anonymous = models.BooleanField(default=False)
+    is_psea = models.BooleanField(default=False)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+
+    sla_deadline = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    # Compteurs
+    response_count = models.PositiveIntegerField(default=0)
+    attachment_count = models.PositiveIntegerField(default=0)
+    has_feedback = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Résumé de ticket"
+        verbose_name_plural = "Résumés de tickets"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['status_name', 'created_at']),
+            models.Index(fields=['category_name', 'created_at']),
+            models.Index(fields=['is_final', 'sla_deadline']),
+            models.Index(fields=['assigned_to_id', 'created_at']),
+            models.Index(fields=['is_psea', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"#{self.ticket_id} - {self.title}"
+
+    @property
+    def is_overdue(self):
+        if not self.sla_deadline or self.is_final:
+            return False
+        return timezone.now() > self.sla_deadline
+
+
+class TicketSignature(models.Model):
+    """Signature MinHash d'un ticket et rattachement à un groupe de quasi-doublons
+
+    ``duplicate_of`` désigne le premier ticket du groupe (``None`` pour ce
+    ticket lui-même). Maintenu par ``tickets.duplicates``.
+    """
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    signature = models.BinaryField()
+    duplicate_of = models.ForeignKey(
+        Ticket, on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates'
+    )
+    similarity = models.FloatField(null=True, blank=True, help_text="Similarité estimée avec le ticket d'origine")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Signature de ticket"
+        verbose_name_plural = "Signatures de tickets"
+
+    def __str__(self):
+        return f"Signature #{self.ticket_id}"
+
+
+class TicketBand(models.Model):
+    """Index LSH : une ligne par bande de la signature d'un ticket d'origine"""
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='lsh_bands')
+    key = models.BigIntegerField(help_text="Empreinte (numéro de bande, valeurs de la bande)")
+
+    class Meta:
+        verbose_name = "Bande LSH"
+        verbose_name_plural = "Bandes LSH"
+        indexes = [
+            models.Index(fields=['key']),
+        ]
+
+    def __str__(self):
+        return f"{self.key} -> #{self.ticket_id}"
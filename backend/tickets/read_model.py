@@ -0,0 +1,209 @@
+"""
+Maintenance du modèle de lecture des tickets (TicketSummary)
+
+Les écritures marquent les tickets concernés ; les lignes sont recalculées en
+un seul lot à la validation de la transaction (une requête de lecture, un
+upsert ``bulk_create(update_conflicts=True)``). Hors transaction, le recalcul
+est immédiat. La charge des agents (``workload``) suit les changements
+d'assignation et de finalité des lignes recalculées. Les renommages de références (catégorie, priorité, statut,
+canal, utilisateur) sont propagés par un ``UPDATE`` direct.
+
+Le signal ``report_facts_changed`` signale les jours de création dont une
+colonne agrégée, filtrable (``TicketFilter``) ou lue par les règles de
+visibilité a changé, pour écarter les agrégats de rapports calculés sur ces
+jours.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import workload
+from .models import Feedback, Ticket, TicketSummary
+
+_local = threading.local()
+
+BATCH_SIZE = 500
+
+SUMMARY_FIELDS = [
+    field.name for field in TicketSummary._meta.concrete_fields
+    if not field.primary_key
+]
+
+# Colonnes dont dépendent les agrégats des rapports (analytics) : dimensions,
+# filtres de ``TicketFilter`` (sauf ceux jamais mis en cache, voir
+# ``analytics.services.VOLATILE_FILTERS``) et champs du prédicat de visibilité
+REPORT_FIELDS = (
+    'status_id', 'category_id', 'priority_id', 'channel_id', 'is_psea',
+    'assigned_to_id', 'is_anonymous', 'latitude', 'longitude',
+    'assigned_to_organization_id', 'created_by_organization_id',
+)
+
+# Arguments : ``days`` (dates locales de création), ``None`` pour toutes les lignes
+report_facts_changed = Signal()
+
+
+def build_summary(ticket):
+    """Ligne de lecture d'un ticket chargé avec ``summary_queryset``"""
+    assignee = ticket.assigned_to
+    return TicketSummary(
+        ticket_id=ticket.pk,
+        title=ticket.title,
+        category_id=ticket.category_id,
+        category_name=ticket.category.name,
+        priority_id=ticket.priority_id,
+        priority_name=ticket.priority.name,
+        priority_level=ticket.priority.level,
+        priority_color=ticket.priority.color,
+        status_id=ticket.status_id,
+        status_name=ticket.status.name,
+        status_color=ticket.status.color,
+        is_final=ticket.status.is_final,
+        channel_id=ticket.channel_id,
+        channel_name=ticket.channel.name,
+        assigned_to_id=ticket.assigned_to_id,
+        assigned_to_name=assignee.get_full_name() if assignee else '',
+        assigned_to_organization_id=assignee.organization_id if assignee else None,
+        created_by_organization_id=ticket.created_by.organization_id if ticket.created_by else None,
+        submitter_name=ticket.submitter_name,
+        submitter_phone=ticket.submitter_phone,
+        submitter_email=ticket.submitter_email,
+        is_anonymous=ticket.is_anonymous,
+        is_psea=ticket.is_psea,
+        latitude=ticket.latitude,
+        longitude=ticket.longitude,
+        sla_deadline=ticket.sla_deadline,
+        created_at=ticket.created_at,
+        updated_at=ticket.updated_at,
+        closed_at=ticket.closed_at,
+        response_count=ticket.response_total,
+        attachment_count=ticket.attachment_total,
+        has_feedback=ticket.has_feedback,
+    )
+
+
+def summary_queryset():
+    return Ticket.objects.select_related(
+        'category', 'priority', 'status', 'channel', 'assigned_to', 'created_by'
+    ).annotate(
+        response_total=Count('responses', distinct=True),
+        attachment_total=Count('files', distinct=True),
+        has_feedback=Exists(Feedback.objects.filter(ticket=OuterRef('pk'))),
+    ).order_by()
+
+
+def refresh(ticket_ids):
+    """Recalculer les lignes de lecture des tickets donnés"""
+    ids = list(set(ticket_ids))
+    days = set()
+    for i in range(0, len(ids), BATCH_SIZE):
+        batch = ids[i:i + BATCH_SIZE]
+        summaries = [build_summary(ticket) for ticket in summary_queryset().filter(pk__in=batch)]
+        if summaries:
+            rows = TicketSummary.objects.filter(ticket_id__in=batch).values(
+                'ticket_id', 'is_final', 'created_at', *REPORT_FIELDS
+            )
+            previous, facts = {}, {}
+            for row in rows:
+                previous[row['ticket_id']] = (row['assigned_to_id'], row['is_final'])
+                facts[row['ticket_id']] = _report_facts(row['created_at'], *(row[name] for name in REPORT_FIELDS))
+            TicketSummary.objects.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['ticket'],
+                update_fields=SUMMARY_FIELDS,
+            )
+            workload.apply(workload.changes(previous, summaries))
+            for summary in summaries:
+                old = facts.get(summary.ticket_id)
+                new = _report_facts(summary.created_at, *(getattr(summary, name) for name in REPORT_FIELDS))
+                if old != new:
+                    days.update(row[0] for row in (old, new) if row)
+    if days:
+        report_facts_changed.send(sender=TicketSummary, days=days)
+    return len(ids)
+
+
+def _report_facts(created_at, *values):
+    """Jour local de création et dimensions des rapports d'une ligne"""
+    return (timezone.localtime(created_at).date(), *values)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Reconstruire tout le modèle de lecture ; retourne le nombre de lignes"""
+    count = 0
+    ids = Ticket.objects.order_by().values_list('pk', flat=True)
+    batch = []
+    for pk in ids.iterator(chunk_size=batch_size):
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            count += refresh(batch)
+            batch = []
+    if batch:
+        count += refresh(batch)
+    return count
+
+
+class _PendingRefresh:
+    """Tickets à recalculer à la validation de la transaction en cours"""
+
+    def __init__(self):
+        self.ids = set()
+
+    def __call__(self):
+        if getattr(_local, 'pending', None) is self:
+            _local.pending = None
+        refresh(self.ids)
+
+
+def _registered(connection, callback):
+    # Les rappels d'un bloc annulé sont retirés de ``run_on_commit``
+    return any(item[1] is callback for item in connection.run_on_commit)
+
+
+def schedule_refresh(ticket_ids):
+    """Marquer des tickets à recalculer (en un lot à la validation)"""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh(ticket_ids)
+        return
+
+    pending = getattr(_local, 'pending', None)
+    if pending is None or not _registered(connection, pending):
+        pending = _local.pending = _PendingRefresh()
+        transaction.on_commit(pending)
+    pending.ids.update(ticket_ids)
+
+
+# Propagation des références -------------------------------------------------
+
+def rename_reference(field, pk, **values):
+    """Propager la modification d'une référence (ex. ``category``) aux lignes"""
+    rows = TicketSummary.objects.filter(**{f'{field}_id': pk})
+    name = f'{field}_name'
+    renamed = name in values and rows.exclude(**{name: values[name]}).exists()
+    rows.update(**values)
+    if renamed:
+        # Les rapports agrègent et filtrent par nom : tous les jours sont concernés
+        report_facts_changed.send(sender=TicketSummary, days=None)
+
+
+def update_user(user):
+    """Propager le nom et l'organisation d'un utilisateur"""
+    organization_id = user.organization_id
+    assigned = TicketSummary.objects.filter(assigned_to_id=user.pk)
+    created = TicketSummary.objects.filter(ticket__created_by_id=user.pk)
+    # L'organisation entre dans les règles de visibilité des rapports
+    moved = (
+        assigned.exclude(assigned_to_organization_id=organization_id).exists()
+        or created.exclude(created_by_organization_id=organization_id).exists()
+    )
+    assigned.update(
+        assigned_to_name=user.get_full_name(),
+        assigned_to_organization_id=organization_id,
+    )
+    created.update(created_by_organization_id=organization_id)
+    if moved:
+        report_facts_changed.send(sender=TicketSummary, days=None)
@@ -3,12 +3,15 @@ Sérialiseurs pour l'API des tickets
 """
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from django.core.files.storage import default_storage
-from django.utils import timezone
 from .models import (
     Category, Priority, Status, Channel, Ticket, 
-    Response, TicketLog, Feedback
+    Response, TicketLog, Feedback, Upload, TicketSummary
 )
+from .attachments import attach_files, serialize_attachment
+from .uploads import UploadError, attach_uploads, max_upload_size
+from .audit import log_ticket_action, ticket_audit
+from . import classification
+from users.visibility import filter_tickets
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -99,47 +102,50 @@ class TicketSerializer(serializers.ModelSerializer):
     responses = ResponseSerializer(many=True, read_only=True)
     logs = TicketLogSerializer(many=True, read_only=True)
     feedback = FeedbackSerializer(read_only=True)
+    attachments = serializers.SerializerMethodField()
 
     class Meta:
         model = Ticket
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at', 'closed_at']
 
+    def get_attachments(self, obj):
+        files = obj.files.all()
+        if files:
+            return [serialize_attachment(attachment) for attachment in files]
+        # Tickets antérieurs : liste JSON historique
+        return obj.attachments
+
     def create(self, validated_data):
-        # Log de création
         # Extraire les fichiers avant la création
         uploaded_files = validated_data.pop('attachments', [])
 
         ticket = super().create(validated_data)
 
-        # Sauvegarder les fichiers et renseigner ticket.attachments (liste de dicts)
-        if uploaded_files:
-            saved = []
-            for f in uploaded_files:
-                # Dossier par date pour éviter collisions
-                path = default_storage.save(f"tickets/{timezone.now().date()}/{f.name}", f)
-                saved.append({
-                    'name': f.name,
-                    'path': path,
-                    'size': getattr(f, 'size', None),
-                    'content_type': getattr(f, 'content_type', None),
-                })
-            ticket.attachments = saved
-            ticket.save(update_fields=['attachments'])
         request = self.context.get('request')
-        user = request.user if request and request.user.is_authenticated else None
-        ip_address = request.META.get('REMOTE_ADDR') if request else None
-        
-        TicketLog.objects.create(
-            ticket=ticket,
-            action='created',
-            user=user,
-            description=f"Ticket créé via {ticket.channel.name}",
-            ip_address=ip_address
+        if uploaded_files:
+            user = request.user if request and request.user.is_authenticated else None
+            attach_files(ticket, uploaded_files, user=user)
+
+        # Log de création
+        log_ticket_action(
+            ticket, 'created',
+            f"Ticket créé via {ticket.channel.name}",
+            request=request
         )
         return ticket
 
 
+class TicketSummarySerializer(serializers.ModelSerializer):
+    """Ligne compacte du modèle de lecture"""
+    id = serializers.UUIDField(source='ticket_id', read_only=True)
+    is_overdue = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = TicketSummary
+        exclude = ['ticket']
+
+
 class TicketCreateSerializer(serializers.ModelSerializer):
     """Sérialiseur simplifié pour la création de tickets"""
     # Pièces jointes envoyées en multipart/form-data
@@ -148,37 +154,76 @@ class TicketCreateSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
+    # Pièces jointes déjà envoyées par morceaux (voir UploadViewSet)
+    uploads = serializers.ListField(
+        child=serializers.UUIDField(),
+        write_only=True,
+        required=False
+    )
     class Meta:
         model = Ticket
         fields = [
             'title', 'content', 'is_anonymous', 'category', 'priority',
             'channel', 'external_id', 'submitter_name', 'submitter_phone',
             'submitter_email', 'submitter_location', 'latitude', 'longitude',
-            'tags', 'metadata', 'attachments'
+            'tags', 'metadata', 'attachments', 'uploads'
         ]
+        # Catégorie déduite du contenu si absente (tickets.classification)
+        extra_kwargs = {'category': {'required': False}}
 
     def create(self, validated_data):
+        # Classification automatique (catégorie, priorité, PSEA) si non fournies
+        result = None
+        if classification.is_enabled():
+            result = classification.apply_to_data(validated_data)
+        fallback = []
+        if not validated_data.get('category'):
+            validated_data['category'] = classification.default_category()
+            if validated_data['category'] is None:
+                raise serializers.ValidationError({'category': 'Ce champ est obligatoire.'})
+            fallback.append('category')
+
         # Définir des valeurs par défaut
         if not validated_data.get('priority'):
             validated_data['priority'] = Priority.objects.filter(level=3).first()
+            fallback.append('priority')
+        if fallback:
+            validated_data['metadata'] = classification.mark_fallback(
+                dict(validated_data.get('metadata') or {}), fallback
+            )
         
         if not validated_data.get('status'):
             validated_data['status'] = Status.objects.filter(name='Ouvert').first()
 
+        # Les fichiers sont stockés à part, pas dans le champ JSON du ticket
+        uploaded_files = validated_data.pop('attachments', [])
+        upload_ids = validated_data.pop('uploads', [])
+
         ticket = super().create(validated_data)
-        
-        # Log de création
+
         request = self.context.get('request')
         user = request.user if request and request.user.is_authenticated else None
-        ip_address = request.META.get('REMOTE_ADDR') if request else None
-        
-        TicketLog.objects.create(
-            ticket=ticket,
-            action='created',
-            user=user,
-            description=f"Ticket créé via {ticket.channel.name}",
-            ip_address=ip_address
+        if uploaded_files:
+            attach_files(ticket, uploaded_files, user=user)
+        if upload_ids:
+            try:
+                attach_uploads(ticket, upload_ids, user=user)
+            except UploadError as e:
+                raise serializers.ValidationError({'uploads': str(e)})
+
+        # Log de création
+        log_ticket_action(
+            ticket, 'created',
+            f"Ticket créé via {ticket.channel.name}",
+            request=request
         )
+
+        # Contenu PSEA détecté : escalade immédiate
+        if result is not None and result.is_psea:
+            contact = classification.escalate_psea([ticket.pk]).get(ticket.pk)
+            if contact:
+                ticket.psea_escalated = True
+                ticket.psea_contact = ticket.escalated_to = contact
         
         return ticket
 
@@ -197,46 +242,79 @@ class TicketUpdateSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         old_status = instance.status
         old_priority = instance.priority
+        old_category = instance.category
         old_assigned = instance.assigned_to
         
         ticket = super().update(instance, validated_data)
+
+        # Catégorie ou priorité choisie par un agent : de nouveau une étiquette
+        classification.confirm_fields(ticket, [
+            name for name, old in (('category', old_category), ('priority', old_priority))
+            if old != getattr(ticket, name)
+        ])
         
-        # Log des changements
-        request = self.context.get('request')
-        user = request.user if request and request.user.is_authenticated else None
-        ip_address = request.META.get('REMOTE_ADDR') if request else None
-        
-        if old_status != ticket.status:
-            TicketLog.objects.create(
-                ticket=ticket,
-                action='status_changed',
-                user=user,
-                description=f"Statut changé de {old_status} à {ticket.status}",
-                old_value=str(old_status),
-                new_value=str(ticket.status),
-                ip_address=ip_address
-            )
-        
-        if old_priority != ticket.priority:
-            TicketLog.objects.create(
-                ticket=ticket,
-                action='priority_changed',
-                user=user,
-                description=f"Priorité changée de {old_priority} à {ticket.priority}",
-                old_value=str(old_priority),
-                new_value=str(ticket.priority),
-                ip_address=ip_address
-            )
-        
-        if old_assigned != ticket.assigned_to:
-            TicketLog.objects.create(
-                ticket=ticket,
-                action='assigned',
-                user=user,
-                description=f"Ticket assigné à {ticket.assigned_to or 'Personne'}",
-                old_value=str(old_assigned) if old_assigned else '',
-                new_value=str(ticket.assigned_to) if ticket.assigned_to else '',
-                ip_address=ip_address
-            )
+        # Log des changements (écrits en un seul lot à la validation)
+        with ticket_audit(self.context.get('request')) as audit:
+            if old_status != ticket.status:
+                audit.add(
+                    ticket, 'status_changed',
+                    f"Statut changé de {old_status} à {ticket.status}",
+                    old_value=str(old_status),
+                    new_value=str(ticket.status)
+                )
+            
+            if old_priority != ticket.priority:
+                audit.add(
+                    ticket, 'priority_changed',
+                    f"Priorité changée de {old_priority} à {ticket.priority}",
+                    old_value=str(old_priority),
+                    new_value=str(ticket.priority)
+                )
+            
+            if old_assigned != ticket.assigned_to:
+                audit.add(
+                    ticket, 'assigned',
+                    f"Ticket assigné à {ticket.assigned_to or 'Personne'}",
+                    old_value=str(old_assigned) if old_assigned else '',
+                    new_value=str(ticket.assigned_to) if ticket.assigned_to else ''
+                )
         
         return ticket
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    """Envoi de fichier par morceaux"""
+    class Meta:
+        model = Upload
+        fields = [
+            'id', 'purpose', 'filename', 'content_type', 'size', 'offset',
+            'checksum', 'status', 'ticket', 'attachment', 'sha256', 'result',
+            'created_at', 'expires_at'
+        ]
+        read_only_fields = [
+            'id', 'offset', 'status', 'attachment', 'sha256', 'result',
+            'created_at', 'expires_at'
+        ]
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("La taille doit être positive")
+        if value > max_upload_size():
+            raise serializers.ValidationError(f"Taille limitée à {max_upload_size()} octets")
+        return value
+
+    def validate_ticket(self, value):
+        """Seuls les tickets visibles par le demandeur peuvent recevoir un envoi"""
+        request = self.context.get('request')
+        user = request.user if request else None
+        if value is not None and not filter_tickets(Ticket.objects.filter(pk=value.pk), user).exists():
+            raise serializers.ValidationError("Ticket introuvable")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get('purpose') == 'import':
+            if not attrs['filename'].lower().endswith('.csv'):
+                raise serializers.ValidationError({'filename': 'Le fichier doit être au format CSV'})
+            if attrs.get('ticket'):
+                raise serializers.ValidationError({'ticket': "Un import n'est pas rattaché à un ticket"})
+        return attrs
@@ -0,0 +1,117 @@
+"""
+Signaux de l'application tickets
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Role
+
+from . import duplicates, read_model, workload
+from .assignment import engine as assignment_engine
+from .classification import classifier_registry
+from .models import Attachment, Category, Channel, Feedback, Priority, Response, Status, Ticket
+
+# Champs utilisateur recopiés dans le modèle de lecture
+USER_SUMMARY_FIELDS = {'first_name', 'last_name', 'organization', 'organization_id'}
+
+# Champs utilisateur qui décident de l'éligibilité à l'assignation automatique
+USER_ASSIGNMENT_FIELDS = {'is_active', 'role', 'role_id', 'organization', 'organization_id', 'language'}
+
+
+@receiver(post_save, sender=Ticket)
+def refresh_ticket_summary(sender, instance, raw=False, **kwargs):
+    """Recalculer la ligne de lecture d'un ticket enregistré"""
+    if not raw:
+        read_model.schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Ticket)
+def index_ticket_duplicates(sender, instance, created, raw=False, **kwargs):
+    """Rechercher les quasi-doublons d'un nouveau ticket (après validation)"""
+    if created and not raw:
+        duplicates.schedule_indexing([instance.pk])
+
+
+@receiver(post_delete, sender=Ticket)
+def release_ticket_workload(sender, instance, **kwargs):
+    """Décompter un ticket ouvert supprimé de la charge de son agent"""
+    if instance.assigned_to_id and not instance.status.is_final:
+        user_id = str(instance.assigned_to_id)
+        transaction.on_commit(lambda: workload.apply({user_id: -1}))
+
+
+@receiver([post_save, post_delete], sender=Response)
+@receiver([post_save, post_delete], sender=Feedback)
+@receiver([post_save, post_delete], sender=Attachment)
+def refresh_ticket_counters(sender, instance, raw=False, **kwargs):
+    """Mettre à jour les compteurs du ticket parent"""
+    if not raw:
+        read_model.schedule_refresh([instance.ticket_id])
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Priority)
+def invalidate_classifier(sender, raw=False, **kwargs):
+    """Recompiler les vocabulaires de classification après validation"""
+    if not raw:
+        transaction.on_commit(classifier_registry.reload)
+
+
+@receiver(post_save, sender=Category)
+def rename_category(sender, instance, raw=False, **kwargs):
+    if not raw:
+        read_model.rename_reference('category', instance.pk, category_name=instance.name)
+
+
+@receiver(post_save, sender=Priority)
+def rename_priority(sender, instance, raw=False, **kwargs):
+    if not raw:
+        read_model.rename_reference(
+            'priority', instance.pk,
+            priority_name=instance.name, priority_level=instance.level, priority_color=instance.color
+        )
+
+
+@receiver(post_save, sender=Status)
+def rename_status(sender, instance, raw=False, **kwargs):
+    if not raw:
+        read_model.rename_reference(
+            'status', instance.pk,
+            status_name=instance.name, status_color=instance.color, is_final=instance.is_final
+        )
+        # ``is_final`` a pu changer pour tous les tickets du statut
+        transaction.on_commit(workload.reconcile)
+
+
+@receiver(post_save, sender=Channel)
+def rename_channel(sender, instance, raw=False, **kwargs):
+    if not raw:
+        read_model.rename_reference('channel', instance.pk, channel_name=instance.name)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_user_summary(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Propager le nom et l'organisation (ignoré pour last_login, etc.)"""
+    if raw or created:
+        return
+    if update_fields is not None and not USER_SUMMARY_FIELDS & set(update_fields):
+        return
+    read_model.update_user(instance)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_assignment_agents(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Recharger les agents assignables après validation"""
+    if raw:
+        return
+    if update_fields is not None and not USER_ASSIGNMENT_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(assignment_engine.bump_agents_version)
+
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_assignment_roles(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(assignment_engine.bump_agents_version)
@@ -0,0 +1,92 @@
+"""
+Tâches asynchrones des tickets
+"""
+import csv
+import io
+import logging
+
+from celery import shared_task
+from django.core.files.storage import default_storage
+
+from .attachments import process_pending, stale_pending_ids
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_attachments(attachment_ids):
+    """Produire miniatures et métadonnées des pièces jointes"""
+    return process_pending(attachment_ids)
+
+
+@shared_task
+def process_stale_attachments():
+    """Traiter les pièces jointes dont la planification a été perdue"""
+    return process_pending(stale_pending_ids())
+
+
+@shared_task
+def import_upload(upload_id):
+    """Importer les tickets d'un fichier CSV envoyé par morceaux"""
+    from .import_views import import_rows
+    from .models import Upload
+
+    upload = Upload.objects.get(pk=upload_id)
+    try:
+        with default_storage.open(upload.path, 'rb') as f:
+            csv_reader = csv.DictReader(io.TextIOWrapper(f, encoding='utf-8'))
+            imported_count, errors = import_rows(csv_reader)
+    except Exception as e:
+        logger.error(f"Erreur d'import de l'envoi {upload_id}: {e}")
+        upload.status = 'failed'
+        upload.result = {'error': str(e)[:200]}
+    else:
+        upload.status = 'complete'
+        upload.result = {'imported_count': imported_count, 'errors': errors}
+    upload.save(update_fields=['status', 'result', 'updated_at'])
+    return upload.result
+
+
+@shared_task
+def purge_expired_uploads():
+    """Supprimer les envois expirés et leurs fichiers temporaires"""
+    from .uploads import purge_expired
+
+    return purge_expired()
+
+
+@shared_task
+def backfill_ticket_predictions(limit=None):
+    """Classer les tickets ouverts non classés avec le modèle statistique publié"""
+    from .triage import ModelError, backfill
+
+    try:
+        return backfill(limit=limit)
+    except ModelError as e:
+        logger.warning(f"Prédiction des tickets non classés impossible: {e}")
+        return None
+
+
+@shared_task
+def index_ticket_duplicates(ticket_ids):
+    """Signer des tickets créés et les rattacher à leur groupe de quasi-doublons"""
+    from .duplicates import index_tickets
+
+    return index_tickets(ticket_ids)
+
+
+@shared_task
+def assign_ticket_backlog(limit=None):
+    """Répartir les tickets ouverts non assignés entre les agents les moins chargés"""
+    from .assignment import assign_backlog
+    from .models import Ticket
+
+    return assign_backlog(Ticket.objects.all(), limit=limit)
+
+
+@shared_task
+def reconcile_workloads():
+    """Recalculer les compteurs de charge des agents depuis la base"""
+    from .workload import reconcile
+
+    return len(reconcile())
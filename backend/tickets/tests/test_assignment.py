@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from tickets import workload
+from tickets.assignment import AssignmentEngine, LoadHeap
+from tickets.models import Category, Channel, Priority, Status, Ticket
+from users.models import Role, User
+
+
+class WorkloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_changes(self):
+        summaries = [
+            SimpleNamespace(ticket_id=1, assigned_to_id='b', is_final=False),
+            SimpleNamespace(ticket_id=2, assigned_to_id='a', is_final=True),
+            SimpleNamespace(ticket_id=3, assigned_to_id='a', is_final=False),
+        ]
+        previous = {1: ('a', False), 2: ('a', False), 3: ('a', False)}
+        self.assertEqual(workload.changes(previous, summaries), {'a': -2, 'b': 1})
+
+    def test_changed_since(self):
+        workload.reconcile()
+        start = workload.version()
+        workload.apply({'a': 1})
+        workload.apply({'b': 2, 'a': -1})
+        self.assertEqual(workload.changed_since(start, workload.version()), {'a', 'b'})
+        self.assertEqual(workload.loads(['a', 'b']), {'a': 0, 'b': 2})
+        # Une reconstruction ne publie pas de liste : tout relire
+        workload.reconcile()
+        self.assertIsNone(workload.changed_since(start, workload.version()))
+        self.assertIsNone(workload.changed_since(None, workload.version()))
+
+    def test_heap(self):
+        heap = LoadHeap({'a': 1, 'b': 0, 'c': 0})
+        self.assertEqual(heap.peek(), ('b', 0))
+        heap.add('b')
+        self.assertEqual(heap.peek(), ('c', 0))
+        heap.set('c', 5)
+        self.assertEqual(heap.peek(), ('a', 1))
+        heap.set('a', 9)
+        self.assertEqual(heap.peek(), ('b', 1))
+
+
+class AssignmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.status = Status.objects.create(name='Ouvert')
+        cls.category = Category.objects.create(name='Information')
+        cls.priority = Priority.objects.create(name='Moyenne', level=3, sla_hours=48)
+        cls.channel = Channel.objects.create(name='Web', type='web')
+        agent = Role.objects.create(name='Agent', permissions=['edit_tickets'])
+        psea = Role.objects.create(name='PSEA', permissions=['edit_tickets'], is_psea_authorized=True)
+        manager = Role.objects.create(name='Manager', can_assign=True, permissions=['view_tickets'])
+        cls.agent = User.objects.create_user('agent', password='x', role=agent)
+        cls.psea = User.objects.create_user('psea', password='x', role=psea)
+        cls.manager = User.objects.create_user('manager', password='x', role=manager)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def ticket(self, **kwargs):
+        return Ticket.objects.create(
+            title='Ticket', content='Contenu', category=self.category, priority=self.priority,
+            status=self.status, channel=self.channel, **kwargs
+        )
+
+    def test_anonymous_is_forbidden(self):
+        ticket = self.ticket()
+        self.assertEqual(self.client.get('/api/v1/tickets/workload/').status_code, 403)
+        self.assertEqual(self.client.post('/api/v1/tickets/auto_assign/', {}, format='json').status_code, 403)
+        response = self.client.post(f'/api/v1/tickets/{ticket.pk}/assign/', {'assigned_to': 'auto'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_ids_are_rejected(self):
+        self.client.force_authenticate(self.manager)
+        response = self.client.post('/api/v1/tickets/auto_assign/', {'ids': ['not-a-uuid']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_pick_least_loaded(self):
+        engine = AssignmentEngine()
+        workload.reconcile()
+        workload.apply({str(self.agent.pk): 2})
+        self.assertEqual(engine.pick((False, None, None)), str(self.psea.pk))
+        # PSEA : seul le rôle habilité est éligible, quelle que soit sa charge
+        self.assertEqual(engine.pick((True, None, None)), str(self.psea.pk))
+        self.assertEqual(engine.pick((True, None, None)), str(self.psea.pk))
+
+    def test_changes_update_heaps_in_place(self):
+        engine = AssignmentEngine()
+        workload.reconcile()
+        self.assertEqual(engine.pick((False, None, None)), str(self.agent.pk))
+        heap = engine._heaps[(False, None, None)]
+        # L'assignation validée met à jour le compteur partagé
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket(assigned_to=self.agent)
+        workload.apply({str(self.psea.pk): 3})
+        self.assertEqual(engine.pick((False, None, None)), str(self.agent.pk))
+        self.assertIs(engine._heaps[(False, None, None)], heap)
+        self.assertEqual(heap.loads, {str(self.agent.pk): 2, str(self.psea.pk): 3})
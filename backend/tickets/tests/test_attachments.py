@@ -0,0 +1,56 @@
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from tickets import attachments
+from tickets.models import Attachment, Category, Channel, Priority, Status, Ticket
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AttachmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ticket = Ticket.objects.create(
+            title='Ticket', content='...',
+            category=Category.objects.create(name='Information'),
+            priority=Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            status=Status.objects.create(name='Ouvert'),
+            channel=Channel.objects.create(name='Web', type='web'),
+        )
+
+    def file(self, data):
+        return ContentFile(data, name='photo.jpg')
+
+    def test_rollback_removes_new_blobs(self):
+        _, kept, _ = attachments.store_file(self.file(b'deja stocke'))
+        with self.assertRaises(RuntimeError):
+            with attachments.discard_on_rollback(), transaction.atomic():
+                attachments.attach_files(self.ticket, [self.file(b'deja stocke'), self.file(b'nouveau')])
+                raise RuntimeError
+        new = attachments.content_path(attachments.hash_file(self.file(b'nouveau'))[0], 'photo.jpg')
+        self.assertFalse(default_storage.exists(new))
+        # Fichier écrit avant le bloc : conservé
+        self.assertTrue(default_storage.exists(kept))
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_nested_block_hands_blobs_to_outer(self):
+        with self.assertRaises(RuntimeError):
+            with attachments.discard_on_rollback():
+                with attachments.discard_on_rollback():
+                    _, path, _ = attachments.store_file(self.file(b'imbrique'))
+                self.assertTrue(default_storage.exists(path))
+                raise RuntimeError
+        self.assertFalse(default_storage.exists(path))
+
+    def test_broker_failure_does_not_raise(self):
+        with mock.patch('tickets.tasks.process_attachments.delay', side_effect=ConnectionError):
+            with self.captureOnCommitCallbacks(execute=True):
+                (attachment,) = attachments.attach_files(self.ticket, [self.file(b'contenu')])
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.status, 'pending')
+        Attachment.objects.filter(pk=attachment.pk).update(created_at=attachment.created_at - attachments.STALE_DELAY * 2)
+        self.assertEqual(attachments.stale_pending_ids(), [str(attachment.pk)])
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.test import TestCase
+
+from tickets.audit import ticket_audit
+from tickets.models import Category, Channel, Priority, Status, Ticket, TicketLog
+
+
+class TicketAuditTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ticket = Ticket.objects.create(
+            title='Ticket', content='Contenu',
+            category=Category.objects.create(name='Information'),
+            priority=Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            status=Status.objects.create(name='Ouvert'),
+            channel=Channel.objects.create(name='Web', type='web'),
+        )
+
+    def descriptions(self):
+        return sorted(TicketLog.objects.filter(ticket=self.ticket).values_list('description', flat=True))
+
+    def test_nested_blocks_are_written_together(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with ticket_audit() as outer:
+                outer.add(self.ticket, 'updated', 'externe')
+                with ticket_audit() as inner:
+                    inner.add(self.ticket, 'updated', 'interne')
+                self.assertEqual(TicketLog.objects.count(), 0)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.descriptions(), ['externe', 'interne'])
+
+    def test_rolled_back_savepoint_is_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic(), ticket_audit() as outer:
+                outer.add(self.ticket, 'updated', 'externe')
+                try:
+                    with transaction.atomic():
+                        with ticket_audit() as inner:
+                            inner.add(self.ticket, 'updated', 'annulé')
+                        # Le bloc d'audit est sorti normalement, le point de sauvegarde échoue ensuite
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                with transaction.atomic(), ticket_audit() as kept:
+                    kept.add(self.ticket, 'updated', 'validé')
+        self.assertEqual(self.descriptions(), ['externe', 'validé'])
+
+    def test_failed_block_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with ticket_audit() as outer:
+                outer.add(self.ticket, 'updated', 'externe')
+                try:
+                    with ticket_audit() as inner:
+                        inner.add(self.ticket, 'updated', 'échec')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+        self.assertEqual(self.descriptions(), ['externe'])
@@ -0,0 +1,79 @@
+import uuid
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from tickets.models import Category, Channel, Priority, Status, Ticket
+from users.models import Role, User
+
+URL = '/api/v1/tickets/bulk/'
+
+
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.open = Status.objects.create(name='Ouvert')
+        Status.objects.create(name='Fermé', is_final=True)
+        cls.ticket = Ticket.objects.create(
+            title='Ticket', content='Contenu',
+            category=Category.objects.create(name='Information'),
+            priority=Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            status=cls.open,
+            channel=Channel.objects.create(name='Web', type='web'),
+        )
+        agent = Role.objects.create(name='Agent', permissions=['view_tickets', 'edit_tickets'])
+        manager = Role.objects.create(name='Manager', can_close=True, can_assign=True,
+                                      permissions=['edit_tickets'])
+        cls.agent = User.objects.create_user('agent', password='x', role=agent)
+        cls.manager = User.objects.create_user('manager', password='x', role=manager)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_anonymous_is_forbidden(self):
+        response = self.client.post(URL, {'action': 'close', 'filters': {}}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, self.open)
+
+    def test_role_flag_is_required(self):
+        self.client.force_authenticate(self.agent)
+        response = self.client.post(URL, {'action': 'close', 'ids': [str(self.ticket.pk)]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_ids_are_rejected(self):
+        self.client.force_authenticate(self.manager)
+        for ids in (['not-a-uuid'], str(self.ticket.pk), [1]):
+            response = self.client.post(URL, {'action': 'close', 'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 400, ids)
+
+    def test_escalation_email_is_validated(self):
+        self.manager.role.can_escalate = True
+        self.manager.role.save()
+        self.client.force_authenticate(self.manager)
+        response = self.client.post(URL, {
+            'action': 'escalate', 'ids': [str(self.ticket.pk)], 'escalated_to': 'pas-un-email',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_close(self):
+        self.client.force_authenticate(self.manager)
+        missing = str(uuid.uuid4())
+        response = self.client.post(URL, {
+            'action': 'close', 'ids': [str(self.ticket.pk).upper(), missing],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], {str(self.ticket.pk): 'updated', missing: 'not_found'})
+        self.ticket.refresh_from_db()
+        self.assertTrue(self.ticket.status.is_final)
+
+    def test_assign_closed_ticket(self):
+        closed = Status.objects.get(name='Fermé')
+        Ticket.objects.filter(pk=self.ticket.pk).update(status=closed)
+        self.client.force_authenticate(self.manager)
+        response = self.client.post(URL, {
+            'action': 'assign', 'ids': [str(self.ticket.pk)], 'assigned_to': str(self.agent.pk),
+        }, format='json')
+        self.assertEqual(response.data['results'], {str(self.ticket.pk): 'updated'})
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.status, self.ticket.assigned_to), (closed, self.agent))
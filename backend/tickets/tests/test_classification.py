@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from tickets import classification
+from tickets.classification import Classifier, Matcher, compile_term, fold
+
+
+class MatcherTests(SimpleTestCase):
+    def test_overlapping_patterns(self):
+        matcher = Matcher()
+        for pattern in ('he', 'she', 'his', 'hers'):
+            matcher.add(pattern, pattern)
+        self.assertEqual(sorted(matcher.search('ushers')), ['he', 'hers', 'she'])
+        self.assertEqual(matcher.search('xyz'), [])
+
+    def test_patterns_added_after_build(self):
+        matcher = Matcher()
+        matcher.add('abc', 1)
+        self.assertEqual(matcher.search('zabcz'), [1])
+        matcher.add('bc', 2)
+        self.assertEqual(sorted(matcher.search('zabcz')), [1, 2])
+
+    def test_terms_match_whole_words(self):
+        self.assertEqual(fold("L'Abus  sexuel !"), ' l abus sexuel ')
+        matcher = Matcher()
+        matcher.add(compile_term('viol'), 'viol')
+        matcher.add(compile_term('harcel*'), 'harcel')
+        self.assertEqual(matcher.search(fold('violence')), [])
+        self.assertEqual(matcher.search(fold('un viol')), ['viol'])
+        self.assertEqual(matcher.search(fold('Harcèlement au travail')), ['harcel'])
+
+
+class ClassifierTests(SimpleTestCase):
+    def setUp(self):
+        category = lambda pk, name, sensitive=False: SimpleNamespace(
+            pk=pk, name=name, keywords=[], is_sensitive=sensitive
+        )
+        self.psea = category(1, 'PSEA', sensitive=True)
+        self.complaint = category(2, 'Complaint')
+        priorities = [SimpleNamespace(level=level) for level in (3, 4, 5)]
+        self.classifier = Classifier([self.psea, self.complaint], priorities, classification.DEFAULTS)
+
+    def test_category_and_priority(self):
+        result = self.classifier.classify('Plainte', 'aide jamais recu depuis 3 semaines')
+        self.assertEqual(result.category, self.complaint)
+        self.assertEqual(result.priority.level, 4)
+        self.assertFalse(result.is_psea)
+
+    def test_sensitive_category_wins(self):
+        result = self.classifier.classify('Plainte', 'probleme de retard et harcelement')
+        self.assertEqual(result.category, self.psea)
+        self.assertTrue(result.is_psea)
+        self.assertEqual(result.priority.level, 5)
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from tickets import duplicates
+from tickets.models import Category, Channel, Priority, Status, Ticket, TicketSignature
+
+CONFIG = dict(duplicates.DEFAULTS, ENABLED=False)
+
+TEXT = "Depuis trois semaines le point d'eau du quartier nord ne fonctionne plus et les familles doivent marcher loin"
+
+
+class MinHashTests(SimpleTestCase):
+    def setUp(self):
+        self.hasher = duplicates.MinHasher(CONFIG)
+
+    def test_signature(self):
+        self.assertIsNone(self.hasher.signature('merci beaucoup'))
+        signature = self.hasher.signature(TEXT)
+        self.assertEqual(len(signature), CONFIG['NUM_PERM'])
+        self.assertEqual(duplicates.unpack(duplicates.pack(signature)).tolist(), signature)
+        # Graine fixe : signature stable d'une instance à l'autre
+        self.assertEqual(duplicates.MinHasher(CONFIG).signature(TEXT), signature)
+
+    def test_numpy_and_python_agree(self):
+        if duplicates.np is None:
+            self.skipTest('NumPy non installé')
+        expected = self.hasher.signature(TEXT)
+        with mock.patch.object(duplicates, 'np', None):
+            self.assertEqual(self.hasher.signature(TEXT), expected)
+
+    def test_similarity_estimates_jaccard(self):
+        first = self.hasher.signature(TEXT)
+        near = self.hasher.signature(TEXT.replace('nord', 'Nord !'))
+        other = self.hasher.signature('La distribution de vivres a eu lieu hier au camp et tout le monde a été servi')
+        self.assertEqual(duplicates.similarity(first, near), 1.0)
+        self.assertLess(duplicates.similarity(first, other), 0.2)
+
+    def test_band_keys(self):
+        signature = self.hasher.signature(TEXT)
+        keys = self.hasher.band_keys(signature)
+        self.assertEqual(len(keys), CONFIG['BANDS'])
+        self.assertEqual(len(set(keys)), CONFIG['BANDS'])
+        # Une seule bande modifiée : les autres restent communes
+        changed = list(signature)
+        changed[0] += 1
+        self.assertEqual(len(set(keys) & set(self.hasher.band_keys(changed))), CONFIG['BANDS'] - 1)
+
+    def test_bands_must_divide_permutations(self):
+        with self.assertRaises(ValueError):
+            duplicates.MinHasher(dict(CONFIG, NUM_PERM=100))
+
+
+class IndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.references = {
+            'category': Category.objects.create(name='Information'),
+            'priority': Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            'status': Status.objects.create(name='Ouvert'),
+            'channel': Channel.objects.create(name='Web', type='web'),
+        }
+
+    def ticket(self, content):
+        return Ticket.objects.create(title='Eau', content=content, **self.references)
+
+    def test_duplicates_attach_to_origin(self):
+        with self.settings(DUPLICATE_DETECTION={'ENABLED': False}):
+            origin = self.ticket(TEXT)
+            copy = self.ticket(TEXT + ' !')
+            other = self.ticket('La distribution de vivres a eu lieu hier au camp et tout le monde a été servi')
+            short = self.ticket('ok')
+        stats = duplicates.index_tickets([origin.pk, copy.pk, other.pk, short.pk], CONFIG)
+        self.assertEqual(stats, {'indexed': 3, 'duplicates': 1, 'skipped': 1})
+        self.assertEqual(TicketSignature.objects.get(ticket=copy).duplicate_of_id, origin.pk)
+        self.assertIsNone(TicketSignature.objects.get(ticket=other).duplicate_of_id)
+        self.assertEqual(duplicates.group_of(copy), (origin.pk, [(copy.pk, 1.0)]))
+        # Déjà signés : ignorés
+        self.assertEqual(duplicates.index_tickets([copy.pk], CONFIG)['indexed'], 0)
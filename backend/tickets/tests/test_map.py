@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from tickets import geo
+from tickets.models import Category, Channel, Priority, Status, Ticket
+from users.models import User
+
+URL = '/api/v1/tickets/map/'
+
+
+class MapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        references = {
+            'category': Category.objects.create(name='Information'),
+            'priority': Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            'status': Status.objects.create(name='Ouvert'),
+            'channel': Channel.objects.create(name='Web', type='web'),
+        }
+        for lat, lng in (('14.70', '-17.40'), ('14.71', '-17.41'), ('12.60', '-8.00')):
+            Ticket.objects.create(title='Ticket', content='Contenu', latitude=Decimal(lat),
+                                  longitude=Decimal(lng), **references)
+        cls.admin = User.objects.create_superuser('admin', password='x')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_bbox_is_required(self):
+        self.assertEqual(self.client.get(URL, {'zoom': 5}).status_code, 400)
+
+    def test_zoom_is_clamped(self):
+        response = self.client.get(URL, {'zoom': 99, 'bbox': '-20,10,0,20'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['zoom'], geo.MAX_ZOOM)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(self.client.get(URL, {'zoom': -3, 'bbox': '-20,10,0,20'}).data['zoom'], geo.MIN_ZOOM)
+
+    def test_clusters_are_capped(self):
+        response = self.client.get(URL, {'zoom': 5, 'bbox': '-20,10,0,20'})
+        self.assertEqual([cluster['count'] for cluster in response.data['clusters']], [2, 1])
+        self.assertFalse(response.data['truncated'])
+        clusters = geo.cluster_tickets(Ticket.objects.all(), 5, limit=1)
+        self.assertEqual([cluster['count'] for cluster in clusters], [2])
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase
+
+from tickets import classification, triage
+from tickets.models import Category, Channel, Priority, Status, Ticket
+
+CONFIG = dict(triage.DEFAULTS, MIN_SAMPLES=10, MIN_DF=1, HOLDOUT=0, EPOCHS=30)
+
+
+class TriageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.status = Status.objects.create(name='Ouvert')
+        cls.default = Category.objects.create(name='Information')
+        cls.water = Category.objects.create(name='Eau')
+        cls.roads = Category.objects.create(name='Routes')
+        cls.priority = Priority.objects.create(name='Moyenne', level=3, sla_hours=48)
+        cls.channel = Channel.objects.create(name='Web', type='web')
+
+    def ticket(self, content, category, metadata=None):
+        return Ticket.objects.create(
+            title='Signalement', content=content, category=category, priority=self.priority,
+            status=self.status, channel=self.channel, metadata=metadata or {},
+        )
+
+    def test_fallback_fields(self):
+        metadata = classification.mark_fallback({}, ['priority', 'category'])
+        self.assertEqual(metadata['classification']['fallback'], ['category', 'priority'])
+        ticket = self.ticket('texte', self.default, metadata)
+        classification.confirm_fields(ticket, ['category'])
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.metadata['classification']['fallback'], ['priority'])
+
+    def test_fallback_labels_are_not_trained(self):
+        for i in range(20):
+            self.ticket(f'pas d eau potable au puits {i}', self.water)
+            self.ticket(f'la route est coupee {i}', self.roads)
+            # Catégorie par défaut : ne doit pas apprendre « eau » → Routes
+            self.ticket(f'pas d eau potable {i}', self.roads, classification.mark_fallback({}, ['category']))
+        model = triage.train(config=CONFIG)
+        self.assertEqual(model.metrics['category_samples'], 40)
+        self.assertNotIn('priority', model.targets)
+        (prediction,) = model.predict(['pas d eau potable'])
+        self.assertEqual(prediction['category'][0], self.water.pk)
+
+    def test_backfill_keeps_agent_edits(self):
+        edited = self.ticket('eau', self.default)
+        predicted = self.ticket('eau', self.default)
+        unsure = self.ticket('eau', self.default)
+
+        def predict(texts, batch_size=None):
+            # Un agent reclasse le ticket pendant l'évaluation
+            Ticket.objects.filter(pk=edited.pk).update(category=self.roads)
+            confidence = {edited.pk: 0.9, predicted.pk: 0.9, unsure.pk: 0.1}
+            return [{'category': (self.water.pk, confidence[pk])} for pk in order]
+
+        order = list(Ticket.objects.order_by('pk').values_list('pk', flat=True))
+        model = SimpleNamespace(version='v1', predict=predict)
+        with mock.patch.object(triage, 'get_model', return_value=model):
+            stats = triage.backfill()
+
+        self.assertEqual(stats['changed'], 1)
+        edited.refresh_from_db()
+        self.assertEqual(edited.category, self.roads)
+        self.assertEqual(edited.metadata, {})
+        for ticket, category in ((predicted, self.water), (unsure, self.default)):
+            ticket.refresh_from_db()
+            self.assertEqual(ticket.category, category)
+            self.assertEqual(ticket.metadata['classification']['model'], 'v1')
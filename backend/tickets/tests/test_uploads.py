@@ -0,0 +1,64 @@
+import hashlib
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from tickets.models import Category, Channel, Priority, Status, Ticket, Upload
+
+URL = '/api/v1/uploads/'
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), UPLOAD_TEMP_DIR=tempfile.mkdtemp())
+class UploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        references = {
+            'category': Category.objects.create(name='Information'),
+            'priority': Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            'status': Status.objects.create(name='Ouvert'),
+            'channel': Channel.objects.create(name='Web', type='web'),
+        }
+        cls.ticket = Ticket.objects.create(title='Public', content='...', **references)
+        cls.psea = Ticket.objects.create(title='PSEA', content='...', is_psea=True, **references)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def declare(self, data, ticket=None):
+        payload = {
+            'purpose': 'attachment', 'filename': 'photo.jpg', 'size': len(data),
+            'checksum': hashlib.sha256(data).hexdigest(),
+        }
+        if ticket is not None:
+            payload['ticket'] = str(ticket.pk)
+        return self.client.post(URL, payload, format='json')
+
+    def send(self, upload_id, offset, chunk):
+        return self.client.generic(
+            'PATCH', f'{URL}{upload_id}/', chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_hidden_ticket_is_rejected(self):
+        response = self.declare(b'data', ticket=self.psea)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ticket', response.data)
+        self.assertFalse(Upload.objects.exists())
+
+    def test_chunks_and_stale_offset(self):
+        data = b'0123456789' * 10
+        upload_id = self.declare(data, ticket=self.ticket).data['id']
+
+        self.assertEqual(self.send(upload_id, 0, data[:40]).status_code, 200)
+        # Morceau rejoué à un offset déjà dépassé
+        response = self.send(upload_id, 0, data[:40])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '40')
+
+        response = self.send(upload_id, 40, data[40:])
+        self.assertEqual(response.status_code, 200)
+        upload = Upload.objects.get(pk=upload_id)
+        self.assertEqual(upload.status, 'complete')
+        self.assertEqual(upload.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(upload.attachment.ticket_id, self.ticket.pk)
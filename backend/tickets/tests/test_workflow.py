@@ -0,0 +1,45 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from tickets.models import Category, Channel, Priority, Status, Ticket
+from tickets.workflow import Transition
+from users.models import Role, User
+
+
+class TransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.open = Status.objects.create(name='Ouvert')
+        cls.closed = Status.objects.create(name='Fermé', is_final=True)
+        cls.ticket = Ticket.objects.create(
+            title='Ticket', content='Contenu', status=cls.open,
+            category=Category.objects.create(name='Information'),
+            priority=Priority.objects.create(name='Moyenne', level=3, sla_hours=48),
+            channel=Channel.objects.create(name='Web', type='web'),
+        )
+        role = Role.objects.create(name='Manager', can_close=True, permissions=['all'])
+        cls.manager = User.objects.create_user('manager', password='x', role=role)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        self.url = f'/api/v1/tickets/{self.ticket.pk}/close/'
+
+    def test_transitions_must_describe_themselves(self):
+        with self.assertRaises(TypeError):
+            Transition('noop', 'updated')
+
+    def test_invalid_expected_status(self):
+        for value in ('abc', [1], True):
+            response = self.client.post(self.url, {'expected_status': value}, format='json')
+            self.assertEqual(response.status_code, 400, value)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, self.open)
+
+    def test_expected_status(self):
+        response = self.client.post(self.url, {'expected_status': str(self.closed.pk)}, format='json')
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(self.url, {'expected_status': str(self.open.pk)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, self.closed)
@@ -0,0 +1,528 @@
+"""
+Classifieur statistique des tickets (TF-IDF + régression logistique)
+
+Complément optionnel des règles de ``tickets.classification`` : un modèle
+linéaire entraîné hors ligne (commande ``train_ticket_classifier``) sur les
+couples texte/catégorie et texte/priorité des tickets classés par les agents.
+Les textes sont repliés comme pour les règles puis découpés en mots et
+bigrammes, pondérés en TF-IDF (tf logarithmique, lignes normalisées) ; une
+régression logistique multinomiale par cible est apprise par descente de
+gradient sur mini-lots, sur des matrices creuses NumPy (CPU uniquement).
+
+Le modèle est écrit dans un sous-répertoire versionné de ``MODEL_DIR`` puis
+publié en remplaçant atomiquement le fichier ``current``. Chaque processus le
+charge une fois (tableaux projetés en mémoire, donc partagés entre workers)
+et le recharge quand ``current`` change.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy est optionnel
+    np = None
+
+from . import read_model
+from .audit import ticket_audit
+from .classification import escalate_psea, fold
+from .models import Category, Priority, Ticket
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MODEL_DIR': None,
+    'NGRAMS': 2,
+    'MIN_DF': 2,
+    'MAX_FEATURES': 20000,
+    'MAX_SAMPLES': 200000,
+    'MIN_SAMPLES': 50,
+    'HOLDOUT': 0.1,
+    'EPOCHS': 15,
+    'LEARNING_RATE': 4.0,
+    'L2': 1e-5,
+    'BATCH_SIZE': 256,
+    'MIN_CONFIDENCE': 0.6,
+    'PREDICT_BATCH_SIZE': 1000,
+    'KEEP_VERSIONS': 3,
+}
+
+CURRENT_FILE = 'current'
+# Délai entre deux lectures du fichier ``current`` (secondes)
+CHECK_INTERVAL = 30
+TARGETS = ('category', 'priority')
+
+
+class ModelError(Exception):
+    """Modèle indisponible ou entraînement impossible"""
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'TICKET_TRIAGE_MODEL', {}))
+    return config
+
+
+def model_dir(config=None):
+    config = config or get_config()
+    return config['MODEL_DIR'] or os.path.join(settings.BASE_DIR, 'var', 'triage')
+
+
+def ticket_text(title, content):
+    return f"{title or ''} {content or ''}"
+
+
+def tokenize(text, ngrams=2):
+    """Mots repliés et n-grammes de mots"""
+    words = fold(text).split()
+    terms = list(words)
+    for n in range(2, ngrams + 1):
+        terms.extend(' '.join(words[i:i + n]) for i in range(len(words) - n + 1))
+    return terms
+
+
+# Algèbre creuse -----------------------------------------------------------
+
+class SparseRows:
+    """Matrice creuse par lignes (CSR) : ``indptr``, ``indices``, ``data``"""
+
+    def __init__(self, indptr, indices, data, n_features):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_features = n_features
+
+    @property
+    def n_rows(self):
+        return len(self.indptr) - 1
+
+    def row_ids(self):
+        return np.repeat(np.arange(self.n_rows), np.diff(self.indptr))
+
+    def take(self, rows):
+        """Sous-matrice des lignes ``rows`` (sans boucle Python)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        positions = np.arange(indptr[-1]) - np.repeat(indptr[:-1], lengths) + np.repeat(starts, lengths)
+        return SparseRows(indptr, self.indices[positions], self.data[positions], self.n_features)
+
+    def dot(self, weights):
+        """``X @ W`` (lignes × classes)"""
+        out = np.zeros((self.n_rows, weights.shape[1]), dtype=np.float64)
+        np.add.at(out, self.row_ids(), self.data[:, None] * weights[self.indices])
+        return out
+
+    def tdot(self, gradient):
+        """``Xᵀ @ G`` (variables × classes)"""
+        out = np.zeros((self.n_features, gradient.shape[1]), dtype=np.float64)
+        np.add.at(out, self.indices, self.data[:, None] * gradient[self.row_ids()])
+        return out
+
+
+def softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+class Vectorizer:
+    """Pondération TF-IDF sur un vocabulaire figé"""
+
+    def __init__(self, terms, idf, ngrams):
+        self.terms = list(terms)
+        self.vocabulary = {term: index for index, term in enumerate(self.terms)}
+        self.idf = idf
+        self.ngrams = ngrams
+
+    @classmethod
+    def fit(cls, texts, ngrams=2, min_df=2, max_features=20000):
+        df = Counter()
+        for text in texts:
+            df.update(set(tokenize(text, ngrams)))
+        terms = sorted((term for term, count in df.items() if count >= min_df),
+                       key=lambda term: (-df[term], term))[:max_features]
+        terms.sort()
+        counts = np.array([df[term] for term in terms], dtype=np.float64)
+        idf = np.log((1 + len(texts)) / (1 + counts)) + 1
+        return cls(terms, idf.astype(np.float32), ngrams)
+
+    def transform(self, texts):
+        vocabulary = self.vocabulary
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            counts = Counter(vocabulary[term] for term in tokenize(text, self.ngrams) if term in vocabulary)
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+
+        indptr = np.array(indptr, dtype=np.int64)
+        indices = np.array(indices, dtype=np.int64)
+        data = np.array(data, dtype=np.float64)
+        # tf logarithmique × idf, puis normalisation L2 de chaque ligne
+        data = (1 + np.log(data)) * self.idf[indices]
+        matrix = SparseRows(indptr, indices, data, len(self.terms))
+        rows = matrix.row_ids()
+        norms = np.sqrt(np.bincount(rows, weights=data ** 2, minlength=len(texts)))
+        data /= np.where(norms > 0, norms, 1)[rows]
+        return matrix
+
+
+class LinearModel:
+    """Régression logistique multinomiale"""
+
+    def __init__(self, classes, coef, bias):
+        self.classes = classes
+        self.coef = coef
+        self.bias = bias
+
+    @classmethod
+    def fit(cls, X, labels, config, seed=0):
+        classes = np.unique(labels)
+        targets = np.eye(len(classes))[np.searchsorted(classes, labels)]
+        coef = np.zeros((X.n_features, len(classes)))
+        bias = np.zeros(len(classes))
+        rng = np.random.default_rng(seed)
+        batch_size = config['BATCH_SIZE']
+
+        for epoch in range(config['EPOCHS']):
+            rate = config['LEARNING_RATE'] / np.sqrt(1 + epoch)
+            order = rng.permutation(X.n_rows)
+            for start in range(0, X.n_rows, batch_size):
+                rows = order[start:start + batch_size]
+                batch = X.take(rows)
+                error = softmax(batch.dot(coef) + bias) - targets[rows]
+                coef -= rate * (batch.tdot(error) / len(rows) + config['L2'] * coef)
+                bias -= rate * error.mean(axis=0)
+        return cls(classes, coef.astype(np.float32), bias.astype(np.float32))
+
+    def predict(self, X):
+        """Classes prédites et probabilités associées"""
+        proba = softmax(X.dot(self.coef) + self.bias)
+        best = proba.argmax(axis=1)
+        return self.classes[best], proba[np.arange(len(best)), best]
+
+
+# Modèle publié ------------------------------------------------------------
+
+class TriageModel:
+    """Vocabulaire TF-IDF et un modèle linéaire par cible (catégorie, priorité)"""
+
+    def __init__(self, version, vectorizer, targets, metrics=None, trained_at=None):
+        self.version = version
+        self.vectorizer = vectorizer
+        self.targets = targets
+        self.metrics = metrics or {}
+        self.trained_at = trained_at
+
+    def predict(self, texts, batch_size=None):
+        """``[{cible: (classe, probabilité)}]`` pour chaque texte, par lots vectorisés"""
+        batch_size = batch_size or get_config()['PREDICT_BATCH_SIZE']
+        results = [{} for _ in texts]
+        for start in range(0, len(texts), batch_size):
+            X = self.vectorizer.transform(texts[start:start + batch_size])
+            for name, model in self.targets.items():
+                labels, confidence = model.predict(X)
+                for offset, (label, proba) in enumerate(zip(labels.tolist(), confidence.tolist())):
+                    results[start + offset][name] = (label, round(proba, 3))
+        return results
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'idf.npy'), self.vectorizer.idf)
+        for name, model in self.targets.items():
+            np.save(os.path.join(path, f'{name}_coef.npy'), model.coef)
+            np.save(os.path.join(path, f'{name}_bias.npy'), model.bias)
+        meta = {
+            'version': self.version,
+            'trained_at': self.trained_at,
+            'ngrams': self.vectorizer.ngrams,
+            'terms': self.vectorizer.terms,
+            'targets': {name: model.classes.tolist() for name, model in self.targets.items()},
+            'metrics': self.metrics,
+        }
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        idf = np.load(os.path.join(path, 'idf.npy'), mmap_mode='r')
+        targets = {
+            name: LinearModel(
+                np.array(classes, dtype=np.int64),
+                np.load(os.path.join(path, f'{name}_coef.npy'), mmap_mode='r'),
+                np.load(os.path.join(path, f'{name}_bias.npy')),
+            )
+            for name, classes in meta['targets'].items()
+        }
+        vectorizer = Vectorizer(meta['terms'], idf, meta['ngrams'])
+        return cls(meta['version'], vectorizer, targets, meta.get('metrics'), meta.get('trained_at'))
+
+
+def current_version(config=None):
+    try:
+        with open(os.path.join(model_dir(config), CURRENT_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(model, config=None):
+    """Écrire le modèle puis le désigner comme courant (remplacement atomique)"""
+    config = config or get_config()
+    base = model_dir(config)
+    model.save(os.path.join(base, model.version))
+    pointer = os.path.join(base, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(model.version)
+    os.replace(pointer + '.tmp', pointer)
+
+    versions = sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+    for name in versions[:-config['KEEP_VERSIONS']]:
+        if name != model.version:
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+
+
+class ModelRegistry:
+    """Modèle courant, chargé une fois par processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self):
+        if np is None or not get_config()['ENABLED']:
+            return None
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < CHECK_INTERVAL:
+            return self._model
+
+        version = current_version()
+        with self._lock:
+            if version != self._version:
+                self._model = None
+                if version:
+                    try:
+                        self._model = TriageModel.load(os.path.join(model_dir(), version))
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.error(f"Modèle de classification {version} illisible: {e}")
+                self._version = version
+            self._checked_at = now
+            return self._model
+
+
+model_registry = ModelRegistry()
+
+
+def get_model():
+    return model_registry.get()
+
+
+# Entraînement -------------------------------------------------------------
+
+def training_queryset():
+    """Tickets classés par les agents (classification automatique exclue)
+
+    Les champs remplis par défaut (``classification.fallback``) sont en plus
+    écartés de leur cible dans ``train``.
+    """
+    return Ticket.objects.filter(
+        Q(metadata__classification__auto__isnull=True) | Q(metadata__classification__auto=False)
+    )
+
+
+def train(queryset=None, config=None):
+    """Entraîner un modèle ; la part ``HOLDOUT`` des tickets mesure la précision"""
+    if np is None:
+        raise ModelError("NumPy est requis pour entraîner le modèle")
+    config = config or get_config()
+    queryset = training_queryset() if queryset is None else queryset
+    rows = list(queryset.order_by('-created_at').values_list(
+        'title', 'content', 'category_id', 'priority__level', 'metadata__classification__fallback'
+    )[:config['MAX_SAMPLES']])
+    if len(rows) < config['MIN_SAMPLES']:
+        raise ModelError(f"Au moins {config['MIN_SAMPLES']} tickets requis ({len(rows)} disponibles)")
+
+    texts = [ticket_text(row[0], row[1]) for row in rows]
+    order = np.random.default_rng(0).permutation(len(rows))
+    holdout = int(len(rows) * config['HOLDOUT'])
+    test_rows, train_rows = order[:holdout], order[holdout:]
+
+    vectorizer = Vectorizer.fit(
+        [texts[i] for i in train_rows], config['NGRAMS'], config['MIN_DF'], config['MAX_FEATURES']
+    )
+    X = vectorizer.transform(texts)
+
+    targets = {}
+    metrics = {'samples': len(rows), 'features': len(vectorizer.terms)}
+    for column, name in enumerate(TARGETS, start=2):
+        labels = np.array([row[column] for row in rows], dtype=np.int64)
+        # Une valeur par défaut n'est pas une étiquette : ligne écartée pour cette cible
+        labelled = np.array([name not in (row[4] or ()) for row in rows], dtype=bool)
+        fit_rows, eval_rows = train_rows[labelled[train_rows]], test_rows[labelled[test_rows]]
+        if len(np.unique(labels[fit_rows])) < 2:
+            continue
+        model = LinearModel.fit(X.take(fit_rows), labels[fit_rows], config)
+        if len(eval_rows):
+            predicted, _ = model.predict(X.take(eval_rows))
+            metrics[f'{name}_accuracy'] = round(float((predicted == labels[eval_rows]).mean()), 3)
+        metrics[f'{name}_samples'] = len(fit_rows)
+        targets[name] = model
+    if not targets:
+        raise ModelError("Une seule catégorie et une seule priorité dans les données")
+
+    now = timezone.now()
+    return TriageModel(now.strftime('%Y%m%d%H%M%S'), vectorizer, targets, metrics, now.isoformat())
+
+
+# Prédiction ---------------------------------------------------------------
+
+def describe(predictions):
+    """Prédictions lisibles (identifiants, libellés et probabilités)"""
+    categories = dict(Category.objects.values_list('pk', 'name'))
+    priorities = {priority.level: priority for priority in Priority.objects.all()}
+    described = []
+    for prediction in predictions:
+        item = {}
+        if 'category' in prediction:
+            pk, confidence = prediction['category']
+            item['category'] = {'id': pk, 'name': categories.get(pk), 'confidence': confidence}
+        if 'priority' in prediction:
+            level, confidence = prediction['priority']
+            priority = priorities.get(level)
+            item['priority'] = {
+                'id': priority.pk if priority else None, 'level': level,
+                'name': priority.name if priority else None, 'confidence': confidence,
+            }
+        described.append(item)
+    return described
+
+
+def unclassified_queryset(model):
+    """Tickets ouverts sans catégorie déterminée, pas encore évalués par ce modèle"""
+    return Ticket.objects.filter(status__is_final=False).filter(
+        Q(metadata__classification__category__isnull=True) | Q(metadata__classification__category=None)
+    ).filter(
+        # Clé absente : la comparaison vaut NULL, d'où le test explicite
+        Q(metadata__classification__model__isnull=True) | ~Q(metadata__classification__model=model.version)
+    )
+
+
+def backfill(limit=None, config=None):
+    """Évaluer les tickets non classés par lots et appliquer les prédictions sûres
+
+    La catégorie n'est remplacée que si le ticket est dans la catégorie par
+    défaut, la priorité que si elle est au niveau par défaut, et seulement
+    au-delà de ``MIN_CONFIDENCE``. Retourne les compteurs.
+    """
+    from .classification import get_config as rules_config
+
+    model = get_model()
+    if model is None:
+        raise ModelError("Aucun modèle de classification publié")
+    config = config or get_config()
+    batch_size = config['PREDICT_BATCH_SIZE']
+    threshold = config['MIN_CONFIDENCE']
+    defaults = rules_config()
+    default_category = Category.objects.filter(name=defaults['DEFAULT_CATEGORY']).first()
+    categories = {category.pk: category for category in Category.objects.all()}
+    priorities = {priority.level: priority for priority in Priority.objects.all()}
+    stats = {'scored': 0, 'changed': 0, 'psea': 0}
+
+    queryset = unclassified_queryset(model).order_by('pk')
+    last_pk = None
+    while limit is None or stats['scored'] < limit:
+        batch = queryset.filter(pk__gt=last_pk) if last_pk else queryset
+        size = batch_size if limit is None else min(batch_size, limit - stats['scored'])
+        rows = list(batch.values(
+            'pk', 'title', 'content', 'category_id', 'priority_id', 'priority__level', 'is_psea', 'metadata'
+        )[:size])
+        if not rows:
+            break
+        last_pk = rows[-1]['pk']
+        stats['scored'] += len(rows)
+
+        predictions = model.predict([ticket_text(row['title'], row['content']) for row in rows], batch_size)
+        unchanged, changed = [], []
+        for row, prediction in zip(rows, predictions):
+            values = {
+                'category_id': row['category_id'], 'priority_id': row['priority_id'], 'is_psea': row['is_psea'],
+            }
+            applied, logs = [], []
+            pk, confidence = prediction.get('category', (None, 0))
+            category = categories.get(pk)
+            if (category and confidence >= threshold and default_category
+                    and row['category_id'] == default_category.pk and pk != row['category_id']):
+                values['category_id'] = pk
+                applied.append('category')
+                logs.append(('updated', f"Catégorie prédite : {category.name} ({confidence:.0%})",
+                             default_category.name, category.name))
+                if category.is_sensitive and not row['is_psea']:
+                    values['is_psea'] = True
+                    applied.append('is_psea')
+            level, confidence = prediction.get('priority', (None, 0))
+            priority = priorities.get(level)
+            if (priority and confidence >= threshold and level != row['priority__level']
+                    and row['priority__level'] == defaults['DEFAULT_PRIORITY_LEVEL']):
+                values['priority_id'] = priority.pk
+                applied.append('priority')
+                logs.append(('priority_changed', f"Priorité prédite : {priority.name} ({confidence:.0%})",
+                             str(row['priority__level']), priority.name))
+
+            metadata = dict(row['metadata'] or {})
+            metadata['classification'] = {
+                **metadata.get('classification', {}),
+                'model': model.version,
+                'predicted': {name: {'value': value, 'confidence': proba}
+                              for name, (value, proba) in prediction.items()},
+            }
+            if applied:
+                metadata['classification'].update({
+                    'auto': True, 'applied': applied,
+                    'category': categories[values['category_id']].name,
+                })
+                changed.append((row, values, metadata, logs))
+            else:
+                unchanged.append(Ticket(pk=row['pk'], metadata=metadata))
+
+        now = timezone.now()
+        with transaction.atomic(), ticket_audit() as audit:
+            # Sans prédiction appliquée, seule la trace du modèle est écrite
+            Ticket.objects.bulk_update(unchanged, ['metadata'])
+            touched, psea = [], []
+            for row, values, metadata, logs in changed:
+                # Ne rien écraser si un agent a reclassé le ticket depuis la lecture
+                updated = Ticket.objects.filter(
+                    pk=row['pk'], category_id=row['category_id'], priority_id=row['priority_id']
+                ).update(metadata=metadata, updated_at=now, **values)
+                if not updated:
+                    continue
+                touched.append(row['pk'])
+                for action, description, old_value, new_value in logs:
+                    audit.add(row['pk'], action, description, old_value=old_value, new_value=new_value)
+                if values['is_psea'] and not row['is_psea']:
+                    psea.append(row['pk'])
+            if touched:
+                read_model.schedule_refresh(touched)
+                stats['changed'] += len(touched)
+            if psea:
+                escalate_psea(psea)
+                stats['psea'] += len(psea)
+    return stats
@@ -0,0 +1,92 @@
+"""
+Vues pour l'envoi de fichiers par morceaux
+
+- ``POST uploads/`` : déclarer un envoi (nom, taille, usage) ;
+- ``HEAD``/``GET uploads/{id}/`` : offset courant (en-tête ``Upload-Offset``) ;
+- ``PATCH uploads/{id}/`` : envoyer un morceau (corps brut, en-tête
+  ``Upload-Offset``) ;
+- ``DELETE uploads/{id}/`` : abandonner l'envoi.
+"""
+from django.utils import timezone
+from rest_framework import mixins, status, viewsets
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from .models import Upload
+from .serializers import UploadSerializer
+from .uploads import (
+    ChecksumMismatch, OffsetMismatch, UploadError, UploadTooLarge,
+    abort, append_chunk, expiry_delay
+)
+
+CHUNK_CONTENT_TYPES = ('application/offset+octet-stream', 'application/octet-stream')
+
+
+class UploadViewSet(mixins.CreateModelMixin,
+                    mixins.RetrieveModelMixin,
+                    viewsets.GenericViewSet):
+    """API d'envoi reprenable (protocole inspiré de tus)"""
+    queryset = Upload.objects.all()
+    serializer_class = UploadSerializer
+    permission_classes = [AllowAny]  # Comme la création de tickets et l'import
+
+    @staticmethod
+    def _headers(upload):
+        return {
+            'Upload-Offset': str(upload.offset),
+            'Upload-Length': str(upload.size),
+            'Cache-Control': 'no-store',
+        }
+
+    def perform_create(self, serializer):
+        user = self.request.user if self.request.user.is_authenticated else None
+        serializer.save(created_by=user, expires_at=timezone.now() + expiry_delay())
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        upload = response.data
+        response['Location'] = request.build_absolute_uri(f"{upload['id']}/")
+        response['Upload-Offset'] = str(upload['offset'])
+        response['Upload-Length'] = str(upload['size'])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        upload = self.get_object()
+        return Response(self.get_serializer(upload).data, headers=self._headers(upload))
+
+    def partial_update(self, request, *args, **kwargs):
+        """Ajouter un morceau ; le corps est lu en flux, jamais chargé en entier"""
+        upload = self.get_object()
+
+        content_type = request.META.get('CONTENT_TYPE', '').split(';')[0].strip()
+        if content_type not in CHUNK_CONTENT_TYPES:
+            return Response(
+                {'error': f"Type de contenu attendu: {CHUNK_CONTENT_TYPES[0]}"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {'error': "En-têtes Upload-Offset et Content-Length requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            upload = append_chunk(upload, offset, request.stream, length)
+        except OffsetMismatch as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT,
+                            headers=self._headers(upload))
+        except UploadTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except ChecksumMismatch as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(self.get_serializer(upload).data, headers=self._headers(upload))
+
+    def destroy(self, request, *args, **kwargs):
+        abort(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,225 @@
+"""
+Envois de fichiers reprenables par morceaux (protocole inspiré de tus)
+
+Le client déclare l'envoi (nom, taille, usage), puis envoie le contenu par
+``PATCH`` successifs portant l'en-tête ``Upload-Offset``. Chaque morceau est
+recopié par blocs dans un fichier temporaire à la position indiquée, sans être
+chargé en mémoire. Après une coupure, le client lit l'offset (``HEAD``) et
+reprend à partir de là. Le fichier complet est stocké par empreinte puis
+transmis aux pièces jointes ou à l'import CSV.
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .attachments import create_attachments, discard_on_rollback, store_file
+from .models import Attachment, Upload
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Erreur d'envoi"""
+
+
+class OffsetMismatch(UploadError):
+    """L'offset du morceau ne correspond pas aux octets déjà reçus"""
+
+
+class UploadTooLarge(UploadError):
+    """Le morceau ou l'envoi dépasse la taille autorisée"""
+
+
+class ChecksumMismatch(UploadError):
+    """L'empreinte du fichier reçu ne correspond pas à celle annoncée"""
+
+
+def max_upload_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 200 * 1024 * 1024)
+
+
+def max_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 5 * 1024 * 1024)
+
+
+def expiry_delay():
+    return timedelta(hours=getattr(settings, 'UPLOAD_EXPIRY_HOURS', 24))
+
+
+def temp_path(upload):
+    temp_dir = getattr(settings, 'UPLOAD_TEMP_DIR', os.path.join(settings.BASE_DIR, 'tmp', 'uploads'))
+    return os.path.join(str(temp_dir), f'{upload.pk}.part')
+
+
+def _remove_temp(upload):
+    try:
+        os.remove(temp_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def append_chunk(upload, offset, stream, length):
+    """Ajouter un morceau lu depuis ``stream`` à la position ``offset``
+
+    La ligne de l'envoi est verrouillée pendant l'écriture : deux morceaux
+    concurrents au même offset ne s'entremêlent pas, le second est refusé.
+    Les octets reçus avant une coupure sont conservés : l'offset avance de ce
+    qui a été effectivement écrit. Retourne l'envoi à jour (finalisé s'il est
+    complet).
+    """
+    if length > max_chunk_size():
+        raise UploadTooLarge(f"Morceau limité à {max_chunk_size()} octets")
+
+    error = None
+    with transaction.atomic():
+        locked = Upload.objects.select_for_update().get(pk=upload.pk)
+        upload.offset, upload.status = locked.offset, locked.status
+        if upload.status != 'uploading':
+            raise UploadError("Cet envoi est déjà terminé")
+        if offset != upload.offset:
+            raise OffsetMismatch(f"Offset attendu: {upload.offset}")
+        if offset + length > upload.size:
+            raise UploadTooLarge("Le morceau dépasse la taille annoncée")
+
+        path = temp_path(upload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        received = 0
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(offset)
+            while received < length:
+                block = stream.read(min(BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                f.write(block)
+                received += len(block)
+            # Écarter d'éventuels octets d'une tentative précédente interrompue
+            f.truncate()
+
+        now = timezone.now()
+        upload.offset = offset + received
+        upload.expires_at = now + expiry_delay()
+        upload.save(update_fields=['offset', 'expires_at', 'updated_at'])
+
+        if upload.is_finished:
+            # Sous le verrou : un seul morceau finalise l'envoi ; un échec
+            # (statut « failed ») est enregistré avant d'être signalé
+            try:
+                finalize(upload)
+            except UploadError as e:
+                error = e
+    if error is not None:
+        raise error
+    return upload
+
+
+def finalize(upload):
+    """Stocker le fichier complet et le transmettre au traitement prévu"""
+    # Empreinte refusée ou rattachement annulé : le fichier stocké est supprimé
+    with discard_on_rollback():
+        return _finalize(upload)
+
+
+def _finalize(upload):
+    path = temp_path(upload)
+    try:
+        with open(path, 'rb') as f:
+            digest, stored_path, size = store_file(File(f, name=upload.filename), upload.filename)
+    except Exception as e:
+        logger.error(f"Erreur de stockage de l'envoi {upload.pk}: {e}")
+        upload.status = 'failed'
+        upload.result = {'error': 'storage_error'}
+        upload.save(update_fields=['status', 'result', 'updated_at'])
+        raise UploadError("Le fichier reçu n'a pas pu être stocké")
+    finally:
+        _remove_temp(upload)
+
+    if upload.checksum and upload.checksum.lower() != digest:
+        upload.status = 'failed'
+        upload.result = {'error': 'checksum_mismatch'}
+        upload.save(update_fields=['status', 'result', 'updated_at'])
+        raise ChecksumMismatch("L'empreinte du fichier reçu ne correspond pas")
+
+    upload.sha256 = digest
+    upload.path = stored_path
+    update_fields = ['sha256', 'path', 'status', 'attachment', 'updated_at']
+
+    with transaction.atomic():
+        if upload.purpose == 'import':
+            from .tasks import import_upload
+
+            upload.status = 'processing'
+            transaction.on_commit(lambda: import_upload.delay(str(upload.pk)))
+        else:
+            upload.status = 'complete'
+            if upload.ticket_id:
+                upload.attachment = _attach(upload.ticket, [upload], upload.created_by)[0]
+        upload.save(update_fields=update_fields)
+    return upload
+
+
+def _attach(ticket, uploads, user=None):
+    return create_attachments(ticket, [
+        (upload.filename, upload.content_type or 'application/octet-stream',
+         upload.sha256, upload.path, upload.size)
+        for upload in uploads
+    ], user=user)
+
+
+def attach_uploads(ticket, upload_ids, user=None):
+    """Rattacher à un ticket des envois de pièces jointes terminés"""
+    uploads = list(
+        Upload.objects.select_for_update().filter(
+            pk__in=upload_ids, purpose='attachment', status='complete',
+            ticket__isnull=True, attachment__isnull=True,
+        )
+    )
+    if len(uploads) != len(set(upload_ids)):
+        raise UploadError("Envoi introuvable, incomplet ou déjà rattaché")
+
+    attachments = _attach(ticket, uploads, user)
+    for upload, attachment in zip(uploads, attachments):
+        upload.ticket = ticket
+        upload.attachment = attachment
+    Upload.objects.bulk_update(uploads, ['ticket', 'attachment'])
+    return attachments
+
+
+def abort(upload):
+    """Abandonner un envoi et supprimer ses données temporaires"""
+    _remove_temp(upload)
+    upload.delete()
+
+
+def purge_expired(now=None):
+    """Supprimer les envois expirés ; retourne le nombre supprimé
+
+    Un fichier stocké mais jamais rattaché est supprimé du stockage s'il n'est
+    référencé par aucune pièce jointe ni aucun autre envoi.
+    """
+    now = now or timezone.now()
+    expired = list(Upload.objects.filter(expires_at__lt=now).exclude(status='processing'))
+    for upload in expired:
+        _remove_temp(upload)
+    Upload.objects.filter(pk__in=[upload.pk for upload in expired]).delete()
+
+    for upload in expired:
+        if not upload.path or upload.attachment_id:
+            continue
+        in_use = (
+            Attachment.objects.filter(path=upload.path).exists()
+            or Upload.objects.filter(path=upload.path).exists()
+        )
+        if not in_use:
+            try:
+                default_storage.delete(upload.path)
+            except Exception as e:
+                logger.warning(f"Suppression impossible de {upload.path}: {e}")
+    return len(expired)
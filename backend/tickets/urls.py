@@ -5,6 +5,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 from . import import_views
+from . import upload_views
 
 router = DefaultRouter()
 router.register(r'categories', views.CategoryViewSet)
@@ -15,6 +16,7 @@ router.register(r'tickets', views.TicketViewSet)
 router.register(r'responses', views.ResponseViewSet)
 router.register(r'logs', views.TicketLogViewSet)
 router.register(r'feedback', views.FeedbackViewSet)
+router.register(r'uploads', upload_views.UploadViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
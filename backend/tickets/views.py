@@ -5,25 +5,40 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ValidationError as DRFValidationError
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from django.db.models import Q, Count, Avg, F, ExpressionWrapper, DurationField
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
+import uuid
 from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
 
 from .models import (
     Category, Priority, Status, Channel, Ticket, 
-    Response as TicketResponse, TicketLog, Feedback
+    Response as TicketResponse, TicketLog, Feedback, TicketSummary
 )
 from .serializers import (
     CategorySerializer, PrioritySerializer, StatusSerializer, 
     ChannelSerializer, TicketSerializer, TicketCreateSerializer,
     TicketUpdateSerializer, ResponseSerializer, TicketLogSerializer,
-    FeedbackSerializer
+    FeedbackSerializer, TicketSummarySerializer
+)
+from .audit import ticket_audit
+from .filters import TicketFilter, TicketSummaryFilter
+from .geo import MAX_CLUSTERS, clamp_zoom, cluster_tickets
+from . import assignment, triage
+from .attachments import discard_on_rollback
+from .duplicates import group_of
+from .workflow import (
+    BULK_ACTIONS, InvalidTransition, TransitionConflict, apply_bulk, apply_transition, can_bulk
 )
-from .filters import TicketFilter
 from channels.services import MessageService
+from users.visibility import SUMMARY_FIELDS, filter_tickets
 
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -70,143 +85,325 @@ class TicketViewSet(viewsets.ModelViewSet):
             return TicketUpdateSerializer
         return TicketSerializer
 
+    # Taille maximale d'un lot de prédiction
+    PREDICT_MAX_ITEMS = 1000
+
+    # Tri accepté par la liste -> champ du modèle de lecture
+    SUMMARY_ORDERING = {
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'priority__level': 'priority_level',
+        'status__name': 'status_name',
+    }
+
+    def get_summary_queryset(self):
+        """Résumés visibles, filtrés et triés, lus sur le modèle de lecture seul"""
+        queryset = filter_tickets(TicketSummary.objects.all(), self.request.user, fields=SUMMARY_FIELDS)
+        filterset = TicketSummaryFilter(self.request.query_params, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+
+        ordering = []
+        for term in self.request.query_params.get('ordering', '').split(','):
+            name = term.strip().lstrip('-')
+            if name in self.SUMMARY_ORDERING:
+                ordering.append(('-' if term.strip().startswith('-') else '') + self.SUMMARY_ORDERING[name])
+        return filterset.qs.order_by(*(ordering or ['-created_at']))
+
     def list(self, request, *args, **kwargs):
-        """Liste des tickets avec gestion sûre de la pagination (jamais 404 sur page vide)."""
-        queryset = self.filter_queryset(self.get_queryset())
+        """Liste des tickets avec gestion sûre de la pagination (jamais 404 sur page vide).
+
+        Filtres, recherche, tri et comptage portent sur le modèle de lecture ;
+        seuls les tickets de la page sont ensuite chargés.
+        """
+        ids = self.get_summary_queryset().values_list('pk', flat=True)
 
         try:
-            page = self.paginate_queryset(queryset)
+            page = self.paginate_queryset(ids)
         except Exception:
             # En cas d'erreur de pagination (page invalide, hors plage), renvoyer une page vide
             return self.get_paginated_response([])
 
+        tickets = self._load_tickets(page if page is not None else list(ids))
+        serializer = self.get_serializer(tickets, many=True)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @staticmethod
+    def _load_tickets(ids):
+        """Charger les tickets d'une page dans l'ordre des identifiants"""
+        tickets = Ticket.objects.filter(pk__in=ids).select_related(
+            'category', 'priority', 'status', 'channel', 'assigned_to', 'created_by', 'feedback'
+        ).prefetch_related('files', 'responses', 'logs')
+        by_id = {ticket.pk: ticket for ticket in tickets}
+        return [by_id[pk] for pk in ids if pk in by_id]
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Liste compacte (libellés, SLA, compteurs) servie par le modèle de lecture"""
+        queryset = self.get_summary_queryset()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(TicketSummarySerializer(page, many=True).data)
+        return Response(TicketSummarySerializer(queryset, many=True).data)
+
     def get_queryset(self):
         """Filtrer les tickets selon les permissions de l'utilisateur"""
         queryset = super().get_queryset()
-        
-        # Si l'utilisateur n'est pas authentifié, retourner tous les tickets
-        if not self.request.user.is_authenticated:
-            return queryset
-        
-        # Si l'utilisateur n'est pas superuser, filtrer selon les rôles
-        if not self.request.user.is_superuser:
-            # Logique de filtrage basée sur les rôles
-            # À implémenter selon les besoins spécifiques
-            pass
-        
-        return queryset
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('files')
+        return filter_tickets(queryset, self.request.user)
 
     def perform_create(self, serializer):
         """Créer un ticket, définir le statut par défaut si absent et envoyer un accusé de réception."""
-        ticket = serializer.save()
+        with discard_on_rollback(), transaction.atomic(), ticket_audit(self.request):
+            ticket = serializer.save()
 
-        # Définir un statut par défaut 'Ouvert' si non renseigné par le sérializer
-        if not ticket.status:
-            ticket.status = Status.objects.filter(name='Ouvert').first()
-            ticket.save(update_fields=['status'])
+            # Définir un statut par défaut 'Ouvert' si non renseigné par le sérializer
+            if not ticket.status:
+                ticket.status = Status.objects.filter(name='Ouvert').first()
+                ticket.save(update_fields=['status'])
 
-        # Enregistrer l'auteur si authentifié
-        if self.request and self.request.user and self.request.user.is_authenticated:
-            if ticket.created_by_id is None:
-                ticket.created_by = self.request.user
-                ticket.save(update_fields=['created_by'])
+            # Enregistrer l'auteur si authentifié
+            if self.request and self.request.user and self.request.user.is_authenticated:
+                if ticket.created_by_id is None:
+                    ticket.created_by = self.request.user
+                    ticket.save(update_fields=['created_by'])
 
-        # Envoyer un accusé de réception (best-effort)
+        # Envoyer un accusé de réception (best-effort, hors transaction)
         try:
             MessageService.send_ticket_confirmation(ticket)
         except Exception:
             # Ne pas bloquer la création du ticket si l'envoi échoue
             pass
 
+    def perform_update(self, serializer):
+        with discard_on_rollback(), transaction.atomic(), ticket_audit(self.request):
+            serializer.save()
+
+    def _transition(self, request, name, success_message, **params):
+        """Appliquer une transition du workflow et traduire les erreurs en réponses HTTP"""
+        ticket = self.get_object()
+        expected_status = request.data.get('expected_status')
+        try:
+            if expected_status not in (None, ''):
+                if isinstance(expected_status, bool):
+                    raise ValueError
+                expected_status = int(expected_status)
+        except (TypeError, ValueError):
+            return Response({'error': 'Statut attendu invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            apply_transition(
+                ticket, name,
+                request=request,
+                expected_status_id=expected_status or None,
+                **params
+            )
+        except TransitionConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': success_message})
+
     @action(detail=True, methods=['post'])
     def assign(self, request, pk=None):
-        """Assigner un ticket à un utilisateur"""
-        ticket = self.get_object()
+        """Assigner un ticket à un utilisateur (``assigned_to``, ou ``"auto"`` pour l'agent le moins chargé)"""
         assigned_to_id = request.data.get('assigned_to')
-        
-        if assigned_to_id:
-            try:
-                user = get_user_model().objects.get(id=assigned_to_id)
-                ticket.assigned_to = user
-                ticket.save()
-                
-                TicketLog.objects.create(
-                    ticket=ticket,
-                    action='assigned',
-                    user=request.user,
-                    description=f"Ticket assigné à {user.get_full_name()}",
-                    new_value=str(user)
-                )
-                
-                return Response({'status': 'Ticket assigné'})
-            except User.DoesNotExist:
-                return Response({'error': 'Utilisateur non trouvé'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        return Response({'error': 'ID utilisateur requis'}, status=status.HTTP_400_BAD_REQUEST)
+        if not assigned_to_id:
+            return Response({'error': 'ID utilisateur requis'}, status=status.HTTP_400_BAD_REQUEST)
+        if assigned_to_id == 'auto':
+            return self._auto_assign(request)
+
+        try:
+            user = get_user_model().objects.get(id=assigned_to_id)
+        except (get_user_model().DoesNotExist, ValueError, DjangoValidationError):
+            return Response({'error': 'Utilisateur non trouvé'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return self._transition(request, 'assign', 'Ticket assigné', assignee=user)
+
+    def _auto_assign(self, request):
+        if not assignment.can_request(request.user):
+            return Response({'error': 'Assignation non autorisée'}, status=status.HTTP_403_FORBIDDEN)
+        ticket = self.get_object()
+        try:
+            assignee = assignment.auto_assign(ticket, request=request)
+        except TransitionConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except (InvalidTransition, assignment.NoEligibleAgent) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'Ticket assigné', 'assigned_to': str(assignee.pk)})
+
+    @action(detail=False, methods=['post'])
+    def auto_assign(self, request):
+        """Répartir les tickets ouverts non assignés entre les agents les moins chargés
+
+        Les tickets sont désignés par ``ids`` ou ``filters`` (tout l'arriéré
+        visible à défaut) ; ``limit`` borne le nombre de tickets traités.
+        """
+        if not assignment.can_request(request.user):
+            return Response({'error': 'Assignation non autorisée'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            queryset, _ = self._selection(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DRFValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.data['limit']) if request.data.get('limit') else None
+        except (TypeError, ValueError):
+            return Response({'error': 'limit invalide'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(assignment.assign_backlog(queryset, request=request, limit=limit))
+
+    @action(detail=False, methods=['get'])
+    def workload(self, request):
+        """Nombre de tickets ouverts de chaque agent assignable (rôles ``can_assign``)"""
+        if not assignment.can_request(request.user):
+            return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
+        loads = assignment.engine.loads()
+        return Response(sorted(
+            ({'user': user_id, 'open_tickets': load} for user_id, load in loads.items()),
+            key=lambda item: item['open_tickets']
+        ))
 
     @action(detail=True, methods=['post'])
     def close(self, request, pk=None):
         """Fermer un ticket"""
-        ticket = self.get_object()
-        ticket.status = Status.objects.filter(name='Fermé').first()
-        ticket.closed_at = timezone.now()
-        ticket.save()
-        
-        TicketLog.objects.create(
-            ticket=ticket,
-            action='closed',
-            user=request.user,
-            description="Ticket fermé"
-        )
-        
-        return Response({'status': 'Ticket fermé'})
+        return self._transition(request, 'close', 'Ticket fermé')
 
     @action(detail=True, methods=['post'])
     def reopen(self, request, pk=None):
         """Rouvrir un ticket"""
-        ticket = self.get_object()
-        ticket.status = Status.objects.filter(name='Ouvert').first()
-        ticket.closed_at = None
-        ticket.save()
-        
-        TicketLog.objects.create(
-            ticket=ticket,
-            action='reopened',
-            user=request.user,
-            description="Ticket rouvert"
-        )
-        
-        return Response({'status': 'Ticket rouvert'})
+        return self._transition(request, 'reopen', 'Ticket rouvert')
 
     @action(detail=True, methods=['post'])
     def escalate(self, request, pk=None):
         """Escalader un ticket"""
-        ticket = self.get_object()
         escalated_to = request.data.get('escalated_to')
-        
-        if escalated_to:
-            ticket.escalated_at = timezone.now()
-            ticket.escalated_to = escalated_to
-            ticket.save()
-            
-            TicketLog.objects.create(
-                ticket=ticket,
-                action='escalated',
-                user=request.user,
-                description=f"Ticket escaladé vers {escalated_to}",
-                new_value=escalated_to
-            )
-            
-            return Response({'status': 'Ticket escaladé'})
-        
-        return Response({'error': 'Email de destination requis'}, status=status.HTTP_400_BAD_REQUEST)
+        if not escalated_to:
+            return Response({'error': 'Email de destination requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return self._transition(request, 'escalate', 'Ticket escaladé', escalated_to=escalated_to)
+
+    @action(detail=False, methods=['post'])
+    def predict(self, request):
+        """Catégorie et priorité prédites par le modèle statistique
+
+        Corps : ``texts`` (chaînes ou objets ``{title, content}``) ou ``ids`` de tickets.
+        """
+        model = triage.get_model()
+        if model is None:
+            return Response({'error': 'Modèle de classification non disponible'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        ids = request.data.get('ids')
+        texts = request.data.get('texts')
+        if ids:
+            try:
+                rows = list(self.get_queryset().filter(pk__in=ids).values_list('pk', 'title', 'content'))
+            except (ValueError, DjangoValidationError):
+                return Response({'error': 'Identifiants invalides'}, status=status.HTTP_400_BAD_REQUEST)
+            keys = [str(pk) for pk, _, _ in rows]
+            texts = [triage.ticket_text(title, content) for _, title, content in rows]
+        elif isinstance(texts, list):
+            keys = None
+            texts = [
+                triage.ticket_text(text.get('title'), text.get('content')) if isinstance(text, dict) else str(text)
+                for text in texts
+            ]
+        else:
+            return Response({'error': 'texts ou ids requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(texts) > self.PREDICT_MAX_ITEMS:
+            return Response({'error': f'Au plus {self.PREDICT_MAX_ITEMS} éléments par requête'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        predictions = triage.describe(model.predict(texts))
+        if keys is not None:
+            for key, prediction in zip(keys, predictions):
+                prediction['id'] = key
+        return Response({'model': model.version, 'predictions': predictions})
+
+    def _selection(self, request):
+        """Tickets visibles désignés par ``ids`` et/ou ``filters`` ; retourne ``(queryset, ids)``
+
+        Lève ``ValueError`` si ``ids`` n'est pas une liste d'UUID ou ``filters``
+        pas un objet, ``ValidationError`` (DRF) si les filtres sont invalides.
+        """
+        ids = request.data.get('ids')
+        filters = request.data.get('filters')
+        queryset = self.get_queryset()
+        if ids:
+            if not isinstance(ids, list) or not all(isinstance(ticket_id, str) for ticket_id in ids):
+                raise ValueError("ids doit être une liste d'identifiants")
+            try:
+                ids = list(dict.fromkeys(str(uuid.UUID(ticket_id)) for ticket_id in ids))
+            except ValueError:
+                raise ValueError("Identifiant de ticket invalide")
+            queryset = queryset.filter(pk__in=ids)
+        if filters:
+            if not isinstance(filters, dict):
+                raise ValueError("filters doit être un objet")
+            filterset = TicketFilter(data=filters, queryset=queryset, request=request)
+            if not filterset.is_valid():
+                raise DRFValidationError(filterset.errors)
+            queryset = filterset.qs
+        return queryset, ids
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Appliquer une action (assign, close, reopen, escalate, priority, tag) à plusieurs tickets
+
+        Les tickets sont désignés par ``ids`` ou par ``filters`` (paramètres de TicketFilter).
+        """
+        action_name = request.data.get('action')
+        if action_name not in BULK_ACTIONS:
+            return Response({'error': f"Action groupée inconnue: {action_name}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not can_bulk(request.user, action_name):
+            return Response({'error': 'Action non autorisée'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            queryset, ids = self._selection(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DRFValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        if not ids and not request.data.get('filters'):
+            return Response({'error': 'ids ou filters requis'}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = {}
+        try:
+            if action_name == 'assign':
+                params['assignee'] = get_user_model().objects.get(id=request.data.get('assigned_to'))
+            elif action_name == 'escalate':
+                params['escalated_to'] = request.data.get('escalated_to')
+                if not params['escalated_to']:
+                    return Response({'error': 'Email de destination requis'}, status=status.HTTP_400_BAD_REQUEST)
+                validate_email(params['escalated_to'])
+            elif action_name == 'priority':
+                params['priority'] = Priority.objects.get(id=request.data.get('priority'))
+            elif action_name == 'tag':
+                params['tags'] = request.data.get('tags') or []
+                if not isinstance(params['tags'], list) or not all(isinstance(tag, str) for tag in params['tags']):
+                    raise ValueError
+        except (get_user_model().DoesNotExist, Priority.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            return Response({'error': 'Paramètre de l\'action invalide'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = apply_bulk(queryset, action_name, request=request, **params)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        for ticket_id in ids or ():
+            results.setdefault(ticket_id, 'not_found')
+
+        return Response({
+            'action': action_name,
+            'updated': sum(1 for result in results.values() if result == 'updated'),
+            'results': results,
+        })
 
     @action(detail=True, methods=['get'])
     def stats(self, request, pk=None):
@@ -227,43 +424,78 @@ class TicketViewSet(viewsets.ModelViewSet):
         
         return Response(stats)
 
+    @action(detail=True, methods=['get'])
+    def duplicates(self, request, pk=None):
+        """Groupe de quasi-doublons du ticket : ticket d'origine et doublons visibles"""
+        ticket = self.get_object()
+        origin_id, members = group_of(ticket)
+        similarities = dict(members)
+        rows = self.get_queryset().filter(pk__in=[origin_id, *similarities]).values(
+            'id', 'title', 'created_at', 'status__name'
+        )
+        origin, items = None, []
+        for row in rows:
+            item = {
+                'id': row['id'], 'title': row['title'],
+                'created_at': row['created_at'], 'status_name': row['status__name'],
+            }
+            if row['id'] == origin_id:
+                origin = item
+            else:
+                items.append({**item, 'similarity': similarities.get(row['id'])})
+        items.sort(key=lambda item: item['created_at'])
+        return Response({'origin': origin, 'count': len(members), 'duplicates': items})
+
+    @action(detail=False, methods=['get'])
+    def map(self, request):
+        """Regroupements de tickets géolocalisés pour la carte (paramètres zoom et bbox)
+
+        L'emprise ``bbox`` est obligatoire ; le zoom est ramené dans la plage
+        prise en charge et renvoyé tel qu'appliqué.
+        """
+        try:
+            zoom = clamp_zoom(request.query_params.get('zoom', 5))
+        except ValueError:
+            return Response({'error': 'Zoom invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.query_params.get('bbox'):
+            return Response({'bbox': 'Emprise requise: min_lng,min_lat,max_lng,max_lat'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        clusters = cluster_tickets(queryset, zoom, MAX_CLUSTERS + 1)
+        truncated = len(clusters) > MAX_CLUSTERS
+        clusters = clusters[:MAX_CLUSTERS]
+        return Response({
+            'zoom': zoom,
+            'total': sum(cluster['count'] for cluster in clusters),
+            'truncated': truncated,
+            'clusters': clusters,
+        })
+
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def dashboard_stats(self, request):
         """Statistiques pour le tableau de bord"""
-        from django.db.models import Count, Q
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        # Statistiques par statut
-        status_stats = list(
-            Ticket.objects.values('status__name')
-            .annotate(count=Count('id'))
-            .order_by('status__name')
-        )
-        
-        # Statistiques par catégorie
-        category_stats = list(
-            Ticket.objects.values('category__name')
-            .annotate(count=Count('id'))
-            .order_by('category__name')
-        )
-        
-        # Statistiques par canal
-        channel_stats = list(
-            Ticket.objects.values('channel__name')
-            .annotate(count=Count('id'))
-            .order_by('channel__name')
-        )
+        # Agrégats lus sur le modèle de lecture (aucune jointure)
+        summaries = TicketSummary.objects.order_by()
+
+        def count_by(field, key):
+            rows = summaries.values(field).annotate(count=Count('pk')).order_by(field)
+            return [{key: row[field], 'count': row['count']} for row in rows]
+
+        # Statistiques par statut, catégorie et canal
+        status_stats = count_by('status_name', 'status__name')
+        category_stats = count_by('category_name', 'category__name')
+        channel_stats = count_by('channel_name', 'channel__name')
         
         # Tickets en retard (SLA dépassé)
-        overdue_count = Ticket.objects.filter(
+        overdue_count = summaries.filter(
             sla_deadline__lt=timezone.now(),
-            status__is_final=False
+            is_final=False
         ).count()
         
         # Tickets de cette semaine
         week_start = timezone.now() - timedelta(days=7)
-        weekly_tickets = Ticket.objects.filter(
+        weekly_tickets = summaries.filter(
             created_at__gte=week_start
         ).count()
         
@@ -288,7 +520,7 @@ class ResponseViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Filtrer les réponses par ticket si le paramètre ticket est fourni"""
-        queryset = super().get_queryset()
+        queryset = filter_tickets(super().get_queryset(), self.request.user, prefix='ticket__')
         ticket_id = self.request.query_params.get('ticket', None)
         if ticket_id:
             queryset = queryset.filter(ticket_id=ticket_id)
@@ -310,6 +542,9 @@ class TicketLogViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['ticket', 'action', 'user']
     ordering = ['-created_at']
 
+    def get_queryset(self):
+        return filter_tickets(super().get_queryset(), self.request.user, prefix='ticket__')
+
 
 class FeedbackViewSet(viewsets.ModelViewSet):
     """API pour les feedbacks de satisfaction"""
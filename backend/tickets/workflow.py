@@ -0,0 +1,308 @@
+"""
+Moteur de workflow des tickets
+
+Chaque transition déclarée est appliquée par un seul ``UPDATE`` conditionnel
+(``WHERE id = ... AND status_id = <statut attendu>``) limité aux colonnes
+concernées. Si la ligne a changé entre-temps (autre agent), aucune ligne
+n'est mise à jour et ``TransitionConflict`` est levée. L'entrée de journal est
+écrite dans la même transaction.
+"""
+from abc import ABC, abstractmethod
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import read_model
+from .audit import log_ticket_action, ticket_audit
+from .models import Status, Ticket
+
+
+class WorkflowError(Exception):
+    """Erreur de workflow"""
+
+
+class InvalidTransition(WorkflowError):
+    """Transition non autorisée depuis le statut courant"""
+
+
+class TransitionConflict(WorkflowError):
+    """Le ticket a été modifié par une autre requête"""
+
+
+class Transition(ABC):
+    """Transition déclarée (une sous-classe par transition)
+
+    ``from_final`` : état de finalité requis du statut courant (``None`` = indifférent).
+    ``to_status`` : nom du statut cible (``None`` = statut inchangé).
+    """
+
+    def __init__(self, name, action, from_final=None, to_status=None):
+        self.name = name
+        self.action = action
+        self.from_final = from_final
+        self.to_status = to_status
+
+    def values(self, ticket, now, **params):
+        """Colonnes à mettre à jour"""
+        return {}
+
+    @abstractmethod
+    def describe(self, ticket, **params):
+        """Description, ancienne et nouvelle valeur du journal"""
+
+    def guards(self, ticket):
+        """Conditions supplémentaires du ``WHERE``"""
+        return {}
+
+
+class CloseTransition(Transition):
+    def values(self, ticket, now, **params):
+        return {'closed_at': now}
+
+    def describe(self, ticket, **params):
+        return "Ticket fermé", '', ''
+
+
+class ReopenTransition(Transition):
+    def values(self, ticket, now, **params):
+        return {'closed_at': None}
+
+    def describe(self, ticket, **params):
+        return "Ticket rouvert", '', ''
+
+
+class AssignTransition(Transition):
+    def values(self, ticket, now, assignee=None, **params):
+        return {'assigned_to': assignee}
+
+    def guards(self, ticket):
+        return {'assigned_to_id': ticket.assigned_to_id}
+
+    def describe(self, ticket, assignee=None, **params):
+        return f"Ticket assigné à {assignee.get_full_name()}", '', str(assignee)
+
+
+class EscalateTransition(Transition):
+    def values(self, ticket, now, escalated_to='', **params):
+        return {'escalated_at': now, 'escalated_to': escalated_to}
+
+    def describe(self, ticket, escalated_to='', **params):
+        return f"Ticket escaladé vers {escalated_to}", '', escalated_to
+
+
+TRANSITIONS = {
+    'close': CloseTransition('close', 'closed', from_final=False, to_status='Fermé'),
+    'reopen': ReopenTransition('reopen', 'reopened', from_final=True, to_status='Ouvert'),
+    # Comme avant le moteur de workflow : possibles quel que soit le statut
+    'assign': AssignTransition('assign', 'assigned'),
+    'escalate': EscalateTransition('escalate', 'escalated'),
+}
+
+
+def get_status(name):
+    status = Status.objects.filter(name=name).first()
+    if status is None:
+        raise InvalidTransition(f"Statut '{name}' non configuré")
+    return status
+
+
+def apply_transition(ticket, name, request=None, expected_status_id=None, **params):
+    """Appliquer une transition par compare-and-set sur le statut
+
+    ``expected_status_id`` permet au client de fournir le statut qu'il a
+    affiché ; à défaut, le statut lu avec ``ticket`` est utilisé.
+    """
+    transition = TRANSITIONS[name]
+    expected_status_id = expected_status_id or ticket.status_id
+
+    if transition.from_final is not None and ticket.status.is_final != transition.from_final:
+        raise InvalidTransition(f"Transition '{name}' impossible depuis le statut {ticket.status}")
+
+    now = timezone.now()
+    values = transition.values(ticket, now, **params)
+    new_status = get_status(transition.to_status) if transition.to_status else None
+    if new_status is not None:
+        values['status'] = new_status
+    values['updated_at'] = now
+
+    description, old_value, new_value = transition.describe(ticket, **params)
+    if new_status is not None and not old_value:
+        old_value, new_value = str(ticket.status), new_value or str(new_status)
+
+    with transaction.atomic():
+        updated = Ticket.objects.filter(
+            pk=ticket.pk, status_id=expected_status_id, **transition.guards(ticket)
+        ).update(**values)
+        if not updated:
+            raise TransitionConflict("Le ticket a été modifié entre-temps, veuillez recharger")
+
+        # L'UPDATE direct ne déclenche pas post_save
+        read_model.schedule_refresh([ticket.pk])
+        log_ticket_action(
+            ticket, transition.action, description,
+            request=request, old_value=old_value, new_value=new_value
+        )
+
+    for field, value in values.items():
+        setattr(ticket, field, value)
+    return ticket
+
+
+# Actions groupées ---------------------------------------------------------
+
+BULK_MAX_TICKETS = 10000
+BULK_NOTIFICATION_CHUNK = 500
+
+# Notifications envoyées (en tâche de fond) après une action groupée
+BULK_NOTIFICATIONS = {
+    'close': 'closure',
+    'escalate': 'escalation',
+}
+
+BULK_ACTIONS = list(TRANSITIONS) + ['priority', 'tag']
+
+# Drapeau de rôle requis par action groupée (les autres : permission ``edit_tickets``)
+BULK_ROLE_FLAGS = {
+    'close': 'can_close',
+    'reopen': 'can_close',
+    'assign': 'can_assign',
+    'escalate': 'can_escalate',
+}
+
+
+def can_bulk(user, name):
+    """L'utilisateur peut-il appliquer l'action groupée ``name`` ?"""
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+    if user.role_id is None:
+        return False
+    flag = BULK_ROLE_FLAGS.get(name)
+    if flag is not None:
+        return getattr(user.role, flag)
+    return user.has_permission('edit_tickets') or user.has_permission('all')
+
+
+def _enqueue_notifications(ticket_ids, template_type):
+    from channels.tasks import send_ticket_notifications
+
+    ids = [str(pk) for pk in ticket_ids]
+    for i in range(0, len(ids), BULK_NOTIFICATION_CHUNK):
+        send_ticket_notifications.delay(ids[i:i + BULK_NOTIFICATION_CHUNK], template_type)
+
+
+def apply_bulk(queryset, name, request=None, **params):
+    """Appliquer une action à un ensemble de tickets
+
+    Les lignes sont verrouillées et lues en une requête, modifiées par un seul
+    ``UPDATE`` (un ``bulk_update`` pour les tags), les journaux sont écrits en
+    un ``bulk_create`` et les notifications mises en file après validation.
+    Retourne ``{id: résultat}`` où résultat vaut ``'updated'`` ou la raison
+    pour laquelle le ticket a été ignoré.
+    """
+    if name not in BULK_ACTIONS:
+        raise InvalidTransition(f"Action groupée inconnue: {name}")
+
+    now = timezone.now()
+    results = {}
+
+    with transaction.atomic(), ticket_audit(request) as audit:
+        rows = list(
+            queryset.select_for_update(of=('self',)).order_by().values(
+                'pk', 'status__name', 'status__is_final', 'priority_id', 'priority__name',
+                *(['tags'] if name == 'tag' else [])
+            )[:BULK_MAX_TICKETS + 1]
+        )
+        if len(rows) > BULK_MAX_TICKETS:
+            raise InvalidTransition(f"Au plus {BULK_MAX_TICKETS} tickets par action groupée")
+
+        if name == 'tag':
+            updated = _bulk_tag(rows, now, audit, results, **params)
+        elif name == 'priority':
+            updated = _bulk_priority(rows, now, audit, results, **params)
+        else:
+            updated = _bulk_transition(TRANSITIONS[name], rows, now, audit, results, **params)
+        read_model.schedule_refresh(updated)
+
+        template_type = BULK_NOTIFICATIONS.get(name)
+        if updated and template_type:
+            transaction.on_commit(lambda: _enqueue_notifications(updated, template_type))
+
+    return results
+
+
+def _bulk_transition(transition, rows, now, audit, results, **params):
+    eligible = []
+    for row in rows:
+        if transition.from_final is not None and row['status__is_final'] != transition.from_final:
+            results[str(row['pk'])] = 'invalid_transition'
+        else:
+            eligible.append(row)
+
+    if not eligible:
+        return []
+
+    values = transition.values(None, now, **params)
+    new_status = get_status(transition.to_status) if transition.to_status else None
+    if new_status is not None:
+        values['status'] = new_status
+    values['updated_at'] = now
+
+    ids = [row['pk'] for row in eligible]
+    Ticket.objects.filter(pk__in=ids).update(**values)
+
+    description, old_value, new_value = transition.describe(None, **params)
+    for row in eligible:
+        if new_status is not None and not old_value:
+            audit.add(row['pk'], transition.action, description,
+                      old_value=row['status__name'], new_value=str(new_status))
+        else:
+            audit.add(row['pk'], transition.action, description,
+                      old_value=old_value, new_value=new_value)
+        results[str(row['pk'])] = 'updated'
+    return ids
+
+
+def _bulk_priority(rows, now, audit, results, priority=None, **params):
+    if priority is None:
+        raise InvalidTransition("Priorité requise")
+
+    changed = []
+    for row in rows:
+        if row['priority_id'] == priority.pk:
+            results[str(row['pk'])] = 'unchanged'
+        else:
+            changed.append(row)
+
+    ids = [row['pk'] for row in changed]
+    if ids:
+        Ticket.objects.filter(pk__in=ids).update(priority=priority, updated_at=now)
+    for row in changed:
+        audit.add(row['pk'], 'priority_changed',
+                  f"Priorité changée de {row['priority__name']} à {priority.name}",
+                  old_value=row['priority__name'], new_value=priority.name)
+        results[str(row['pk'])] = 'updated'
+    return ids
+
+
+def _bulk_tag(rows, now, audit, results, tags=None, **params):
+    tags = [str(tag) for tag in tags or [] if str(tag).strip()]
+    if not tags:
+        raise InvalidTransition("Tags requis")
+
+    changed = []
+    for row in rows:
+        current = row['tags'] or []
+        missing = [tag for tag in tags if tag not in current]
+        if not missing:
+            results[str(row['pk'])] = 'unchanged'
+            continue
+        changed.append(Ticket(pk=row['pk'], tags=current + missing, updated_at=now))
+        audit.add(row['pk'], 'updated', f"Tags ajoutés: {', '.join(missing)}",
+                  new_value=', '.join(missing)[:200])
+        results[str(row['pk'])] = 'updated'
+
+    if changed:
+        Ticket.objects.bulk_update(changed, ['tags', 'updated_at'], batch_size=1000)
+    return [ticket.pk for ticket in changed]
@@ -0,0 +1,124 @@
+"""
+Charge des agents : nombre de tickets ouverts assignés à chacun
+
+Un compteur par agent dans le cache partagé, tenu à jour par
+``read_model.refresh`` à partir de l'ancienne et de la nouvelle ligne de
+lecture (assigné, statut final) : la charge se lit sans requête ``COUNT``.
+Si les compteurs ont disparu du cache, ils sont reconstruits par un seul
+``GROUP BY`` sur le modèle de lecture ; ``reconcile`` corrige périodiquement
+les écarts (mises à jour concurrentes d'un même ticket).
+
+Chaque application de variations publie une nouvelle version et la liste des
+agents concernés : les processus qui gardent les charges en mémoire ne
+relisent que ces agents (``changed_since``).
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import TicketSummary
+
+LOAD_KEY = 'tickets:workload:{}'
+READY_KEY = 'tickets:workload:ready'
+VERSION_KEY = 'tickets:workload:version'
+CHANGE_KEY = 'tickets:workload:change:{}'
+CHANGE_TIMEOUT = 60 * 60
+# Au-delà, relire toutes les charges plutôt que rejouer les changements
+MAX_REPLAY = 256
+
+
+def _key(user_id):
+    return LOAD_KEY.format(user_id)
+
+
+def version():
+    return cache.get(VERSION_KEY, 0)
+
+
+def publish(user_ids=None):
+    """Publier une nouvelle version des compteurs
+
+    ``user_ids`` : agents dont la charge a changé (``None`` : tous).
+    """
+    if cache.add(VERSION_KEY, 1, None):
+        new_version = 1
+    else:
+        new_version = cache.incr(VERSION_KEY)
+    if user_ids is not None:
+        cache.set(CHANGE_KEY.format(new_version), list(user_ids), CHANGE_TIMEOUT)
+    return new_version
+
+
+def changed_since(old_version, new_version):
+    """Agents modifiés entre deux versions, ou ``None`` s'il faut tout relire"""
+    if old_version is None or not 0 <= new_version - old_version <= MAX_REPLAY:
+        return None
+    keys = [CHANGE_KEY.format(v) for v in range(old_version + 1, new_version + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) != len(keys):
+        # Version publiée sans liste (reconstruction) ou liste expirée
+        return None
+    return {user_id for user_ids in entries.values() for user_id in user_ids}
+
+
+def open_counts():
+    """``{user_id: tickets ouverts}`` calculé en base (un ``GROUP BY``)"""
+    rows = TicketSummary.objects.filter(
+        assigned_to_id__isnull=False, is_final=False
+    ).order_by().values('assigned_to_id').annotate(total=Count('pk')).values_list('assigned_to_id', 'total')
+    return {str(user_id): total for user_id, total in rows}
+
+
+def reconcile():
+    """Réécrire tous les compteurs depuis la base ; retourne ``{user_id: charge}``"""
+    counts = open_counts()
+    # Zéro explicite pour les autres utilisateurs : efface d'anciennes valeurs
+    user_ids = get_user_model().objects.filter(is_active=True).values_list('pk', flat=True)
+    values = {_key(user_id): 0 for user_id in user_ids}
+    values.update({_key(user_id): total for user_id, total in counts.items()})
+    cache.set_many(values, None)
+    cache.set(READY_KEY, True, None)
+    publish()
+    return counts
+
+
+def changes(previous, summaries):
+    """Variations de charge entre les anciennes lignes et les nouvelles
+
+    ``previous`` : ``{ticket_id: (assigned_to_id, is_final)}`` lu avant l'upsert.
+    """
+    deltas = Counter()
+    for summary in summaries:
+        old_assignee, old_final = previous.get(summary.ticket_id, (None, True))
+        if old_assignee and not old_final:
+            deltas[str(old_assignee)] -= 1
+        if summary.assigned_to_id and not summary.is_final:
+            deltas[str(summary.assigned_to_id)] += 1
+    return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+
+def apply(deltas):
+    """Appliquer des variations ``{user_id: ±n}`` aux compteurs partagés"""
+    if not deltas:
+        return
+    if not cache.get(READY_KEY):
+        # Compteurs perdus : la base contient déjà ces changements
+        reconcile()
+        return
+    for user_id, delta in deltas.items():
+        try:
+            cache.incr(_key(user_id), delta)
+        except ValueError:
+            cache.add(_key(user_id), max(delta, 0), None)
+    publish(deltas)
+
+
+def loads(user_ids):
+    """``{user_id: tickets ouverts}`` lus dans le cache (une requête ``get_many``)"""
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not cache.get(READY_KEY):
+        reconcile()
+    values = cache.get_many([_key(user_id) for user_id in user_ids])
+    return {user_id: max(int(values.get(_key(user_id), 0)), 0) for user_id in user_ids}
@@ -0,0 +1,173 @@
+"""
+Écriture différée des activités utilisateur
+
+Les connexions, déconnexions et autres activités sont accumulées en mémoire
+puis écrites périodiquement : un ``bulk_create`` pour les ``UserActivity`` et
+un seul ``bulk_update`` pour les ``User.last_activity``. Le tampon est vidé
+à l'arrêt du processus. Un lot dont l'écriture échoue est remis en tête du
+tampon (borné à ``ACTIVITY_BUFFER_MAX_PENDING`` activités) et retenté au vidage
+suivant, au plus ``MAX_ATTEMPTS`` fois.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Écritures tentées pour une activité avant de l'abandonner
+MAX_ATTEMPTS = 3
+
+
+class ActivityBuffer:
+    """Tampon d'activités vidé toutes les ``flush_interval`` secondes"""
+
+    def __init__(self, flush_interval=None, max_size=None):
+        self._flush_interval = flush_interval
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._activities = []
+        self._last_activity = {}
+        self._timer = None
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'ACTIVITY_BUFFER_FLUSH_INTERVAL', 5)
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'ACTIVITY_BUFFER_MAX_SIZE', 500)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, 'ACTIVITY_BUFFER_MAX_PENDING', 20 * self.max_size)
+
+    def record(self, user, action, description, request=None, ip_address=None, metadata=None):
+        """Enregistrer une activité (et la dernière activité de l'utilisateur)"""
+        from .models import UserActivity
+
+        now = timezone.now()
+        if request is not None:
+            ip_address = ip_address or request.META.get('REMOTE_ADDR')
+            user_agent = request.META.get('HTTP_USER_AGENT', '')
+        else:
+            user_agent = ''
+
+        activity = UserActivity(
+            user_id=user.pk,
+            action=action,
+            description=description,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            metadata=metadata or {},
+        )
+        with self._lock:
+            self._activities.append(activity)
+            self._last_activity[user.pk] = now
+            size = len(self._activities)
+
+        user.last_activity = now
+        self._after_record(size)
+
+    def touch(self, user):
+        """Mettre à jour la dernière activité sans journaliser d'action"""
+        now = timezone.now()
+        with self._lock:
+            self._last_activity[user.pk] = now
+            size = len(self._activities)
+        user.last_activity = now
+        self._after_record(size)
+
+    def _after_record(self, size):
+        if self.flush_interval <= 0 or size >= self.max_size:
+            self.flush()
+        else:
+            self._schedule()
+
+    def _schedule(self):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        from django.db import connection
+
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Écrire les activités et dernières activités accumulées"""
+        from .models import User, UserActivity
+
+        with self._lock:
+            activities, self._activities = self._activities, []
+            last_activity, self._last_activity = self._last_activity, {}
+
+        if not activities and not last_activity:
+            return 0
+
+        written = 0
+        if activities:
+            try:
+                # Point de sauvegarde : un échec ne casse pas la transaction appelante
+                with transaction.atomic():
+                    UserActivity.objects.bulk_create(activities)
+                written = len(activities)
+            except Exception as e:
+                logger.error(f"Erreur d'écriture des activités utilisateur ({len(activities)}): {e}")
+                self._requeue(activities=activities)
+        if last_activity:
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_update(
+                        [User(pk=pk, last_activity=value) for pk, value in last_activity.items()],
+                        ['last_activity']
+                    )
+            except Exception as e:
+                logger.error(f"Erreur de mise à jour des dernières activités: {e}")
+                self._requeue(last_activity=last_activity)
+        return written
+
+    def _requeue(self, activities=(), last_activity=None):
+        """Remettre en tête du tampon un lot non écrit"""
+        retry = []
+        for activity in activities:
+            activity._flush_attempts = getattr(activity, '_flush_attempts', 0) + 1
+            if activity._flush_attempts < MAX_ATTEMPTS:
+                retry.append(activity)
+        dropped = len(activities) - len(retry)
+
+        with self._lock:
+            self._activities[:0] = retry
+            overflow = len(self._activities) - self.max_pending
+            if overflow > 0:
+                # Tampon plein : abandonner les plus anciennes
+                del self._activities[:overflow]
+                dropped += overflow
+            for pk, value in (last_activity or {}).items():
+                # Une activité plus récente a pu être enregistrée entre-temps
+                if self._last_activity.get(pk) is None or self._last_activity[pk] < value:
+                    self._last_activity[pk] = value
+
+        if dropped:
+            logger.error(f"{dropped} activité(s) utilisateur abandonnée(s) après échec d'écriture")
+        if self.flush_interval > 0:
+            self._schedule()
+
+
+activity_buffer = ActivityBuffer()
+atexit.register(activity_buffer.flush)
@@ -0,0 +1,49 @@
+"""
+Authentification avec chargement du rôle et de l'organisation en une requête
+
+L'utilisateur authentifié est chargé avec ``select_related('role', 'organization')``
+afin que les vérifications de permissions (``User.has_permission``,
+``User.can_access_psea``) ne déclenchent aucune requête supplémentaire.
+"""
+from django.contrib.auth.backends import ModelBackend as DjangoModelBackend
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication as SimpleJWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+
+def user_queryset():
+    return User.objects.select_related('role', 'organization')
+
+
+class JWTAuthentication(SimpleJWTAuthentication):
+    """Authentification JWT chargeant le rôle et l'organisation"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = user_queryset().get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
+
+
+class ModelBackend(DjangoModelBackend):
+    """Backend de session chargeant le rôle et l'organisation"""
+
+    def get_user(self, user_id):
+        try:
+            user = user_queryset().get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
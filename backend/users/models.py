@@ -4,6 +4,7 @@ Modèles pour la gestion des utilisateurs et des rôles
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
 import uuid
 
 
@@ -85,17 +86,32 @@ class User(AbstractUser):
     def full_name(self):
         return self.get_full_name() or self.username
 
+    @cached_property
+    def permission_set(self):
+        """Permissions du rôle, chargées une seule fois par instance (donc par requête)"""
+        if self.role_id is None:
+            return frozenset()
+        return frozenset(self.role.permissions)
+
+    def invalidate_permissions(self):
+        """Oublier les permissions mises en cache sur l'instance"""
+        self.__dict__.pop('permission_set', None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.invalidate_permissions()
+        super().refresh_from_db(*args, **kwargs)
+
     def has_permission(self, permission):
         """Vérifier si l'utilisateur a une permission spécifique"""
         if self.is_superuser:
             return True
-        if self.role:
-            return permission in self.role.permissions
-        return False
+        return permission in self.permission_set
 
     def can_access_psea(self):
         """Vérifier si l'utilisateur peut accéder aux cas PSEA"""
-        return self.is_superuser or (self.role and self.role.is_psea_authorized)
+        if self.is_superuser:
+            return True
+        return self.role_id is not None and self.role.is_psea_authorized
 
     def update_last_activity(self):
         """Mettre à jour la dernière activité"""
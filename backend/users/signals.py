@@ -0,0 +1,14 @@
+"""
+Signaux de l'application utilisateurs
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Role
+from .visibility import bump_role_version
+
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_role_rules(sender, instance, **kwargs):
+    """Invalider les règles de visibilité compilées lors d'un changement de rôle"""
+    bump_role_version(instance.pk)
@@ -0,0 +1,98 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from users.activity import MAX_ATTEMPTS, ActivityBuffer
+from users.models import User, UserActivity
+
+
+class ActivityBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('agent', password='x')
+
+    def buffer(self, **kwargs):
+        buffer = ActivityBuffer(**kwargs)
+        self.addCleanup(lambda: buffer._timer and buffer._timer.cancel())
+        return buffer
+
+    def test_flush_on_size(self):
+        buffer = self.buffer(flush_interval=60, max_size=2)
+        buffer.record(self.user, 'login', 'Connexion', ip_address='127.0.0.1')
+        self.assertFalse(UserActivity.objects.exists())
+        self.assertIsNotNone(buffer._timer)
+        buffer.record(self.user, 'logout', 'Déconnexion', ip_address='127.0.0.1')
+        self.assertEqual(UserActivity.objects.count(), 2)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_activity)
+
+    def test_flush_on_timer(self):
+        buffer = self.buffer(flush_interval=60)
+        buffer.touch(self.user)
+        timer = buffer._timer
+        self.assertEqual(timer.interval, 60)
+        timer.cancel()
+        # Rappel du minuteur, sans fermer la connexion du test
+        with mock.patch.object(connection, 'close'):
+            buffer._timed_flush()
+        self.assertIsNone(buffer._timer)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_activity)
+
+    def test_failed_batch_is_retried(self):
+        buffer = self.buffer(flush_interval=0)
+        with mock.patch.object(UserActivity.objects, 'bulk_create', side_effect=RuntimeError):
+            buffer.record(self.user, 'login', 'Connexion', ip_address='127.0.0.1')
+        self.assertEqual(len(buffer._activities), 1)
+        # La dernière activité, écrite à part, n'est pas perdue
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_activity)
+
+        buffer.record(self.user, 'logout', 'Déconnexion', ip_address='127.0.0.1')
+        self.assertEqual(
+            list(UserActivity.objects.order_by('created_at', 'pk').values_list('action', flat=True)),
+            ['login', 'logout']
+        )
+        self.assertEqual(buffer._activities, [])
+
+    @override_settings(ACTIVITY_BUFFER_MAX_PENDING=2)
+    def test_retries_are_bounded(self):
+        buffer = self.buffer(flush_interval=0, max_size=10)
+        with mock.patch.object(UserActivity.objects, 'bulk_create', side_effect=RuntimeError):
+            for i in range(3):
+                buffer.record(self.user, 'login', f'Connexion {i}', ip_address='127.0.0.1')
+            self.assertEqual([a.description for a in buffer._activities], ['Connexion 1', 'Connexion 2'])
+            for _ in range(MAX_ATTEMPTS):
+                buffer.flush()
+        self.assertEqual(buffer._activities, [])
+
+
+class ExitFlushTests(TestCase):
+    def test_buffer_is_flushed_at_exit(self):
+        script = textwrap.dedent('''
+            import django
+            from unittest import mock
+            django.setup()
+            from django.conf import settings
+            from users.activity import activity_buffer
+            from users.models import User, UserActivity
+
+            settings.ACTIVITY_BUFFER_FLUSH_INTERVAL = 3600
+            written = lambda objs, *args, **kwargs: print('written', len(objs))
+            mock.patch.object(UserActivity.objects, 'bulk_create', written).start()
+            mock.patch.object(User.objects, 'bulk_update', written).start()
+            activity_buffer.record(User(pk=1), 'login', 'Connexion', ip_address='127.0.0.1')
+            activity_buffer._timer.cancel()
+            print('exit')
+        ''')
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True, timeout=60,
+            cwd=Path(__file__).resolve().parents[2],
+            env={'DJANGO_SETTINGS_MODULE': 'cfrm.test_settings', 'PATH': '/usr/bin:/bin'},
+        )
+        self.assertEqual(result.stdout.split('\n')[:3], ['exit', 'written 1', 'written 1'], result.stderr)
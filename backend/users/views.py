@@ -12,7 +12,8 @@ from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Organization, Role, User, UserActivity, UserPreference
+from .activity import activity_buffer
+from .models import Organization, Role, User, UserPreference
 from .serializers import (
     OrganizationSerializer, RoleSerializer, UserSerializer,
     UserCreateSerializer, UserUpdateSerializer, PasswordChangeSerializer,
@@ -64,18 +65,13 @@ class UserViewSet(viewsets.ModelViewSet):
             user = serializer.validated_data['user']
             login(request, user)
             
-            # Enregistrer l'activité
-            UserActivity.objects.create(
-                user=user,
-                action='login',
-                description=f"Connexion depuis {request.META.get('REMOTE_ADDR')}",
-                ip_address=request.META.get('REMOTE_ADDR'),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')
+            # Enregistrer l'activité et la dernière activité (écriture différée)
+            activity_buffer.record(
+                user, 'login',
+                f"Connexion depuis {request.META.get('REMOTE_ADDR')}",
+                request=request
             )
             
-            # Mettre à jour la dernière activité
-            user.update_last_activity()
-            
             # Générer des tokens JWT pour le frontend
             refresh = RefreshToken.for_user(user)
             return Response({
@@ -91,12 +87,10 @@ class UserViewSet(viewsets.ModelViewSet):
     def logout(self, request):
         """Déconnexion utilisateur"""
         # Enregistrer l'activité
-        UserActivity.objects.create(
-            user=request.user,
-            action='logout',
-            description=f"Déconnexion depuis {request.META.get('REMOTE_ADDR')}",
-            ip_address=request.META.get('REMOTE_ADDR'),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        activity_buffer.record(
+            request.user, 'logout',
+            f"Déconnexion depuis {request.META.get('REMOTE_ADDR')}",
+            request=request
         )
         
         logout(request)
@@ -115,12 +109,10 @@ class UserViewSet(viewsets.ModelViewSet):
             serializer.save()
             
             # Enregistrer l'activité
-            UserActivity.objects.create(
-                user=request.user,
-                action='password_change',
-                description="Changement de mot de passe",
-                ip_address=request.META.get('REMOTE_ADDR'),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')
+            activity_buffer.record(
+                request.user, 'password_change',
+                "Changement de mot de passe",
+                request=request
             )
             
             return Response({'message': 'Mot de passe modifié avec succès'})
@@ -134,11 +126,10 @@ class UserViewSet(viewsets.ModelViewSet):
         user.is_active = True
         user.save()
         
-        UserActivity.objects.create(
-            user=request.user,
-            action='user_activate',
-            description=f"Utilisateur {user.username} activé",
-            ip_address=request.META.get('REMOTE_ADDR')
+        activity_buffer.record(
+            request.user, 'user_activate',
+            f"Utilisateur {user.username} activé",
+            request=request
         )
         
         return Response({'message': 'Utilisateur activé'})
@@ -150,11 +141,10 @@ class UserViewSet(viewsets.ModelViewSet):
         user.is_active = False
         user.save()
         
-        UserActivity.objects.create(
-            user=request.user,
-            action='user_deactivate',
-            description=f"Utilisateur {user.username} désactivé",
-            ip_address=request.META.get('REMOTE_ADDR')
+        activity_buffer.record(
+            request.user, 'user_deactivate',
+            f"Utilisateur {user.username} désactivé",
+            request=request
         )
         
         return Response({'message': 'Utilisateur désactivé'})
@@ -203,18 +193,13 @@ class AuthLoginView(APIView):
             user = serializer.validated_data['user']
             login(request, user)
 
-            # Enregistrer l'activité
-            UserActivity.objects.create(
-                user=user,
-                action='login',
-                description=f"Connexion depuis {request.META.get('REMOTE_ADDR')}",
-                ip_address=request.META.get('REMOTE_ADDR'),
-                user_agent=request.META.get('HTTP_USER_AGENT', '')
+            # Enregistrer l'activité et la dernière activité (écriture différée)
+            activity_buffer.record(
+                user, 'login',
+                f"Connexion depuis {request.META.get('REMOTE_ADDR')}",
+                request=request
             )
 
-            # Mettre à jour la dernière activité
-            user.update_last_activity()
-
             # Générer des tokens JWT pour le frontend
             refresh = RefreshToken.for_user(user)
             return Response({
@@ -0,0 +1,117 @@
+"""
+Visibilité des tickets selon le rôle, l'organisation et l'autorisation PSEA
+
+Les règles d'accès sont compilées en un seul prédicat ``Q`` appliqué dans la
+requête SQL (aucune vérification ligne par ligne en Python). La forme compilée
+est mise en cache par utilisateur et par version du rôle.
+"""
+from django.core.cache import cache
+from django.db.models import Q
+
+CACHE_TIMEOUT = 60 * 15
+ROLE_VERSION_KEY = 'visibility:role-version:{role_id}'
+
+# Permissions de rôle donnant accès à tous les tickets
+UNRESTRICTED_PERMISSIONS = {'all'}
+
+
+def role_version(role_id):
+    if role_id is None:
+        return 0
+    return cache.get(ROLE_VERSION_KEY.format(role_id=role_id), 0)
+
+
+def bump_role_version(role_id):
+    """Invalider les prédicats compilés pour un rôle modifié"""
+    key = ROLE_VERSION_KEY.format(role_id=role_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def compile_rules(user):
+    """Réduire les droits d'un utilisateur à une règle sérialisable"""
+    if user is None or not user.is_authenticated:
+        return {'unrestricted': False, 'psea': False, 'organization_id': None, 'user_id': None}
+    if user.is_superuser:
+        return {'unrestricted': True}
+
+    role = user.role
+    permissions = set(role.permissions) if role else set()
+    return {
+        'unrestricted': bool(permissions & UNRESTRICTED_PERMISSIONS),
+        'psea': bool(role and role.is_psea_authorized),
+        'organization_id': user.organization_id,
+        'user_id': str(user.pk),
+    }
+
+
+def get_rules(user):
+    """Règle compilée pour l'utilisateur, depuis le cache si possible"""
+    if user is None or not user.is_authenticated:
+        return compile_rules(None)
+
+    key = 'visibility:{user_id}:{superuser}:{org}:{role}:{version}'.format(
+        user_id=user.pk,
+        superuser=int(user.is_superuser),
+        org=user.organization_id,
+        role=user.role_id,
+        version=role_version(user.role_id),
+    )
+    rules = cache.get(key)
+    if rules is None:
+        rules = compile_rules(user)
+        cache.set(key, rules, CACHE_TIMEOUT)
+    return rules
+
+
+# Champs utilisés par le prédicat, sur Ticket et sur le modèle de lecture
+TICKET_FIELDS = {
+    'is_psea': 'is_psea',
+    'assignee': 'assigned_to_id',
+    'assignee_organization': 'assigned_to__organization_id',
+    'creator_organization': 'created_by__organization_id',
+}
+SUMMARY_FIELDS = {
+    'is_psea': 'is_psea',
+    'assignee': 'assigned_to_id',
+    'assignee_organization': 'assigned_to_organization_id',
+    'creator_organization': 'created_by_organization_id',
+}
+
+
+def ticket_predicate(rules, prefix='', fields=TICKET_FIELDS):
+    """Prédicat ``Q`` sur les tickets (``prefix`` pour les modèles liés, ex. ``ticket__``)"""
+    if rules.get('unrestricted'):
+        return None
+
+    def lookup(name, suffix=''):
+        return f"{prefix}{fields[name]}{suffix}"
+
+    user_id = rules.get('user_id')
+    predicate = Q()
+
+    if not rules.get('psea'):
+        psea = Q(**{lookup('is_psea'): False})
+        if user_id:
+            psea |= Q(**{lookup('assignee'): user_id})
+        predicate &= psea
+
+    organization_id = rules.get('organization_id')
+    if organization_id:
+        predicate &= (
+            Q(**{lookup('assignee', '__isnull'): True})
+            | Q(**{lookup('assignee_organization'): organization_id})
+            | Q(**{lookup('creator_organization'): organization_id})
+        )
+
+    return predicate or None
+
+
+def filter_tickets(queryset, user, prefix='', fields=TICKET_FIELDS):
+    """Restreindre un queryset aux tickets visibles par l'utilisateur"""
+    predicate = ticket_predicate(get_rules(user), prefix, fields)
+    if predicate is None:
+        return queryset
+    return queryset.filter(predicate)